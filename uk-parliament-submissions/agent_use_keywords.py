@@ -0,0 +1,65 @@
+"""
+Keyword groups used by the Streamlit explorers to classify agent use cases.
+
+Both apps (streamlit_gemini.py and streamlit_overview_google_agent_uses.py)
+classify descriptions with the same heuristics, so the keyword lists live
+here once. The description is matched against every group in one pass with
+a compiled KeywordMatcher when pyahocorasick is installed; without it the
+groups are checked with plain `k in text` substring tests, as before.
+"""
+
+from typing import Dict, Iterable, Set
+
+from keyword_matcher import KeywordMatcher, ahocorasick
+
+
+class SubstringKeywords:
+    """Label -> keywords groups checked with `any(k in text for k in keywords)`."""
+
+    def __init__(self, groups: Dict[str, Iterable[str]]):
+        self.groups = {label: [k.lower() for k in keywords] for label, keywords in groups.items()}
+
+    def matched_labels(self, text: str) -> Set[str]:
+        """Labels of the groups with at least one keyword in the text."""
+        text = text.lower()
+        return {label for label, keywords in self.groups.items() if any(k in text for k in keywords)}
+
+    def contains_any(self, text: str) -> bool:
+        """True if any keyword of any group occurs in the text."""
+        text = text.lower()
+        return any(k in text for keywords in self.groups.values() for k in keywords)
+
+
+def keyword_groups(groups: Dict[str, Iterable[str]]):
+    """Compiled matcher over the groups, or substring checks when pyahocorasick is not installed."""
+    return KeywordMatcher(groups) if ahocorasick is not None else SubstringKeywords(groups)
+
+
+# Keyword groups for the classification heuristics, matched against the lowercased
+# description; same substring semantics as `k in desc_lower`
+DESCRIPTION_GROUPS = {
+    "robotics_agent": ["robot", "autonomous vehicle", "autonomous driving", "digital twin ", "physical store", "factory worker", "3d models", "3d model", "vehicle", "trucks", "hardware", "sensor", "geospatial ai workloads", "expedition vehicles", "smart cockpit", "in-vehicle", "on the road", "fulfillment solutions", "smartest billboard", "digital twin of its entire distribution network"],
+    "chatbot_agent": ["conversational ai", "virtual assistant", "chatbot", "natural language", "summaries", "text generation", "translation", "gemini for google workspace", "gemini in gmail", "gemini in docs", "dialogflow", "speech-command", "voice", "chat features", "language model", "llm", "generative ai-powered virtual assistant"],
+    "code_agent": ["code assist", "software development", "developer productivity", "coding", "debug", "deploy code", "software engineering", "ticket-to-code", "codebase", "code generation", "gemini code assist"],
+    "execution_agent": ["automate", "streamline process", "deploy model", "workflow automation", "order management", "risk score", "claims processing", "gen ai framework", "api", "sdk", "platform for building", "automating tasks", "engine", "automating the generation", "automates", "operational impact", "process documents", "make decisions", "system", "platform", "tool", "solution", "ai models to streamline", "ai agent that helps", "ai-powered solutions", "intelligent search", "prediction", "predictive ai tools", "machine learning models", "ai platform"],
+    "retrieval_agent": ["search", "find information", "knowledge center", "data analysis", "document processing", "insights", "analytics", "vertex ai search", "bigquery", "looker", "reporting", "monitoring", "classif", "analyze data", "data points", "information retrieval", "data-driven", "research tool", "data insights", "data foundation", "data management", "data governance"], # "classif" for classify
+    "value_5": ["revolutioniz", "transforming industry", "next-generation platform", "first-of-its-kind", "50% total-cost-of-ownership savings", "market leader", "$1.9 million roi", "doubling underwriter productivity", "brl 1.5 million since adoption", "global leader", "significant roi", "substantial market impact", "game-changing", "breakthrough", "pioneering", "10x faster", "90% reduction in costs", "brl 15 million in tax overcharges", "profit of $22.3 million", "200% growth", "100,000 transactions per second"],
+    "value_4": ["major operational transformation", "significant reduction", "significant improvements", "significant improvement", "10,000 man-hours per year", "400% performance", "90% faster", "80% reduction in errors", "$20 million in savings", "20% price and performance improvement", "accelerate", "optimize", "enhance efficiency", "streamline", "boost productivity", "increase revenue", "large scale", "billions of data points", "millions of users", "thousands of simulations", "75% in the time taken", "99% reduction in audit costs", "10-20% in accuracy", "95% reduction in time", "30% to 40% efficiency", "5x faster", "double-digit reduction", "workload gains", "transform massive volumes", "speeding up campaign creations from eight weeks to eight hours"],
+    "value_3": ["cost savings", "customer impact", "new product feature", "improved", "faster", "more efficient", "better", "20% faster", "15% increase", "operational cost savings", "increased efficiency", "time savings", "enhanced communication", "higher quality work", "reduced time", "reduction in technical debt", "improved click-through rate", "increased conversion rates", "boost accuracy", "unlock unique insights", "save time", "increase productivity", "streamlining workflows", "more culturally diverse and inclusive workplace", "reduces the time", "speeds inventory tracking", "automating insights", "13% increase in productivity", "average five hours per week", "20% faster", "30-35% reduction in time", "40% improvement in forecasting accuracy", "reduce food waste", "75% reduction in calls abandoned", "30% decrease in case handling times", "50% faster investigations"],
+    "value_2": ["departmental improvement", "some enhancement", "more effective", "easier", "helpful", "better able to recognize", "more responsive features", "simplify", "user-focused", "make marketing processes more efficient", "keeping customers secure", "convenient self-service", "easier to find", "more agile, intuitive, and fluid", "valuable productivity and collaboration tool", "enhance the workplace experience", "personalized guidance", "smoother stays", "better and more cost-effective services", "more time to focus", "winning back time", "more time and flexibility", "improve the quality of work", "better work and customer experiences", "getting things done faster", "greater productivity", "better security monitoring", "making it easier", "more accessible", "more personalized", "better tailored recommendations"],
+    "public_sector_critical": ["national security", "emergency management", "critical infrastructure", "public safety", "essential services"],
+    "critical_sector_function": ["cancer detection", "drug discovery", "diagnostics", "patient care", "life-threatening diseases", "critical patient insights", "financial markets", "banking", "insurance", "payment systems", "anti money laundering", "network operations", "critical communications", "emergency services", "national critical functions", "supply chain resilience", "energy grid", "power generation", "water management"],
+    "critical_supply_chain": ["supply chain", "transportation network", "autonomous driving safety", "critical manufacturing", "energy infrastructure", "defense contracting"],
+    "technology_critical": ["cybersecurity", "critical infrastructure support", "cloud infrastructure for government/healthcare", "data privacy for sensitive sectors"],
+    "robotics_override": ["autonomous vehicle", "robotics", "autonomous driving company", "physical world", "in-home robot", "drones"],
+    "robotics_critical_use": ["logistics", "delivery", "inspection of infrastructure", "security robot"],
+    "defense": ["defense", "military"],
+    "ai_safety": ["ai risk management", "safe superintelligence"],
+    "business_critical": ["supply chain risk", "financial compliance"],
+    "national_critical_functions": ["national critical functions", "critical national infrastructure"],
+}
+# Organisations whose agent uses count as government and critical public services
+GOVERNMENT_ORG_NAMES = ["u.s. air force", "u.s. dept. of veterans affairs", "national institutes of health", "government of singapore", "qatari ministry of labour", "state of nevada", "new york state department of motor vehicles", "air force research laboratory", "colombia’s ministry of information", "brazil’s ministry of education", "noaa", "usaid", "world bank", "serpro", "prodam", "minas gerais state government", "israel antiquities authority", "belo horizonte municipal finance office"]
+
+DESCRIPTION_KEYWORDS = keyword_groups(DESCRIPTION_GROUPS)
+GOVERNMENT_ORGS = keyword_groups({"government": GOVERNMENT_ORG_NAMES})
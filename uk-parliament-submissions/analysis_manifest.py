@@ -0,0 +1,83 @@
+"""
+Manifest of analysed paragraphs for incremental process_pdfs runs.
+
+Paragraphs are de-duplicated and selected across the whole corpus on every
+run; what is stored is the outcome of sending each selected paragraph to the
+model. Every analysed paragraph is recorded under a key of its prompt, its text
+and the documents and pages it cites, together with the findings it produced.
+On the next run, paragraphs whose key is stored reuse their findings, so only
+paragraphs that are new, changed, newly selected or cited differently (e.g. a
+new submission repeating them) are sent to the model. Cluster summaries are
+stored per question together with a fingerprint of that question's findings;
+they are reused until the findings of that question change.
+"""
+
+import os
+import json
+import logging
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MANIFEST_PATH = "ai_finance_risk_manifest.json"
+MANIFEST_FORMAT_VERSION = 2
+
+
+class AnalysisManifest:
+    """
+    JSON manifest of per-paragraph findings and per-question clusters.
+
+    Args:
+        path (str): Manifest file; a missing or unreadable file starts an empty manifest
+    """
+
+    def __init__(self, path=DEFAULT_MANIFEST_PATH):
+        self.path = path
+        self.paragraphs: Dict[str, List[Dict]] = {}
+        self.clusters: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable manifest {path}: {e}")
+                data = {}
+            if data.get("format") == MANIFEST_FORMAT_VERSION:
+                self.paragraphs = data.get("paragraphs", {})
+                self.clusters = data.get("clusters", {})
+
+    def findings(self, key: str) -> Optional[List[Dict]]:
+        """Stored findings of an analysed paragraph, or None if no paragraph with this key was analysed."""
+        return self.paragraphs.get(key)
+
+    def set_findings(self, key: str, findings: List[Dict]):
+        self.paragraphs[key] = findings
+
+    def retain(self, keys: Iterable[str]) -> List[str]:
+        """Drop paragraphs not in keys (changed, removed or no longer selected); returns the dropped keys."""
+        keys = set(keys)
+        dropped = [key for key in self.paragraphs if key not in keys]
+        for key in dropped:
+            del self.paragraphs[key]
+        return dropped
+
+    def cached_clusters(self, question_num, fingerprint: str):
+        """Stored clusters of a question if its findings are unchanged, else None."""
+        entry = self.clusters.get(str(question_num))
+        if entry is None or entry["fingerprint"] != fingerprint:
+            return None
+        return entry["clusters"]
+
+    def set_clusters(self, question_num, fingerprint: str, clusters):
+        self.clusters[str(question_num)] = {"fingerprint": fingerprint, "clusters": clusters}
+
+    def save(self):
+        """Write the manifest atomically."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"format": MANIFEST_FORMAT_VERSION, "paragraphs": self.paragraphs,
+                       "clusters": self.clusters}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,239 @@
+"""
+Provider batch API support (Anthropic Message Batches / OpenAI Batch) for bulk jobs.
+
+Requests are split into chunks within the provider's request count and payload
+size limits, every chunk is submitted as its own batch, and the batches are then
+polled together until the provider reports them as finished. Results are
+returned keyed by the custom_id given to each request. Batches trade latency for
+cost and throughput and are not subject to the interactive rate limits.
+
+Callers that must survive an interruption pass on_submit to persist each batch id
+as soon as it exists, and hand the ids of unfinished batches back to run_batch
+as pending on the next run; those batches are polled and collected instead of
+being submitted (and paid for) again.
+"""
+
+import io
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_CLAUDE_BATCH_REQUESTS = 100_000
+MAX_GPT_BATCH_REQUESTS = 50_000
+# Provider limits on the total size of one batch submission
+MAX_CLAUDE_BATCH_BYTES = 256 * 1024 * 1024
+MAX_GPT_BATCH_BYTES = 200 * 1024 * 1024
+DEFAULT_POLL_INTERVAL = 30
+OPENAI_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class _ClaudeBatches:
+    """Anthropic Message Batches."""
+
+    name = "Claude"
+    max_requests = MAX_CLAUDE_BATCH_REQUESTS
+    max_bytes = MAX_CLAUDE_BATCH_BYTES
+
+    def __init__(self, client):
+        self._batches = client.messages.batches
+
+    @staticmethod
+    def request_bytes(custom_id, params):
+        return len(json.dumps({"custom_id": custom_id, "params": params}).encode("utf-8"))
+
+    def submit(self, requests):
+        batch = self._batches.create(
+            requests=[{"custom_id": custom_id, "params": params} for custom_id, params in requests.items()]
+        )
+        return batch.id
+
+    def finished(self, batch_id):
+        """The batch once it has ended, else None."""
+        batch = self._batches.retrieve(batch_id)
+        return batch if batch.processing_status == "ended" else None
+
+    def cancel(self, batch_id):
+        self._batches.cancel(batch_id)
+
+    def results(self, batch):
+        results = {}
+        for entry in self._batches.results(batch.id):
+            if entry.result.type != "succeeded":
+                logger.warning(f"Claude batch request {entry.custom_id} {entry.result.type}")
+                continue
+            message = entry.result.message
+            usage = message.usage
+            cache_creation = getattr(usage, "cache_creation_input_tokens", None) or 0
+            cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+            results[entry.custom_id] = (message.content[0].text, {
+                "prompt_tokens": usage.input_tokens,
+                "completion_tokens": usage.output_tokens,
+                "cache_creation_input_tokens": cache_creation,
+                "cache_read_input_tokens": cache_read,
+                "total_tokens": usage.input_tokens + cache_creation + cache_read + usage.output_tokens
+            })
+        return results
+
+
+class _GPTBatches:
+    """OpenAI Batch API over an uploaded JSONL file."""
+
+    name = "GPT"
+    max_requests = MAX_GPT_BATCH_REQUESTS
+    max_bytes = MAX_GPT_BATCH_BYTES
+
+    def __init__(self, client):
+        self._client = client
+
+    @staticmethod
+    def _line(custom_id, body):
+        return json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body})
+
+    @classmethod
+    def request_bytes(cls, custom_id, body):
+        return len(cls._line(custom_id, body).encode("utf-8")) + 1
+
+    def submit(self, requests):
+        lines = [self._line(custom_id, body) for custom_id, body in requests.items()]
+        input_file = self._client.files.create(
+            file=("batch_input.jsonl", io.BytesIO("\n".join(lines).encode("utf-8"))),
+            purpose="batch"
+        )
+        batch = self._client.batches.create(
+            input_file_id=input_file.id, endpoint="/v1/chat/completions", completion_window="24h"
+        )
+        return batch.id
+
+    def finished(self, batch_id):
+        """The batch once it has reached a terminal status, else None."""
+        batch = self._client.batches.retrieve(batch_id)
+        return batch if batch.status in OPENAI_TERMINAL_STATUSES else None
+
+    def cancel(self, batch_id):
+        self._client.batches.cancel(batch_id)
+
+    def results(self, batch):
+        if batch.status != "completed" or not batch.output_file_id:
+            logger.error(f"GPT batch {batch.id} finished with status {batch.status}")
+            return {}
+        results = {}
+        for line in self._client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                logger.warning(f"GPT batch request {record.get('custom_id')} failed: {record.get('error')}")
+                continue
+            body = response["body"]
+            usage = body["usage"]
+            results[record["custom_id"]] = (body["choices"][0]["message"]["content"], {
+                "prompt_tokens": usage["prompt_tokens"],
+                "completion_tokens": usage["completion_tokens"],
+                "cache_creation_input_tokens": 0,
+                "cache_read_input_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0),
+                "total_tokens": usage["total_tokens"]
+            })
+        return results
+
+
+BATCH_PROVIDERS = {"claude": _ClaudeBatches, "gpt": _GPTBatches}
+
+
+def chunk_requests(requests, max_requests, max_bytes, request_bytes):
+    """
+    Split requests into consecutive chunks of at most max_requests requests and max_bytes of payload.
+    A single request larger than max_bytes gets a chunk of its own (and is rejected by the provider).
+    """
+    chunk, size = {}, 0
+    for custom_id, params in requests.items():
+        request_size = request_bytes(custom_id, params)
+        if chunk and (len(chunk) >= max_requests or size + request_size > max_bytes):
+            yield chunk
+            chunk, size = {}, 0
+        chunk[custom_id] = params
+        size += request_size
+    if chunk:
+        yield chunk
+
+
+def _cancel(provider, batch_id):
+    """Cancel a batch we stopped waiting for, so it does not keep running (and billing) unseen."""
+    try:
+        provider.cancel(batch_id)
+        logger.warning(f"Cancelled {provider.name} batch {batch_id}")
+    except Exception as e:
+        logger.error(f"Could not cancel {provider.name} batch {batch_id}: {str(e)}")
+
+
+def run_batch(model_type, client, requests, max_requests_per_batch=None, max_bytes_per_batch=None,
+              poll_interval=DEFAULT_POLL_INTERVAL, timeout=None, pending=(), on_submit=None, on_results=None):
+    """
+    Run requests through the provider batch API.
+
+    Args:
+        model_type (str): "claude" or "gpt"
+        client: Anthropic/OpenAI client
+        requests (dict): custom_id -> params for messages.create / body for chat.completions.create
+        max_requests_per_batch (int, optional): Requests per submitted batch (capped at the provider limit)
+        max_bytes_per_batch (int, optional): Payload bytes per submitted batch (capped at the provider limit)
+        poll_interval (float): Seconds between status checks
+        timeout (float, optional): Give up waiting after this many seconds and cancel the unfinished batches
+        pending (iterable): Ids of batches submitted by an earlier, interrupted run; they are polled
+                            and collected alongside the new ones
+        on_submit (callable, optional): on_submit(batch_id, custom_ids) right after each batch is submitted
+        on_results (callable, optional): on_results(batch_id, results) as each batch finishes; not called
+                                         for batches that timed out or could not be retrieved
+
+    Returns:
+        dict: custom_id -> (response_text, token_usage) for requests that succeeded
+    """
+    if model_type not in BATCH_PROVIDERS:
+        logger.error(f"Unsupported model type: {model_type}")
+        return {}
+    provider = BATCH_PROVIDERS[model_type](client)
+    max_requests = min(max_requests_per_batch or provider.max_requests, provider.max_requests)
+    max_bytes = min(max_bytes_per_batch or provider.max_bytes, provider.max_bytes)
+
+    # Everything is submitted before anything is polled, so the batches are processed concurrently
+    started = time.monotonic()
+    waiting = list(pending)
+    for chunk in chunk_requests(requests, max_requests, max_bytes, provider.request_bytes):
+        try:
+            batch_id = provider.submit(chunk)
+        except Exception as e:
+            logger.error(f"Error submitting {provider.name} batch of {len(chunk)} requests: {str(e)}")
+            continue
+        logger.info(f"Submitted {provider.name} batch {batch_id} with {len(chunk)} requests")
+        if on_submit is not None:
+            on_submit(batch_id, list(chunk))
+        waiting.append(batch_id)
+
+    results = {}
+    while waiting:
+        for batch_id in list(waiting):
+            try:
+                batch = provider.finished(batch_id)
+                if batch is None:
+                    continue
+                batch_results = provider.results(batch)
+            except Exception as e:
+                logger.error(f"Error retrieving {provider.name} batch {batch_id}: {str(e)}")
+                waiting.remove(batch_id)
+                continue
+            waiting.remove(batch_id)
+            logger.info(f"{provider.name} batch {batch_id} finished with {len(batch_results)} results")
+            results.update(batch_results)
+            if on_results is not None:
+                on_results(batch_id, batch_results)
+        if not waiting:
+            break
+        if timeout is not None and time.monotonic() - started > timeout:
+            for batch_id in waiting:
+                logger.error(f"Timed out waiting for {provider.name} batch {batch_id}")
+                _cancel(provider, batch_id)
+            break
+        time.sleep(poll_interval)
+    return results
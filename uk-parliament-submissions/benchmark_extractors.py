@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark the PDF extractor backends of pdf_extraction.py.
+
+Every backend extracts every page of the PDFs in a fresh worker process
+(so peak memory is measured per backend), without the page cache. For each
+backend it reports:
+
+- pages/sec: pages extracted per second of wall-clock time
+- peak RSS: the worker's peak resident memory, and how much of it extraction added
+- empty pages: share of pages without a single word
+- word F1: per-page overlap of the words with those of the reference backend
+  (harmonic mean of precision and recall over word counts), averaged over pages;
+  1.0 means the same words, order aside
+
+Usage:
+    python benchmark_extractors.py [folder] [--backends pypdf2 pypdfium2 pdfplumber]
+                                   [--reference pypdfium2] [--limit N]
+"""
+
+import re
+import sys
+import time
+import argparse
+import resource
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from pdf_extraction import EXTRACTOR_BACKENDS, read_pdf_pages
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def word_counts(text):
+    """Multiset of the lower-cased words of a text."""
+    return Counter(_WORD_RE.findall(text.lower()))
+
+
+def run_backend(backend, pdf_paths):
+    """
+    Worker: extract every PDF with one backend; returns per-page word counts per PDF, timings and memory.
+    Each document's text is dropped once its words are counted, so the peak RSS reflects extraction
+    rather than the size of the corpus.
+    """
+    baseline_rss = _peak_rss_mb()
+    words, errors, seconds = [], 0, 0.0
+    for pdf_path in pdf_paths:
+        start = time.perf_counter()
+        try:
+            pages = read_pdf_pages(pdf_path, backend=backend)
+        except Exception as e:
+            print(f"{backend}: error reading {pdf_path}: {e}", file=sys.stderr)
+            words.append(None)
+            errors += 1
+            continue
+        finally:
+            # Only extraction is timed, not the word counting
+            seconds += time.perf_counter() - start
+        words.append([word_counts(text) for text in pages])
+        del pages
+    return {"words": words, "seconds": seconds, "errors": errors,
+            "peak_rss_mb": _peak_rss_mb(), "baseline_rss_mb": baseline_rss}
+
+
+def word_f1(words, reference_words):
+    """Overlap of two pages' word counts (1.0 when both are empty)."""
+    total, reference_total = sum(words.values()), sum(reference_words.values())
+    if not total and not reference_total:
+        return 1.0
+    common = sum((words & reference_words).values())
+    return 2.0 * common / (total + reference_total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PDF extractor backends")
+    parser.add_argument("folder", nargs="?", default="2025-05-UKParliament-Evidence")
+    parser.add_argument("--backends", nargs="+", default=list(EXTRACTOR_BACKENDS))
+    parser.add_argument("--reference", default="pypdfium2", help="Backend the text quality is compared against")
+    parser.add_argument("--limit", type=int, help="Only use the first N PDFs")
+    args = parser.parse_args()
+
+    pdf_paths = sorted(Path(args.folder).rglob("*.pdf"))[:args.limit]
+    if not pdf_paths:
+        print(f"No PDFs found in {args.folder}")
+        return
+    backends = [b for b in args.backends if EXTRACTOR_BACKENDS.get(b, (None, None))[1] is not None]
+    for skipped in sorted(set(args.backends) - set(backends)):
+        print(f"Skipping {skipped}: unknown or not installed")
+    print(f"Extracting {len(pdf_paths)} PDFs from {args.folder} with {', '.join(backends)}\n")
+
+    results = {}
+    # A fresh spawned process per backend, so imports and memory of one backend don't skew another
+    context = multiprocessing.get_context("spawn")
+    for backend in backends:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results[backend] = executor.submit(run_backend, backend, pdf_paths).result()
+
+    reference = results.get(args.reference)
+    if reference is None:
+        print(f"Reference backend {args.reference!r} was not run; skipping text quality\n")
+    header = f"{'backend':<12}{'pages':>7}{'pages/sec':>11}{'peak RSS':>11}{'+extract':>10}{'empty':>8}{'errors':>8}"
+    print(header + (f"{'word F1':>9}" if reference else ""))
+    for backend, result in results.items():
+        pages = [page for document in result["words"] if document for page in document]
+        empty = sum(1 for page in pages if not page)
+        line = (f"{backend:<12}{len(pages):>7}{len(pages) / max(result['seconds'], 1e-9):>11.1f}"
+                f"{result['peak_rss_mb']:>9.0f}MB{result['peak_rss_mb'] - result['baseline_rss_mb']:>8.0f}MB"
+                f"{empty / max(len(pages), 1):>8.1%}{result['errors']:>8}")
+        if reference:
+            # Compare page by page where both backends read the document with the same page count
+            scores = [word_f1(page, reference_page)
+                      for document, reference_document in zip(result["words"], reference["words"])
+                      if document and reference_document and len(document) == len(reference_document)
+                      for page, reference_page in zip(document, reference_document)]
+            line += f"{sum(scores) / len(scores):>9.3f}" if scores else f"{'-':>9}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
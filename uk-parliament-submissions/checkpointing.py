@@ -0,0 +1,148 @@
+"""
+Append-only JSONL journal of completed rows for resumable process_df_prompts runs.
+
+Each completed row is written as one line and flushed immediately, so a run
+that dies part way through can be restarted with the same checkpoint path and
+only the rows missing from the journal are sent to the model again.
+
+Batch mode also keeps a BatchLedger next to the journal: every provider batch
+is recorded with the rows it carries as soon as it is submitted, so a restarted
+run collects batches that were still running instead of submitting them again.
+"""
+
+import os
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def index_key(idx):
+    """
+    Normalise a dataframe index label to what it looks like after a JSON round trip.
+    Labels JSON has no type for (timestamps, dates, periods, ...) are keyed by their str().
+    """
+    if hasattr(idx, "item"):
+        idx = idx.item()
+    if isinstance(idx, tuple):
+        return tuple(index_key(part) for part in idx)
+    if idx is None or isinstance(idx, (str, int, float)):
+        return idx
+    return str(idx)
+
+
+def _from_json_key(value):
+    return tuple(_from_json_key(part) for part in value) if isinstance(value, list) else value
+
+
+def prompt_fingerprint(*parts):
+    """Short hash of the inputs that produced a row, used to ignore stale journal entries."""
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class _JsonlLog:
+    """Append-only JSONL file; each record is flushed as soon as it is written."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def _records(self):
+        """Yield each readable record; a truncated last line from a crash is skipped."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line_num, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring unreadable line {line_num} in checkpoint {self.path}")
+
+    def _write(self, record):
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+            if self._file.tell() and not self._ends_with_newline():
+                # A crash cut the last record short; start on a fresh line so the first new
+                # record is not glued onto it (and lost with it on the next load)
+                self._file.write("\n")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CompletionJournal(_JsonlLog):
+    """
+    Append-only JSONL journal of completed rows.
+
+    Each line holds the row index, a fingerprint of its prompt, the response and the
+    token usage. A truncated last line from a crash is ignored on load.
+    """
+
+    def load(self):
+        """Return {index: record} for every row already completed."""
+        return {_from_json_key(record["index"]): record for record in self._records()}
+
+    def append(self, idx, fingerprint, response, token_usage):
+        """Record a completed row and flush it to disk."""
+        record = {"index": index_key(idx), "fingerprint": fingerprint, "response": response}
+        record.update(token_usage or {})
+        self._write(record)
+
+
+class BatchLedger(_JsonlLog):
+    """
+    Append-only JSONL record of the provider batches of a checkpointed batch-mode run.
+
+    A batch is written when it is submitted, with the row index and prompt fingerprint behind
+    each custom_id, and marked finished once its results are in the journal.
+    """
+
+    @staticmethod
+    def path_for(checkpoint_path):
+        """Ledger path kept next to a checkpoint journal."""
+        root, ext = os.path.splitext(checkpoint_path)
+        return f"{root}.batches{ext or '.jsonl'}"
+
+    def load(self):
+        """Return {batch_id: {"model_type": ..., "rows": {custom_id: (index, fingerprint)}}} of unfinished batches."""
+        batches = {}
+        for record in self._records():
+            if record.get("finished"):
+                batches.pop(record["batch_id"], None)
+                continue
+            rows = {custom_id: (_from_json_key(idx), fingerprint)
+                    for custom_id, (idx, fingerprint) in record["rows"].items()}
+            batches[record["batch_id"]] = {"model_type": record["model_type"], "rows": rows}
+        return batches
+
+    def submitted(self, batch_id, model_type, rows):
+        """Record a submitted batch; rows maps each custom_id to (index, fingerprint)."""
+        self._write({"batch_id": batch_id, "model_type": model_type,
+                     "rows": {custom_id: [index_key(idx), fingerprint] for custom_id, (idx, fingerprint) in rows.items()}})
+
+    def finished(self, batch_id):
+        """Mark a batch whose results have been recorded."""
+        self._write({"batch_id": batch_id, "finished": True})
@@ -0,0 +1,146 @@
+"""
+On-disk, content-addressed cache for model completions.
+
+Entries are keyed on a hash of everything that determines a completion
+(provider, model, system prompt, messages, max_tokens, temperature) and stored
+in a local SQLite file, so re-running a script after a crash or an unrelated
+prompt tweak does not pay again for identical requests.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.environ.get("COMPLETION_CACHE_PATH", ".completion_cache.sqlite")
+DEFAULT_MAX_ENTRIES = 100_000
+
+
+def make_cache_key(provider, model, system_prompt, messages, max_tokens, temperature):
+    """Return a stable SHA-256 hex digest for a completion request."""
+    payload = json.dumps(
+        {
+            "provider": provider,
+            "model": model,
+            "system": system_prompt,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """
+    SQLite-backed completion cache with size-bounded LRU eviction.
+
+    Args:
+        path (str): SQLite file to store entries in
+        max_entries (int, optional): Evict least recently used entries above this count
+        max_bytes (int, optional): Evict least recently used entries above this total response size
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    token_usage TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_completions_last_access ON completions (last_access)"
+            )
+
+    def get(self, key):
+        """Return (response, token_usage) for key, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, token_usage FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE completions SET last_access = ? WHERE key = ?", (time.time(), key)
+                )
+        return row[0], json.loads(row[1])
+
+    def put(self, key, response, token_usage):
+        """Store a completion and evict least recently used entries if over the size bounds."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, response, token_usage, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response, json.dumps(token_usage), len(response.encode("utf-8")), time.time()),
+            )
+            self._evict()
+
+    def _evict(self):
+        if self.max_entries is not None:
+            self._conn.execute(
+                "DELETE FROM completions WHERE key IN ("
+                "SELECT key FROM completions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        if self.max_bytes is not None:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+            if total > self.max_bytes:
+                evicted = 0
+                rows = self._conn.execute(
+                    "SELECT key, size FROM completions ORDER BY last_access ASC"
+                ).fetchall()
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    total -= size
+                    evicted += 1
+                logger.debug(f"Evicted {evicted} completion cache entries")
+
+    def clear(self):
+        """Remove every entry and reset the hit/miss counters."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM completions")
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
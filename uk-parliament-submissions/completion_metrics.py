@@ -0,0 +1,259 @@
+"""
+In-process telemetry for model completion calls.
+
+Every call made through model_completions is recorded in a MetricsRegistry
+with its provider, model, latency, time to first token, token counts,
+retries and error class. The registry can summarise the calls (latency
+percentiles, throughput, estimated cost), return them as a dataframe, or
+write them out in the Prometheus text exposition format.
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_RECORDS = 100_000
+
+# USD per million tokens; update when provider pricing changes
+MODEL_PRICES = {
+    "claude-3-7-sonnet-20250219": {"input": 3.00, "output": 15.00, "cache_write": 3.75, "cache_read": 0.30},
+    "gpt-4o-2024-08-06": {"input": 2.50, "output": 10.00, "cache_write": 2.50, "cache_read": 1.25},
+}
+# Provider batch APIs are billed at half the interactive price
+BATCH_DISCOUNT = 0.5
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+
+
+@dataclass
+class CompletionRecord:
+    """One completion call."""
+    provider: str
+    model: str
+    started_at: float
+    latency: Optional[float] = None
+    time_to_first_token: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    retries: int = 0
+    error_class: Optional[str] = None
+    cached: bool = False
+    mode: str = "interactive"
+
+
+def estimate_cost(record):
+    """Estimated USD cost of a call from MODEL_PRICES (0 for cache hits and unknown models)."""
+    prices = MODEL_PRICES.get(record.model)
+    if prices is None or record.cached:
+        return 0.0
+    uncached_input = record.prompt_tokens
+    if record.provider == "gpt":
+        # OpenAI includes cached tokens in prompt_tokens
+        uncached_input -= record.cache_read_input_tokens
+    cost = (
+        uncached_input * prices["input"]
+        + record.completion_tokens * prices["output"]
+        + record.cache_creation_input_tokens * prices["cache_write"]
+        + record.cache_read_input_tokens * prices["cache_read"]
+    ) / 1_000_000
+    return cost * BATCH_DISCOUNT if record.mode == "batch" else cost
+
+
+class MetricsRegistry:
+    """Thread-safe store of the most recent completion records."""
+
+    def __init__(self, max_records=DEFAULT_MAX_RECORDS):
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def record(self, provider, model, **fields):
+        """Add a record built from keyword fields of CompletionRecord."""
+        fields.setdefault("started_at", time.time())
+        self.add(CompletionRecord(provider=provider, model=model, **fields))
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def to_dataframe(self):
+        """All retained records, one row per call, with an estimated cost column."""
+        records = self.records()
+        df = pd.DataFrame([asdict(record) for record in records],
+                          columns=list(CompletionRecord.__dataclass_fields__))
+        df["cost_usd"] = [estimate_cost(record) for record in records]
+        return df
+
+    def summary(self):
+        """
+        Per provider/model summary: call and error counts, cache hits, latency and
+        time-to-first-token percentiles, output tokens/sec and estimated cost.
+        """
+        df = self.to_dataframe()
+        rows = []
+        for (provider, model), group in df.groupby(["provider", "model"]):
+            # Cache hits and batch results have no meaningful request latency
+            timed = group[~group["cached"] & group["latency"].notna() & group["error_class"].isna()]
+            latency = timed["latency"].astype(float)
+            ttft = timed["time_to_first_token"].dropna().astype(float)
+            row = {
+                "provider": provider,
+                "model": model,
+                "calls": len(group),
+                "errors": int(group["error_class"].notna().sum()),
+                "cache_hits": int(group["cached"].sum()),
+                "retries": int(group["retries"].sum()),
+                "prompt_tokens": int(group["prompt_tokens"].sum()),
+                "completion_tokens": int(group["completion_tokens"].sum()),
+                "cache_creation_input_tokens": int(group["cache_creation_input_tokens"].sum()),
+                "cache_read_input_tokens": int(group["cache_read_input_tokens"].sum()),
+                "output_tokens_per_sec": (timed["completion_tokens"].sum() / latency.sum()) if latency.sum() else None,
+                "cost_usd": float(group["cost_usd"].sum()),
+            }
+            for q in LATENCY_QUANTILES:
+                row[f"latency_p{int(q * 100)}"] = latency.quantile(q) if len(latency) else None
+            for q in LATENCY_QUANTILES:
+                row[f"ttft_p{int(q * 100)}"] = ttft.quantile(q) if len(ttft) else None
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def to_prometheus(self, prefix="model_completion"):
+        """Render the retained records in the Prometheus text exposition format."""
+        df = self.to_dataframe()
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {metric_type}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{prefix}_{name}{suffix}{{{label_text}}} {value}")
+
+        requests, tokens, retries, cost, latency = [], [], [], [], []
+        for (provider, model), group in df.groupby(["provider", "model"]):
+            base = {"provider": provider, "model": model}
+            errors = group["error_class"].notna()
+            requests.append(("", dict(base, status="ok"), int((~errors & ~group["cached"]).sum())))
+            requests.append(("", dict(base, status="cached"), int(group["cached"].sum())))
+            for error_class, count in group.loc[errors, "error_class"].value_counts().items():
+                requests.append(("", dict(base, status="error", error_class=error_class), int(count)))
+            for column in ("prompt_tokens", "completion_tokens",
+                           "cache_creation_input_tokens", "cache_read_input_tokens"):
+                tokens.append(("", dict(base, type=column), int(group[column].sum())))
+            retries.append(("", base, int(group["retries"].sum())))
+            cost.append(("", base, float(group["cost_usd"].sum())))
+            timed = group.loc[~group["cached"] & ~errors, "latency"].dropna().astype(float)
+            for q in LATENCY_QUANTILES:
+                if len(timed):
+                    latency.append(("", dict(base, quantile=str(q)), float(timed.quantile(q))))
+            latency.append(("_sum", base, float(timed.sum())))
+            latency.append(("_count", base, len(timed)))
+
+        metric("requests_total", "counter", "Completion calls by outcome.", requests)
+        metric("tokens_total", "counter", "Tokens used by completion calls.", tokens)
+        metric("retries_total", "counter", "Retries of rate limited or failed calls.", retries)
+        metric("cost_usd_total", "counter", "Estimated cost of completion calls in USD.", cost)
+        metric("latency_seconds", "summary", "Latency of completion calls.", latency)
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, prefix="model_completion"):
+        """Write to_prometheus() to a file, e.g. for the node_exporter textfile collector."""
+        with open(path, "w") as f:
+            f.write(self.to_prometheus(prefix))
+
+
+class CallTracker:
+    """Collects the fields of one call while it runs; see track_completion()."""
+
+    def __init__(self, provider, model, mode="interactive"):
+        self.provider = provider
+        self.model = model
+        self.mode = mode
+        self.started_at = time.time()
+        self.started = time.monotonic()
+        self.time_to_first_token = None
+        self.retries = 0
+        self.cached = False
+        self.token_usage = None
+        self.error_class = None
+
+    def count_retry(self, *args):
+        self.retries += 1
+
+    def first_token(self):
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.monotonic() - self.started
+
+    def set_usage(self, token_usage):
+        self.token_usage = token_usage
+
+    def fail(self, error):
+        """Mark the call as failed when the error is handled inside the tracked block."""
+        self.error_class = type(error).__name__
+
+    def to_record(self, error_class=None):
+        usage = self.token_usage or {}
+        return CompletionRecord(
+            provider=self.provider,
+            model=self.model,
+            started_at=self.started_at,
+            latency=time.monotonic() - self.started,
+            time_to_first_token=self.time_to_first_token,
+            prompt_tokens=usage.get("prompt_tokens") or 0,
+            completion_tokens=usage.get("completion_tokens") or 0,
+            cache_creation_input_tokens=usage.get("cache_creation_input_tokens") or 0,
+            cache_read_input_tokens=usage.get("cache_read_input_tokens") or 0,
+            retries=self.retries,
+            error_class=error_class or self.error_class,
+            cached=self.cached,
+            mode=self.mode,
+        )
+
+
+@contextmanager
+def track_completion(provider, model, registry=None, mode="interactive"):
+    """
+    Record one completion call in the registry.
+
+    An exception escaping the block is recorded with its class name and re-raised.
+
+        with track_completion("claude", model) as call:
+            response = call_with_retries(..., on_retry=call.count_retry)
+            call.set_usage(token_usage)
+    """
+    tracker = CallTracker(provider, model, mode)
+    error_class = None
+    try:
+        yield tracker
+    except GeneratorExit:
+        # A stream closed early by its consumer is not a failed call
+        raise
+    except BaseException as e:
+        error_class = type(e).__name__
+        raise
+    finally:
+        (registry or get_metrics_registry()).add(tracker.to_record(error_class))
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry():
+    """Return the process-wide metrics registry."""
+    return _registry
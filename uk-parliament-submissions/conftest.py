@@ -0,0 +1,70 @@
+import pytest
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages):
+    """
+    Write a minimal PDF with a Helvetica text layer.
+
+    Args:
+        path: File to write
+        pages (list): One list of text lines per page; an empty string leaves a blank line
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for lines in pages:
+        commands = ["BT", "/F1 11 Tf", "14 TL", "72 770 Td"]
+        for line in lines:
+            commands.append(f"({_escape(line)}) Tj T*")
+        commands.append("ET")
+        stream = "\n".join(commands)
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(bytes(out))
+    return path
+
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """Factory writing small text PDFs into the test's temporary directory."""
+    def make(name, pages):
+        return write_pdf(tmp_path / name, pages)
+    return make
+
+
+@pytest.fixture(autouse=True)
+def page_cache(tmp_path, monkeypatch):
+    """Give every test its own on-disk page cache instead of the shared one in the working directory."""
+    import pdf_extraction
+
+    cache = pdf_extraction.PageCache(str(tmp_path / "pages.sqlite"))
+    monkeypatch.setattr(pdf_extraction, "_page_cache", cache)
+    monkeypatch.setattr(pdf_extraction, "_page_cache_enabled", True)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def no_completion_cache(monkeypatch):
+    """Disable the shared completion cache for one test; the previous cache is restored afterwards."""
+    model_completions = pytest.importorskip("model_completions")
+    monkeypatch.setattr(model_completions, "_completion_cache", None)
+    monkeypatch.setattr(model_completions, "_completion_cache_enabled", False)
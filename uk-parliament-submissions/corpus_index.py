@@ -0,0 +1,363 @@
+"""
+Persistent inverted index over the evidence corpus.
+
+Every word of every extracted page is recorded as a posting (document, page,
+token position, character offset). Postings are stored on disk as NumPy
+arrays sorted by term and memory-mapped on load, so opening the index is
+instant and answering a query only touches the postings of the terms
+involved. The index is updated incrementally: only new or changed PDFs are
+tokenised, moved files are recognised by their content hash, and the
+postings of unchanged documents are carried over as they are.
+
+Queries use the term expression language of term_filter.py
+("agent AND stability", '"AI agent" OR GPAI', ...). A single word matches
+wherever it occurs inside a word, which is exactly `'agent' in text.lower()`.
+A phrase matches consecutive words whose first word ends with, and last word
+starts with, the query's first and last words. Words are split on non-word
+characters, so a phrase also matches across line breaks, punctuation and
+paragraph ends where a substring scan would not: phrase hits are candidates
+to be confirmed on the text. match() only answers expressions made of single
+words and returns None for the rest, so callers fall back to scanning.
+"""
+
+import os
+import re
+import json
+import bisect
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from pdf_extraction import EXTRACTOR_VERSION, document_hash, extract_documents
+from term_filter import FilterResult, TermFilter, evaluate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = os.environ.get("CORPUS_INDEX_PATH", ".corpus_index")
+INDEX_FORMAT_VERSION = 1
+_WORD_RE = re.compile(r"\w+")
+# Postings columns
+DOC, PAGE, POSITION, OFFSET = range(4)
+# Bit layout of the (doc, page, position) keys used to join phrase terms
+_PAGE_BITS = 21
+_POSITION_BITS = 21
+# Term expansions and query hits remembered per index; the filters only ever ask for a few dozen terms
+QUERY_CACHE_SIZE = 1024
+
+
+def tokenize_with_offsets(text: str):
+    """Lowercased word tokens of a page with their character offsets in the original text."""
+    return [(match.group().lower(), match.start()) for match in _WORD_RE.finditer(text)]
+
+
+def _query_tokens(text: str) -> List[str]:
+    return [token.lower() for token in _WORD_RE.findall(text)]
+
+
+def is_exact_term(term: str) -> bool:
+    """True if index lookups of the term give exactly the substring scan's answer (a single word)."""
+    return _query_tokens(term) == [term.lower()]
+
+
+class CorpusIndex:
+    """
+    On-disk inverted index of page text.
+
+    Args:
+        path (str): Directory holding the index files (created on the first update)
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_DIR):
+        self.path = Path(path)
+        self._load()
+
+    # ----------------------------------------------------------------- storage
+
+    def _load(self):
+        meta_path = self.path / "meta.json"
+        meta = None
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("format") != INDEX_FORMAT_VERSION or meta.get("extractor_version") != EXTRACTOR_VERSION:
+                logger.info(f"Index at {self.path} was built with another format or extractor; it will be rebuilt")
+                meta = None
+        if meta is None:
+            self.terms = []
+            self.documents = []
+            self._term_starts = np.zeros(1, dtype=np.int64)
+            self._postings = np.zeros((0, 4), dtype=np.int32)
+        else:
+            self.terms = meta["terms"]
+            self.documents = meta["documents"]
+            self._term_starts = np.load(self.path / "term_starts.npy")
+            self._postings = np.load(self.path / "postings.npy", mmap_mode="r")
+        self._term_ids = {term: i for i, term in enumerate(self.terms)}
+        self._doc_ids = {doc["path"]: i for i, doc in enumerate(self.documents)}
+        # Both caches hold term ids and postings of the files just loaded
+        self._expansions = {}
+        self._query_hits = {}
+
+    def _save(self, terms, documents, term_starts, postings):
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Write to temporary names first so a crash never leaves a half-written index
+        np.save(self.path / "postings.tmp.npy", postings)
+        np.save(self.path / "term_starts.tmp.npy", term_starts)
+        with open(self.path / "meta.tmp.json", "w", encoding="utf-8") as f:
+            json.dump({"format": INDEX_FORMAT_VERSION, "extractor_version": EXTRACTOR_VERSION,
+                       "terms": terms, "documents": documents}, f)
+        os.replace(self.path / "postings.tmp.npy", self.path / "postings.npy")
+        os.replace(self.path / "term_starts.tmp.npy", self.path / "term_starts.npy")
+        os.replace(self.path / "meta.tmp.json", self.path / "meta.json")
+        self._load()
+
+    # ----------------------------------------------------------------- updates
+
+    def update(self, pdf_paths, prune: bool = False, max_workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        Bring the index up to date with the given PDFs.
+
+        Only new or changed files are extracted and tokenised; a file moved or renamed since
+        the last update keeps its postings.
+
+        Args:
+            pdf_paths (list): PDFs that should be in the index
+            prune (bool): Also drop indexed documents that are not in pdf_paths
+            max_workers (int, optional): Extraction processes (see extract_documents)
+
+        Returns:
+            dict: Counts of added, updated, moved, removed and unchanged documents
+        """
+        wanted = {}
+        for pdf_path in pdf_paths:
+            key = str(Path(pdf_path).resolve())
+            try:
+                wanted[key] = document_hash(pdf_path)
+            except OSError as e:
+                logger.error(f"Error reading {pdf_path}: {e}")
+
+        stats = {"added": 0, "updated": 0, "moved": 0, "removed": 0, "unchanged": 0}
+        by_hash = {}
+        for doc_id, doc in enumerate(self.documents):
+            by_hash.setdefault(doc["sha256"], []).append(doc_id)
+
+        keep = {}  # old doc id -> path it is kept under
+        to_index = []
+        for key, sha256 in wanted.items():
+            doc_id = self._doc_ids.get(key)
+            if doc_id is not None and self.documents[doc_id]["sha256"] == sha256:
+                keep[doc_id] = key
+                stats["unchanged"] += 1
+                continue
+            moved_from = next((i for i in by_hash.get(sha256, [])
+                               if i not in keep and self.documents[i]["path"] not in wanted), None)
+            if moved_from is not None:
+                keep[moved_from] = key
+                stats["moved"] += 1
+                continue
+            to_index.append(key)
+            stats["updated" if doc_id is not None else "added"] += 1
+
+        for doc_id, doc in enumerate(self.documents):
+            if doc_id not in keep and (prune or doc["path"] in wanted):
+                stats["removed"] += doc["path"] not in wanted
+            elif doc_id not in keep:
+                # Not asked about and not pruned: carry over unchanged
+                keep[doc_id] = doc["path"]
+
+        if not to_index and len(keep) == len(self.documents) and all(
+                self.documents[i]["path"] == path for i, path in keep.items()):
+            return stats
+
+        # Carry over the postings of kept documents under their new ids
+        documents = []
+        doc_map = np.full(len(self.documents) + 1, -1, dtype=np.int64)
+        for old_id in sorted(keep):
+            doc_map[old_id] = len(documents)
+            documents.append({**self.documents[old_id], "path": keep[old_id]})
+        old_term_ids = np.repeat(np.arange(len(self.terms), dtype=np.int64), np.diff(self._term_starts))
+        old_postings = np.asarray(self._postings)
+        kept_rows = doc_map[old_postings[:, DOC]] >= 0 if len(old_postings) else np.zeros(0, dtype=bool)
+        term_columns = [old_term_ids[kept_rows]]
+        posting_blocks = [old_postings[kept_rows].astype(np.int32)]
+        if len(posting_blocks[0]):
+            posting_blocks[0][:, DOC] = doc_map[posting_blocks[0][:, DOC]]
+        vocabulary = dict(self._term_ids)
+        terms = list(self.terms)
+
+        # Tokenise new and changed documents
+        for pdf_path, pages in extract_documents(to_index, max_workers=max_workers):
+            if not pages:
+                # Unreadable (already logged); left out so the next update retries it
+                continue
+            doc_id = len(documents)
+            documents.append({"path": str(pdf_path), "sha256": wanted[str(pdf_path)], "pages": len(pages)})
+            rows, term_ids = [], []
+            for page in pages:
+                for position, (token, offset) in enumerate(tokenize_with_offsets(page.text)):
+                    term_id = vocabulary.get(token)
+                    if term_id is None:
+                        term_id = vocabulary[token] = len(terms)
+                        terms.append(token)
+                    term_ids.append(term_id)
+                    rows.append((doc_id, page.page, position, offset))
+            if rows:
+                term_columns.append(np.array(term_ids, dtype=np.int64))
+                posting_blocks.append(np.array(rows, dtype=np.int32))
+
+        term_column = np.concatenate(term_columns)
+        postings = np.concatenate(posting_blocks) if posting_blocks else np.zeros((0, 4), dtype=np.int32)
+
+        # Drop terms left without postings, keeping the vocabulary sorted
+        used = np.unique(term_column)
+        order = sorted(used.tolist(), key=lambda i: terms[i])
+        remap = np.full(len(terms), -1, dtype=np.int64)
+        remap[order] = np.arange(len(order))
+        term_column = remap[term_column]
+        sort = np.lexsort((postings[:, POSITION], postings[:, PAGE], postings[:, DOC], term_column))
+        postings = postings[sort]
+        term_starts = np.searchsorted(term_column[sort], np.arange(len(order) + 1)).astype(np.int64)
+
+        self._save([terms[i] for i in order], documents, term_starts, postings)
+        logger.info(f"Index updated: {stats}")
+        return stats
+
+    # ----------------------------------------------------------------- queries
+
+    def __contains__(self, pdf_path):
+        return str(Path(pdf_path).resolve()) in self._doc_ids
+
+    def __len__(self):
+        return len(self.documents)
+
+    def _term_rows(self, term_id):
+        return self._postings[self._term_starts[term_id]:self._term_starts[term_id + 1]]
+
+    @staticmethod
+    def _memoised(cache, key, compute):
+        if key not in cache:
+            if len(cache) >= QUERY_CACHE_SIZE:
+                cache.clear()
+            cache[key] = compute()
+        return cache[key]
+
+    def _expand(self, token, mode):
+        """Ids of indexed terms containing ("in"), ending with ("end"), starting with ("start") or equal to token."""
+        return self._memoised(self._expansions, (token, mode), lambda: self._expand_uncached(token, mode))
+
+    def _expand_uncached(self, token, mode):
+        if mode == "exact":
+            term_id = self._term_ids.get(token)
+            return () if term_id is None else (term_id,)
+        if mode == "start":
+            # The vocabulary is sorted, so prefix matches are one contiguous range
+            start = end = bisect.bisect_left(self.terms, token)
+            while end < len(self.terms) and self.terms[end].startswith(token):
+                end += 1
+            return tuple(range(start, end))
+        test = str.endswith if mode == "end" else str.__contains__
+        return tuple(i for i, term in enumerate(self.terms) if test(term, token))
+
+    def _rows_for(self, term_ids):
+        if not term_ids:
+            return np.zeros((0, 4), dtype=np.int32)
+        return np.concatenate([np.asarray(self._term_rows(i)) for i in term_ids])
+
+    @staticmethod
+    def _doc_rows(rows, doc_id):
+        # Hits are sorted by document, so one document's hits are a contiguous slice
+        start, end = np.searchsorted(rows[:, DOC], [doc_id, doc_id + 1])
+        return rows[start:end]
+
+    @staticmethod
+    def _keys(rows, shift=0):
+        return ((rows[:, DOC].astype(np.int64) << (_PAGE_BITS + _POSITION_BITS))
+                | (rows[:, PAGE].astype(np.int64) << _POSITION_BITS)
+                | (rows[:, POSITION].astype(np.int64) - shift))
+
+    def _hits(self, text):
+        """Postings (of the first word) of every occurrence of a term or phrase, sorted by doc/page/position."""
+        return self._memoised(self._query_hits, text, lambda: self._hits_uncached(text))
+
+    def _hits_uncached(self, text):
+        tokens = _query_tokens(text)
+        if not tokens:
+            return np.zeros((0, 4), dtype=np.int32)
+        if len(tokens) == 1:
+            rows = self._rows_for(self._expand(tokens[0], "in"))
+        else:
+            modes = ["end"] + ["exact"] * (len(tokens) - 2) + ["start"]
+            parts = [self._rows_for(self._expand(token, mode)) for token, mode in zip(tokens, modes)]
+            keys = self._keys(parts[0])
+            common = np.unique(keys)
+            for shift, part in enumerate(parts[1:], 1):
+                common = np.intersect1d(common, self._keys(part, shift), assume_unique=False)
+            rows = parts[0][np.isin(keys, common)]
+        order = np.lexsort((rows[:, POSITION], rows[:, PAGE], rows[:, DOC]))
+        return rows[order]
+
+    def term_pages(self, text) -> Dict[str, int]:
+        """path -> first page on which the term or phrase occurs."""
+        rows = self._hits(text.lower())
+        docs, first = np.unique(rows[:, DOC], return_index=True)
+        return {self.documents[doc]["path"]: int(rows[i, PAGE]) for doc, i in zip(docs, first)}
+
+    def search(self, expression) -> Dict[str, FilterResult]:
+        """
+        Evaluate a term expression (string or TermFilter) against every indexed document.
+
+        Phrase terms are matched as candidates (see the module docstring), so with phrases
+        this may include documents a scan of the text would reject.
+
+        Returns:
+            dict: path -> FilterResult for the documents that match
+        """
+        term_filter = expression if isinstance(expression, TermFilter) else TermFilter(expression)
+        pages_by_term = {term: self.term_pages(term) for term in term_filter.terms}
+        results = {}
+        for doc in self.documents:
+            term_pages = {term: pages.get(doc["path"]) for term, pages in pages_by_term.items()}
+            if evaluate(term_filter.root, term_pages, final=True):
+                results[doc["path"]] = FilterResult(True, term_pages, 0)
+        return results
+
+    def match(self, expression, pdf_path) -> Optional[FilterResult]:
+        """
+        Evaluate a term expression for one document, giving the same result as scanning its text.
+
+        Returns None if the document is not indexed, or if the expression has phrase terms the
+        index can only answer approximately; scan the text instead then.
+        """
+        key = str(Path(pdf_path).resolve())
+        doc_id = self._doc_ids.get(key)
+        if doc_id is None:
+            return None
+        term_filter = expression if isinstance(expression, TermFilter) else TermFilter(expression)
+        if not all(is_exact_term(term) for term in term_filter.terms):
+            return None
+        term_pages = {}
+        for term in term_filter.terms:
+            rows = self._doc_rows(self._hits(term), doc_id)
+            term_pages[term] = int(rows[0, PAGE]) if len(rows) else None
+        return FilterResult(bool(evaluate(term_filter.root, term_pages, final=True)), term_pages, 0)
+
+    def offsets(self, terms, pdf_path) -> Optional[Dict[int, np.ndarray]]:
+        """
+        Character offsets of every occurrence of any of the terms in one document.
+
+        Phrase hits are candidates (they may cross punctuation, line breaks or paragraphs);
+        confirm them on the text around the offset.
+
+        Returns:
+            dict: page -> sorted offsets, or None if the document is not indexed
+        """
+        doc_id = self._doc_ids.get(str(Path(pdf_path).resolve()))
+        if doc_id is None:
+            return None
+        blocks = []
+        for term in terms:
+            blocks.append(self._doc_rows(self._hits(term.lower()), doc_id))
+        rows = np.concatenate(blocks) if blocks else np.zeros((0, 4), dtype=np.int32)
+        return {int(page): np.sort(rows[rows[:, PAGE] == page, OFFSET]) for page in np.unique(rows[:, PAGE])}
@@ -0,0 +1,172 @@
+"""
+Local TF-IDF pre-clustering and de-duplication of findings.
+
+Findings for a question are vectorised with TF-IDF, exact and near-duplicate
+quotes are collapsed onto one representative, and the representatives are
+grouped by average-linkage agglomerative clustering on cosine distance. The
+model then only has to name and summarise clusters that are already formed,
+instead of grouping raw findings itself.
+"""
+
+import re
+import logging
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import squareform
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_FEATURES = 5000
+# Quotes at least this similar (cosine) are treated as the same quote
+DUPLICATE_SIMILARITY = 0.9
+# Average-linkage cosine distance at which clusters stop merging (lower = tighter clusters)
+DEFAULT_DISTANCE_THRESHOLD = 0.85
+# Rows of the similarity matrix computed at once when de-duplicating
+SIMILARITY_BLOCK_ROWS = 1024
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further had
+has have having he her here hers him his how i if in into is it its itself just me more most my
+no nor not now of off on once only or other our ours out over own same she should so some such
+than that the their theirs them then there these they this those through to too under until up
+very was we were what when where which while who whom why will with would you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords or single characters."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def tfidf_vectors(texts: List[str], max_features: int = DEFAULT_MAX_FEATURES):
+    """
+    L2-normalised TF-IDF vectors (sublinear tf, smoothed idf) over the max_features most
+    frequent terms.
+
+    Returns:
+        tuple: (float32 array of shape (len(texts), n_terms), list of terms)
+    """
+    token_lists = [tokenize(text) for text in texts]
+    document_frequency = Counter(term for tokens in token_lists for term in set(tokens))
+    terms = [term for term, _ in document_frequency.most_common(max_features)]
+    vocabulary = {term: i for i, term in enumerate(terms)}
+
+    vectors = np.zeros((len(texts), len(terms)), dtype=np.float32)
+    for row, tokens in enumerate(token_lists):
+        for term, count in Counter(tokens).items():
+            column = vocabulary.get(term)
+            if column is not None:
+                vectors[row, column] = 1.0 + np.log(count)
+    if terms:
+        df = np.array([document_frequency[term] for term in terms], dtype=np.float32)
+        vectors *= np.log((1.0 + len(texts)) / (1.0 + df)) + 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors, terms
+
+
+def _normalise_quote(text):
+    return " ".join(text.lower().split())
+
+
+def deduplicate(texts: List[str], vectors, threshold: float = DUPLICATE_SIMILARITY) -> np.ndarray:
+    """
+    Map every text to the index of its representative: the first text that is identical
+    after normalising case and whitespace, or at least `threshold` cosine-similar.
+    """
+    representative = np.arange(len(texts))
+    seen = {}
+    for i, text in enumerate(texts):
+        key = _normalise_quote(text)
+        if key in seen:
+            representative[i] = seen[key]
+        else:
+            seen[key] = i
+
+    unique = np.flatnonzero(representative == np.arange(len(texts)))
+    unique = unique[np.linalg.norm(vectors[unique], axis=1) > 0]
+    assigned = np.zeros(len(unique), dtype=bool)
+    for start in range(0, len(unique), SIMILARITY_BLOCK_ROWS):
+        block = unique[start:start + SIMILARITY_BLOCK_ROWS]
+        similarity = vectors[block] @ vectors[unique].T
+        for offset, i in enumerate(block):
+            position = start + offset
+            if assigned[position]:
+                continue
+            duplicates = np.flatnonzero(similarity[offset, position + 1:] >= threshold) + position + 1
+            duplicates = duplicates[~assigned[duplicates]]
+            assigned[duplicates] = True
+            representative[unique[duplicates]] = i
+    # Exact duplicates of a near-duplicate follow it to its representative
+    return representative[representative]
+
+
+def cluster_vectors(vectors, distance_threshold: float = DEFAULT_DISTANCE_THRESHOLD) -> np.ndarray:
+    """Average-linkage agglomerative clustering on cosine distance; returns 0-based labels."""
+    if len(vectors) < 2:
+        return np.zeros(len(vectors), dtype=int)
+    distance = 1.0 - (vectors @ vectors.T).astype(np.float64)
+    # Vectors with no known terms are unrelated to everything
+    empty = np.linalg.norm(vectors, axis=1) == 0
+    distance[empty, :] = 1.0
+    distance[:, empty] = 1.0
+    np.clip(distance, 0.0, 2.0, out=distance)
+    np.fill_diagonal(distance, 0.0)
+    tree = linkage(squareform(distance, checks=False), method="average")
+    return fcluster(tree, t=distance_threshold, criterion="distance") - 1
+
+
+def precluster_findings(findings: List[Dict], text_key: str = "quote",
+                        distance_threshold: float = DEFAULT_DISTANCE_THRESHOLD,
+                        duplicate_similarity: float = DUPLICATE_SIMILARITY,
+                        max_features: int = DEFAULT_MAX_FEATURES) -> List[Dict]:
+    """
+    Group findings into clusters of similar quotes, collapsing duplicates.
+
+    Args:
+        findings (list): Finding dicts
+        text_key (str): Field holding the text to compare
+        distance_threshold (float): Cosine distance at which clusters stop merging
+        duplicate_similarity (float): Cosine similarity at which quotes count as duplicates
+        max_features (int): Vocabulary size
+
+    Returns:
+        list: One dict per cluster, largest first:
+              {"finding_indices": all findings in the cluster,
+               "representative_indices": one finding per distinct quote,
+               "top_terms": highest weighted terms of the cluster}
+    """
+    if not findings:
+        return []
+    texts = [str(finding.get(text_key) or "") for finding in findings]
+    vectors, terms = tfidf_vectors(texts, max_features)
+    representative = deduplicate(texts, vectors, duplicate_similarity)
+    unique = np.flatnonzero(representative == np.arange(len(texts)))
+    labels = cluster_vectors(vectors[unique], distance_threshold)
+
+    members = {}
+    for label, index in zip(labels, unique):
+        members.setdefault(int(label), []).append(int(index))
+    label_of = {index: label for label, indices in members.items() for index in indices}
+    finding_indices_of = {}
+    for i, rep in enumerate(representative):
+        finding_indices_of.setdefault(label_of[int(rep)], []).append(i)
+
+    clusters = []
+    for label, representative_indices in members.items():
+        finding_indices = finding_indices_of[label]
+        centroid = vectors[representative_indices].mean(axis=0)
+        top_terms = [terms[i] for i in np.argsort(-centroid)[:5] if centroid[i] > 0]
+        clusters.append({
+            "finding_indices": finding_indices,
+            "representative_indices": representative_indices,
+            "top_terms": top_terms,
+        })
+    clusters.sort(key=lambda c: (-len(c["finding_indices"]), c["finding_indices"][0]))
+    logger.info(f"Pre-clustered {len(findings)} findings ({len(unique)} distinct) into {len(clusters)} clusters")
+    return clusters
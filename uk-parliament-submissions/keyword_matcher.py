@@ -0,0 +1,171 @@
+"""
+Compiled multi-keyword matcher (Aho-Corasick).
+
+A KeywordMatcher is built once per keyword set and then finds every
+occurrence of every keyword in a single pass over the text, however many
+keywords there are, instead of one substring scan per keyword. Matching is
+case-insensitive substring matching by default (the same semantics as
+`any(k in text.lower() for k in keywords)`); word_boundary=True only accepts
+hits that are not part of a longer word.
+
+Keywords can be grouped under labels, so one matcher can answer several
+"does the text mention any of these?" questions from the same scan.
+
+Uses the pyahocorasick C extension when it is installed and a pure-Python
+automaton otherwise; both give identical results.
+"""
+
+from collections import Counter, deque
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Set, Union
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+class KeywordMatch(NamedTuple):
+    keyword: str  # Keyword as given (lowercased unless case_sensitive)
+    start: int  # Offset of the first character in the text
+    end: int  # Offset one past the last character
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over a fixed set of keywords.
+
+    Args:
+        keywords (iterable or dict): Keywords, or label -> keywords to group them
+        case_sensitive (bool): Match case exactly instead of lowercasing text and keywords
+        word_boundary (bool): Only report hits not preceded or followed by a letter, digit or underscore
+
+    Offsets refer to the text as given. With case_sensitive=False they are offsets into
+    text.lower(), which only differs for the few characters whose lowercase form is longer.
+    """
+
+    def __init__(self, keywords: Union[Iterable[str], Dict[str, Iterable[str]]],
+                 case_sensitive: bool = False, word_boundary: bool = False):
+        self.case_sensitive = case_sensitive
+        self.word_boundary = word_boundary
+        groups = keywords if isinstance(keywords, dict) else {None: keywords}
+
+        self.keywords: List[str] = []
+        self._labels: Dict[str, Set] = {}
+        for label, group in groups.items():
+            for keyword in group:
+                keyword = self._normalise(keyword)
+                if not keyword:
+                    continue
+                if keyword not in self._labels:
+                    self.keywords.append(keyword)
+                    self._labels[keyword] = set()
+                if label is not None:
+                    self._labels[keyword].add(label)
+
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in self.keywords:
+                self._automaton.add_word(keyword, keyword)
+            if self.keywords:
+                self._automaton.make_automaton()
+        else:
+            self._automaton = None
+            self._build()
+
+    def _normalise(self, text):
+        return text if self.case_sensitive else text.lower()
+
+    def _build(self):
+        """Build the goto/fail/output tables of the pure-Python automaton."""
+        self._goto = [{}]
+        outputs = [[]]
+        for keyword in self.keywords:
+            state = 0
+            for ch in keyword:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(keyword)
+
+        # Breadth-first fail links (depth-one states fail to the root); each state also
+        # emits the keywords of its fail chain
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                outputs[next_state].extend(outputs[self._fail[next_state]])
+        self._outputs = [tuple(out) for out in outputs]
+
+    def _raw_matches(self, text):
+        """Yield (keyword, end offset) for every occurrence, in order of end offset."""
+        if not self.keywords:
+            return
+        if self._automaton is not None:
+            for end_index, keyword in self._automaton.iter(text):
+                yield keyword, end_index + 1
+            return
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if outputs[state]:
+                for keyword in outputs[state]:
+                    yield keyword, i + 1
+
+    def iter_matches(self, text: str) -> Iterator[KeywordMatch]:
+        """Yield every (possibly overlapping) keyword occurrence in one pass over the text."""
+        if not text:
+            return
+        text = self._normalise(text)
+        for keyword, end in self._raw_matches(text):
+            start = end - len(keyword)
+            if self.word_boundary and (
+                    (start > 0 and _is_word_char(text[start - 1]))
+                    or (end < len(text) and _is_word_char(text[end]))):
+                continue
+            yield KeywordMatch(keyword, start, end)
+
+    def find_all(self, text: str) -> List[KeywordMatch]:
+        """All keyword occurrences with their offsets."""
+        return list(self.iter_matches(text))
+
+    def counts(self, text: str) -> Counter:
+        """Number of occurrences of each keyword found in the text."""
+        return Counter(match.keyword for match in self.iter_matches(text))
+
+    def matched_keywords(self, text: str) -> Set[str]:
+        """Keywords that occur in the text."""
+        return {match.keyword for match in self.iter_matches(text)}
+
+    def matched_labels(self, text: str) -> Set:
+        """Labels of the keyword groups with at least one keyword in the text."""
+        labels = set()
+        for match in self.iter_matches(text):
+            labels |= self._labels[match.keyword]
+        return labels
+
+    def contains_any(self, text: str) -> bool:
+        """True if any keyword occurs in the text; stops at the first hit."""
+        return next(self.iter_matches(text), None) is not None
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def __repr__(self):
+        return f"KeywordMatcher({len(self.keywords)} keywords, word_boundary={self.word_boundary})"
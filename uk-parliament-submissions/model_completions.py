@@ -1,175 +1,929 @@
 import os
+import time
+import asyncio
 import logging
+import weakref
+import threading
+import httpx
+import anthropic
+import openai
 import pandas as pd
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from aisitools.api_key import get_api_key_for_proxy
-from anthropic import Anthropic
-from openai import OpenAI
+from anthropic import Anthropic, AsyncAnthropic
+from openai import OpenAI, AsyncOpenAI
+from completion_cache import CompletionCache, make_cache_key
+from batch_completions import run_batch, DEFAULT_POLL_INTERVAL
+from completion_metrics import get_metrics_registry, track_completion
+from checkpointing import BatchLedger, CompletionJournal, index_key, prompt_fingerprint
+from rate_limiting import (
+    DEFAULT_RATE_LIMITS, get_rate_limiter, call_with_retries, acall_with_retries, estimate_tokens,
+    is_retryable_error, is_throttle_error, backoff_delay, MAX_RETRIES
+)
 
-# Configure logging 
+# Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
-def get_claude_completion(system_prompt, conversation_history, anthropic_client, max_tokens=100, temperature=1.0):
-    """Get completion from Anthropic's Claude model."""
+CLAUDE_MODEL_NAME = "claude-3-7-sonnet-20250219"
+GPT_MODEL_NAME = "gpt-4o-2024-08-06"
+
+# Shared on-disk completion cache, opened lazily on first use
+_completion_cache = None
+_completion_cache_enabled = os.environ.get("COMPLETION_CACHE_DISABLED") != "1"
+_completion_cache_lock = threading.Lock()
+
+
+def get_completion_cache():
+    """Return the shared completion cache, or None if caching is disabled."""
+    global _completion_cache
+    if not _completion_cache_enabled:
+        return None
+    with _completion_cache_lock:
+        if _completion_cache is None:
+            _completion_cache = CompletionCache()
+    return _completion_cache
+
+
+def set_completion_cache(cache):
+    """Use the given CompletionCache for all completions, or pass None to disable caching."""
+    global _completion_cache, _completion_cache_enabled
+    with _completion_cache_lock:
+        _completion_cache = cache
+        _completion_cache_enabled = cache is not None
+
+
+def _cache_lookup(provider, model, system_prompt, messages, max_tokens, temperature, bypass_cache):
+    """
+    Return (cache, key, cached_result); cache and key are None when caching is bypassed.
+
+    Only temperature 0 requests are cached: replaying a stored sample for a temperature > 0
+    request would silently return the same "random" completion on every call.
+    """
+    cache = None if bypass_cache or temperature != 0 else get_completion_cache()
+    if cache is None:
+        return None, None, None
+    key = make_cache_key(provider, model, system_prompt, messages, max_tokens, temperature)
+    return cache, key, cache.get(key)
+
+
+def _format_claude_messages(conversation_history):
+    """Format the conversation history into Claude's expected format."""
+    messages = []
+    for turn in conversation_history:
+        if "user" in turn:
+            messages.append({"role": "user", "content": turn["user"]})
+        if "assistant" in turn:
+            messages.append({"role": "assistant", "content": turn["assistant"]})
+    return messages
+
+
+def _format_gpt_messages(system_prompt, conversation_history):
+    """Format the conversation history into OpenAI's expected format."""
+    messages = [{"role": "system", "content": system_prompt}]
+    for turn in conversation_history:
+        if "user" in turn:
+            messages.append({"role": "user", "content": turn["user"]})
+        if "assistant" in turn:
+            messages.append({"role": "assistant", "content": turn["assistant"]})
+    return messages
+
+
+def _estimate_input_tokens(system_prompt, messages):
+    """Approximate prompt size used to reserve input-token budget before a call."""
+    return estimate_tokens(system_prompt) + sum(estimate_tokens(message["content"]) for message in messages)
+
+
+# Anthropic ignores cache breakpoints on prefixes shorter than this (Sonnet/Opus models)
+MIN_CACHEABLE_PROMPT_TOKENS = 1024
+
+
+def cacheable_text(text):
+    """Wrap text as a Claude content block marked as a cacheable prompt prefix."""
+    return {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+
+
+def _claude_system(system_prompt, cache_system_prompt):
+    # A cache breakpoint on the system prompt lets every call that shares it reuse the cached prefix
+    if cache_system_prompt and isinstance(system_prompt, str):
+        return [cacheable_text(system_prompt)]
+    return system_prompt
+
+
+def _claude_usage_pair(response):
+    # Cache writes count towards the input-token budget, cache reads do not
+    cache_creation = getattr(response.usage, "cache_creation_input_tokens", None) or 0
+    return response.usage.input_tokens + cache_creation, response.usage.output_tokens
+
+
+def _gpt_usage_pair(response):
+    return response.usage.prompt_tokens, response.usage.completion_tokens
+
+
+def _claude_token_usage(response):
+    # Claude reports uncached input tokens separately from cache writes and cache reads
+    usage = response.usage
+    cache_creation = getattr(usage, "cache_creation_input_tokens", None) or 0
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    return {
+        "prompt_tokens": usage.input_tokens,
+        "completion_tokens": usage.output_tokens,
+        "cache_creation_input_tokens": cache_creation,
+        "cache_read_input_tokens": cache_read,
+        "total_tokens": usage.input_tokens + cache_creation + cache_read + usage.output_tokens
+    }
+
+
+def _gpt_token_usage(response):
+    # OpenAI caches prompt prefixes automatically; cached tokens are included in prompt_tokens
+    details = getattr(response.usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": response.usage.prompt_tokens,
+        "completion_tokens": response.usage.completion_tokens,
+        "cache_creation_input_tokens": 0,
+        "cache_read_input_tokens": getattr(details, "cached_tokens", None) or 0,
+        "total_tokens": response.usage.total_tokens
+    }
+
+
+def get_claude_completion(system_prompt, conversation_history, anthropic_client, max_tokens=100, temperature=1.0,
+                          bypass_cache=False, cache_system_prompt=False):
+    """Get completion from Anthropic's Claude model.
+
+    Identical temperature 0 requests are answered from the shared completion cache unless
+    bypass_cache is set; sampled (temperature > 0) requests always go to the model. With
+    cache_system_prompt the system prompt is marked as a cacheable prefix for Anthropic prompt
+    caching; user turns may also be lists of content blocks built with cacheable_text().
+    """
     try:
-        model_name = "claude-3-7-sonnet-20250219"
-
-        # Format the conversation history into Claude's expected format
-        messages = []
-        for turn in conversation_history:
-            if "user" in turn:
-                messages.append({"role": "user", "content": turn["user"]})
-            if "assistant" in turn:
-                messages.append({"role": "assistant", "content": turn["assistant"]})
-
-        response = anthropic_client.messages.create(
-            model=model_name,
-            max_tokens=max_tokens,
-            messages=messages,
-            system=system_prompt,
-            temperature=temperature,
-        )
+        with track_completion("claude", CLAUDE_MODEL_NAME) as call:
+            system_prompt = _claude_system(system_prompt, cache_system_prompt)
+            messages = _format_claude_messages(conversation_history)
+            cache, cache_key, cached = _cache_lookup(
+                "claude", CLAUDE_MODEL_NAME, system_prompt, messages, max_tokens, temperature, bypass_cache
+            )
+            if cached is not None:
+                call.cached = True
+                logger.info("Claude completion served from cache")
+                return cached
 
-        # Extract the response
-        assistant_response = response.content[0].text
+            # Rate limited and retried on 429/5xx through the shared Claude limiter
+            response = call_with_retries(
+                lambda: anthropic_client.messages.create(
+                    model=CLAUDE_MODEL_NAME,
+                    max_tokens=max_tokens,
+                    messages=messages,
+                    system=system_prompt,
+                    temperature=temperature,
+                ),
+                get_rate_limiter("claude"),
+                input_tokens=_estimate_input_tokens(system_prompt, messages),
+                output_tokens=max_tokens,
+                on_retry=call.count_retry,
+                usage_of=_claude_usage_pair,
+            )
 
-        # Get token usage
-        token_usage = {
-            "prompt_tokens": response.usage.input_tokens,
-            "completion_tokens": response.usage.output_tokens,
-            "total_tokens": response.usage.input_tokens + response.usage.output_tokens
-        }
+            # Extract the response
+            assistant_response = response.content[0].text
+
+            # Get token usage
+            token_usage = _claude_token_usage(response)
+            call.set_usage(token_usage)
+
+            # Log token usage
+            logger.info(f"Claude Token Usage: {token_usage}")
+
+            if cache is not None:
+                cache.put(cache_key, assistant_response, token_usage)
+
+            return assistant_response, token_usage
+
+    except Exception as e:
+        logger.error(f"Error in getting Claude completion ({type(e).__name__}): {str(e)}")
+        return None, None
+
+
+def get_gpt_completion(system_prompt, conversation_history, openai_client, max_tokens=100, temperature=1.0,
+                       bypass_cache=False):
+    """Get completion from OpenAI's GPT model.
+
+    Identical temperature 0 requests are answered from the shared completion cache unless bypass_cache is set.
+    """
+    try:
+        with track_completion("gpt", GPT_MODEL_NAME) as call:
+            messages = _format_gpt_messages(system_prompt, conversation_history)
+            cache, cache_key, cached = _cache_lookup(
+                "gpt", GPT_MODEL_NAME, system_prompt, messages, max_tokens, temperature, bypass_cache
+            )
+            if cached is not None:
+                call.cached = True
+                logger.info("GPT completion served from cache")
+                return cached
+
+            # Rate limited and retried on 429/5xx through the shared GPT limiter
+            response = call_with_retries(
+                lambda: openai_client.chat.completions.create(
+                    model=GPT_MODEL_NAME,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                ),
+                get_rate_limiter("gpt"),
+                input_tokens=_estimate_input_tokens(None, messages),
+                output_tokens=max_tokens,
+                on_retry=call.count_retry,
+                usage_of=_gpt_usage_pair,
+            )
+
+            # Extract the response
+            assistant_response = response.choices[0].message.content
+
+            # Get token usage
+            token_usage = _gpt_token_usage(response)
+            call.set_usage(token_usage)
+
+            # Log token usage
+            logger.info(f"GPT Token Usage: {token_usage}")
+
+            if cache is not None:
+                cache.put(cache_key, assistant_response, token_usage)
+
+            return assistant_response, token_usage
+
+    except Exception as e:
+        logger.error(f"Error in getting GPT completion ({type(e).__name__}): {str(e)}")
+        return None, None
+
+
+async def aget_claude_completion(system_prompt, conversation_history, anthropic_client, max_tokens=100, temperature=1.0,
+                                 bypass_cache=False, cache_system_prompt=False):
+    """Get completion from Anthropic's Claude model using an AsyncAnthropic client."""
+    try:
+        with track_completion("claude", CLAUDE_MODEL_NAME) as call:
+            system_prompt = _claude_system(system_prompt, cache_system_prompt)
+            messages = _format_claude_messages(conversation_history)
+            cache, cache_key, cached = _cache_lookup(
+                "claude", CLAUDE_MODEL_NAME, system_prompt, messages, max_tokens, temperature, bypass_cache
+            )
+            if cached is not None:
+                call.cached = True
+                logger.info("Claude completion served from cache")
+                return cached
+
+            response = await acall_with_retries(
+                lambda: anthropic_client.messages.create(
+                    model=CLAUDE_MODEL_NAME,
+                    max_tokens=max_tokens,
+                    messages=messages,
+                    system=system_prompt,
+                    temperature=temperature,
+                ),
+                get_rate_limiter("claude"),
+                input_tokens=_estimate_input_tokens(system_prompt, messages),
+                output_tokens=max_tokens,
+                on_retry=call.count_retry,
+                usage_of=_claude_usage_pair,
+            )
 
-        # Log token usage
-        logger.info(f"Claude Token Usage: {token_usage}")
+            assistant_response = response.content[0].text
+            token_usage = _claude_token_usage(response)
+            call.set_usage(token_usage)
+            logger.info(f"Claude Token Usage: {token_usage}")
 
-        return assistant_response, token_usage
+            if cache is not None:
+                cache.put(cache_key, assistant_response, token_usage)
+
+            return assistant_response, token_usage
 
     except Exception as e:
-        logger.error(f"Error in getting Claude completion: {str(e)}")
+        logger.error(f"Error in getting Claude completion ({type(e).__name__}): {str(e)}")
         return None, None
 
 
-def get_gpt_completion(system_prompt, conversation_history, openai_client, max_tokens=100, temperature=1.0):
-    """Get completion from OpenAI's GPT model."""
+async def aget_gpt_completion(system_prompt, conversation_history, openai_client, max_tokens=100, temperature=1.0,
+                              bypass_cache=False):
+    """Get completion from OpenAI's GPT model using an AsyncOpenAI client."""
     try:
-        model_name = "gpt-4o-2024-08-06"
+        with track_completion("gpt", GPT_MODEL_NAME) as call:
+            messages = _format_gpt_messages(system_prompt, conversation_history)
+            cache, cache_key, cached = _cache_lookup(
+                "gpt", GPT_MODEL_NAME, system_prompt, messages, max_tokens, temperature, bypass_cache
+            )
+            if cached is not None:
+                call.cached = True
+                logger.info("GPT completion served from cache")
+                return cached
+
+            response = await acall_with_retries(
+                lambda: openai_client.chat.completions.create(
+                    model=GPT_MODEL_NAME,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                ),
+                get_rate_limiter("gpt"),
+                input_tokens=_estimate_input_tokens(None, messages),
+                output_tokens=max_tokens,
+                on_retry=call.count_retry,
+                usage_of=_gpt_usage_pair,
+            )
+
+            assistant_response = response.choices[0].message.content
+            token_usage = _gpt_token_usage(response)
+            call.set_usage(token_usage)
+            logger.info(f"GPT Token Usage: {token_usage}")
+
+            if cache is not None:
+                cache.put(cache_key, assistant_response, token_usage)
+
+            return assistant_response, token_usage
+
+    except Exception as e:
+        logger.error(f"Error in getting GPT completion ({type(e).__name__}): {str(e)}")
+        return None, None
+
+
+async def aget_completion(model_type, system_prompt, conversation_history, client, max_tokens=100, temperature=1.0,
+                         bypass_cache=False, cache_system_prompt=False):
+    """Get completion from the model selected by model_type ("gpt" or "claude") with an async client."""
+    if model_type == "claude":
+        return await aget_claude_completion(
+            system_prompt, conversation_history, client, max_tokens=max_tokens, temperature=temperature,
+            bypass_cache=bypass_cache, cache_system_prompt=cache_system_prompt
+        )
+    elif model_type == "gpt":
+        return await aget_gpt_completion(
+            system_prompt, conversation_history, client, max_tokens=max_tokens, temperature=temperature,
+            bypass_cache=bypass_cache
+        )
+    logger.error(f"Unsupported model type: {model_type}")
+    return None, None
+
+
+def _stream_with_retries(open_events, provider, label, input_tokens, output_tokens, cache, cache_key, call):
+    """
+    Drive a provider event stream under the shared limiter and re-yield its text deltas.
+
+    Failures before the first token are retried like non-streaming calls; once text has been
+    delivered a failure ends the stream, since the partial output cannot be taken back.
+    """
+    limiter = get_rate_limiter(provider)
+    attempt = 0
+    while True:
+        reservation = limiter.acquire(input_tokens, output_tokens)
+        released = False
+        started = time.monotonic()
+        time_to_first_token = None
+        parts = []
+        token_usage = None
+        try:
+            for event, payload in open_events():
+                if event == "text":
+                    if time_to_first_token is None:
+                        time_to_first_token = time.monotonic() - started
+                        call.first_token()
+                    parts.append(payload)
+                    yield "text", payload
+                else:
+                    token_usage = payload
+        except Exception as e:
+            # Release what was actually used: nothing before the first token, else the input
+            # and the text delivered so far
+            used = (input_tokens, estimate_tokens("".join(parts))) if parts else (0, 0)
+            limiter.release(reservation, *used, throttled=is_throttle_error(e))
+            released = True
+            if parts or not is_retryable_error(e) or attempt >= MAX_RETRIES:
+                logger.error(f"Error in streaming {label} completion ({type(e).__name__}): {str(e)}")
+                call.fail(e)
+                return
+            delay = backoff_delay(attempt, e)
+            logger.warning(f"{provider}: stream attempt {attempt + 1} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            call.count_retry()
+            time.sleep(delay)
+            attempt += 1
+            continue
+        finally:
+            # Also reached when the consumer stops iterating early
+            if not released:
+                used = (None, None)
+                if token_usage:
+                    used = (token_usage["prompt_tokens"] + token_usage.get("cache_creation_input_tokens", 0),
+                            token_usage["completion_tokens"])
+                limiter.release(reservation, *used)
+
+        response = "".join(parts)
+        if token_usage is None:
+            logger.warning(f"{label} stream ended without reporting token usage")
+        call.set_usage(token_usage)
+        logger.info(f"{label} Token Usage: {token_usage}")
+        if cache is not None and token_usage:
+            cache.put(cache_key, response, token_usage)
+        yield "done", {"response": response, "token_usage": token_usage, "time_to_first_token": time_to_first_token}
+        return
+
+
+def _cached_stream(cached):
+    response, token_usage = cached
+    yield "text", response
+    yield "done", {"response": response, "token_usage": token_usage, "time_to_first_token": 0.0}
+
+
+def stream_claude_completion(system_prompt, conversation_history, anthropic_client, max_tokens=100, temperature=1.0,
+                             bypass_cache=False, cache_system_prompt=False):
+    """
+    Stream a completion from Anthropic's Claude model.
+
+    Yields ("text", delta) events as text is generated, then one ("done", info) event where info
+    holds the full response, token_usage and time_to_first_token (seconds). If the call fails the
+    error is logged and the generator stops without a "done" event.
+    """
+    system_prompt = _claude_system(system_prompt, cache_system_prompt)
+    messages = _format_claude_messages(conversation_history)
+
+    def open_events():
+        with anthropic_client.messages.stream(
+            model=CLAUDE_MODEL_NAME,
+            max_tokens=max_tokens,
+            messages=messages,
+            system=system_prompt,
+            temperature=temperature,
+        ) as stream:
+            for text in stream.text_stream:
+                yield "text", text
+            yield "usage", _claude_token_usage(stream.get_final_message())
+
+    with track_completion("claude", CLAUDE_MODEL_NAME) as call:
+        cache, cache_key, cached = _cache_lookup(
+            "claude", CLAUDE_MODEL_NAME, system_prompt, messages, max_tokens, temperature, bypass_cache
+        )
+        if cached is not None:
+            call.cached = True
+            logger.info("Claude completion served from cache")
+            yield from _cached_stream(cached)
+            return
+
+        yield from _stream_with_retries(
+            open_events, "claude", "Claude", _estimate_input_tokens(system_prompt, messages), max_tokens,
+            cache, cache_key, call
+        )
 
-        # Format the conversation history into OpenAI's expected format
-        messages = [{"role": "system", "content": system_prompt}]
 
-        for turn in conversation_history:
-            if "user" in turn:
-                messages.append({"role": "user", "content": turn["user"]})
-            if "assistant" in turn:
-                messages.append({"role": "assistant", "content": turn["assistant"]})
+def stream_gpt_completion(system_prompt, conversation_history, openai_client, max_tokens=100, temperature=1.0,
+                          bypass_cache=False):
+    """Stream a completion from OpenAI's GPT model; yields the same events as stream_claude_completion."""
+    messages = _format_gpt_messages(system_prompt, conversation_history)
 
-        response = openai_client.chat.completions.create(
-            model=model_name,
+    def open_events():
+        stream = openai_client.chat.completions.create(
+            model=GPT_MODEL_NAME,
             messages=messages,
             max_tokens=max_tokens,
             temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
         )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield "text", chunk.choices[0].delta.content
+            # Usage arrives on a final chunk with no choices
+            if chunk.usage:
+                yield "usage", _gpt_token_usage(chunk)
 
-        # Extract the response
-        assistant_response = response.choices[0].message.content
+    with track_completion("gpt", GPT_MODEL_NAME) as call:
+        cache, cache_key, cached = _cache_lookup(
+            "gpt", GPT_MODEL_NAME, system_prompt, messages, max_tokens, temperature, bypass_cache
+        )
+        if cached is not None:
+            call.cached = True
+            logger.info("GPT completion served from cache")
+            yield from _cached_stream(cached)
+            return
 
-        # Get token usage
-        token_usage = {
-            "prompt_tokens": response.usage.prompt_tokens,
-            "completion_tokens": response.usage.completion_tokens,
-            "total_tokens": response.usage.total_tokens
-        }
+        yield from _stream_with_retries(
+            open_events, "gpt", "GPT", _estimate_input_tokens(None, messages), max_tokens,
+            cache, cache_key, call
+        )
 
-        # Log token usage
-        logger.info(f"GPT Token Usage: {token_usage}")
 
-        return assistant_response, token_usage
+def stream_completion(model_type, system_prompt, conversation_history, client, max_tokens=100, temperature=1.0,
+                      bypass_cache=False, cache_system_prompt=False):
+    """Stream a completion from the model selected by model_type ("gpt" or "claude")."""
+    if model_type == "claude":
+        return stream_claude_completion(
+            system_prompt, conversation_history, client, max_tokens=max_tokens, temperature=temperature,
+            bypass_cache=bypass_cache, cache_system_prompt=cache_system_prompt
+        )
+    elif model_type == "gpt":
+        return stream_gpt_completion(
+            system_prompt, conversation_history, client, max_tokens=max_tokens, temperature=temperature,
+            bypass_cache=bypass_cache
+        )
+    logger.error(f"Unsupported model type: {model_type}")
+    return iter(())
 
-    except Exception as e:
-        logger.error(f"Error in getting GPT completion: {str(e)}")
-        return None, None
+
+API_KEY_ENV_VARS = {"claude": "ANTHROPIC_API_KEY", "gpt": "OPENAI_API_KEY"}
+POOL_KEEPALIVE_EXPIRY = 60
+
+# Shared clients: sync clients per (provider, key); async clients additionally per event loop,
+# because their connection pools are bound to the loop they were first used on
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
 
 
-def process_df_prompts(df, model_type, system_prompt="You are a helpful AI assistant.", user_prompt_col='prompt', 
-                       result_col='response', max_tokens=100, temperature=1.0, 
-                       batch_size=None, max_workers=1, show_progress=True):
+def _pool_limits(model_type, max_connections=None):
+    # Size the pool to the limiter's concurrency cap so every in-flight request can reuse a connection
+    if max_connections is None:
+        max_connections = DEFAULT_RATE_LIMITS.get(model_type, {}).get("max_concurrency") or 64
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=POOL_KEEPALIVE_EXPIRY
+    )
+
+
+def create_client(model_type, use_async=False, max_connections=None):
     """
-    Process a dataframe of prompts with the specified model using a single system prompt.
-    
+    Create a new API client for the given model type with a keep-alive connection pool.
+
+    Most callers should use get_client(), which shares one client per provider.
+
     Args:
-        df (pandas.DataFrame): DataFrame containing prompts
         model_type (str): Model to use ("gpt" or "claude")
-        system_prompt (str): System prompt to use for all rows (defaults to "You are a helpful AI assistant.")
-        user_prompt_col (str): Column name with user prompts
-        result_col (str): Column name to store model responses
-        max_tokens (int): Maximum tokens to generate
-        temperature (float): Sampling temperature (0.0 = deterministic, 1.0 = creative)
-        batch_size (int, optional): Process in batches of this size
-        max_workers (int): Number of parallel workers
-        show_progress (bool): Whether to show progress bar
-        
+        use_async (bool): Return AsyncOpenAI/AsyncAnthropic instead of the blocking clients
+        max_connections (int, optional): Connection pool size (defaults to the provider's max concurrency)
+
     Returns:
-        pandas.DataFrame: Original dataframe with added response and token columns
+        The client, or None if the API key is missing or the model type is unsupported
     """
-    # Make a copy of the dataframe to avoid modifying the original
-    result_df = df.copy()
-    
-    # Add result column if it doesn't exist
-    if result_col not in result_df.columns:
-        result_df[result_col] = None
-    
-    # Add token usage columns
-    result_df['prompt_tokens'] = None
-    result_df['completion_tokens'] = None
-    result_df['total_tokens'] = None
-    
-    # Initialize the client based on model type
-    client = None
-    
+    limits = _pool_limits(model_type, max_connections)
+
     if model_type == "gpt":
         # Check if OPENAI_API_KEY is set
         if not os.environ.get("OPENAI_API_KEY"):
             logger.error("OPENAI_API_KEY environment variable not set")
-            return result_df
-            
+            return None
+
         # Get API key using the proxy
         api_key = get_api_key_for_proxy(os.environ.get("OPENAI_API_KEY"))
-        client = OpenAI(api_key=api_key)
-        
+        # Retries are handled by rate_limiting so they are scheduled against the shared budgets
+        if use_async:
+            return AsyncOpenAI(api_key=api_key, max_retries=0,
+                               http_client=openai.DefaultAsyncHttpxClient(limits=limits))
+        return OpenAI(api_key=api_key, max_retries=0, http_client=openai.DefaultHttpxClient(limits=limits))
+
     elif model_type == "claude":
         # Check if ANTHROPIC_API_KEY is set
         if not os.environ.get("ANTHROPIC_API_KEY"):
             logger.error("ANTHROPIC_API_KEY environment variable not set")
-            return result_df
+            return None
 
         # Get API key using the proxy helper
         api_key = get_api_key_for_proxy(os.environ.get("ANTHROPIC_API_KEY"))
-        
-        # Explicitly set the api_key and the base_url for the proxy
-        client = Anthropic(
-            api_key=api_key
+        # Retries are handled by rate_limiting so they are scheduled against the shared budgets
+        if use_async:
+            return AsyncAnthropic(api_key=api_key, max_retries=0,
+                                  http_client=anthropic.DefaultAsyncHttpxClient(limits=limits))
+        return Anthropic(api_key=api_key, max_retries=0, http_client=anthropic.DefaultHttpxClient(limits=limits))
+
+    logger.error(f"Unsupported model type: {model_type}")
+    return None
+
+
+def get_client(model_type, use_async=False):
+    """
+    Return the shared client for a provider, creating it (and looking up the key) on first use.
+
+    Sync clients are shared across threads. Async clients are shared per event loop, so this must
+    be called from inside the loop that will use the client when use_async is set.
+
+    Returns:
+        The client, or None if the API key is missing or the model type is unsupported
+    """
+    env_var = API_KEY_ENV_VARS.get(model_type)
+    raw_key = os.environ.get(env_var) if env_var else None
+    if not raw_key:
+        # Let create_client log the reason
+        return create_client(model_type, use_async)
+
+    registry = _clients
+    if use_async:
+        loop = asyncio.get_running_loop()
+        with _clients_lock:
+            registry = _async_clients.setdefault(loop, {})
+
+    key = (model_type, raw_key)
+    with _clients_lock:
+        client = registry.get(key)
+        if client is None:
+            client = create_client(model_type, use_async)
+            if client is not None:
+                registry[key] = client
+                logger.info(f"Created shared {'async ' if use_async else ''}{model_type} client")
+        return client
+
+
+def close_clients():
+    """Close the shared sync clients and their connection pools."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+async def aclose_clients():
+    """
+    Close the running event loop's shared async clients and their connection pools.
+
+    run_async() does this for the loops it creates; call it before leaving a loop you run yourself.
+    """
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        clients = list(_async_clients.pop(loop, {}).values())
+    for client in clients:
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"Error closing async client ({type(e).__name__}): {str(e)}")
+
+
+def _prepare_result_df(df, result_col):
+    # Make a copy of the dataframe to avoid modifying the original
+    result_df = df.copy()
+
+    # Add result column if it doesn't exist
+    if result_col not in result_df.columns:
+        result_df[result_col] = None
+
+    # Add token usage columns
+    result_df['prompt_tokens'] = None
+    result_df['completion_tokens'] = None
+    result_df['cache_creation_input_tokens'] = None
+    result_df['cache_read_input_tokens'] = None
+    result_df['total_tokens'] = None
+    return result_df
+
+
+def _store_result(result_df, idx, result_col, response, token_usage):
+    if response and token_usage:
+        result_df.at[idx, result_col] = response
+        result_df.at[idx, 'prompt_tokens'] = token_usage.get('prompt_tokens')
+        result_df.at[idx, 'completion_tokens'] = token_usage.get('completion_tokens')
+        result_df.at[idx, 'cache_creation_input_tokens'] = token_usage.get('cache_creation_input_tokens')
+        result_df.at[idx, 'cache_read_input_tokens'] = token_usage.get('cache_read_input_tokens')
+        result_df.at[idx, 'total_tokens'] = token_usage.get('total_tokens')
+        if 'time_to_first_token' in token_usage and 'time_to_first_token' in result_df.columns:
+            result_df.at[idx, 'time_to_first_token'] = token_usage['time_to_first_token']
+
+
+def _resume_from_journal(result_df, journal, fingerprint_of, result_col):
+    """Fill rows already recorded in the journal and return their indices."""
+    completed = set()
+    journal_records = journal.load()
+    for idx in result_df.index:
+        record = journal_records.get(index_key(idx))
+        # Rows whose prompt changed since they were journaled are run again
+        if record is None or record.get("fingerprint") != fingerprint_of(idx):
+            continue
+        _store_result(result_df, idx, result_col, record["response"], record)
+        completed.add(idx)
+    if completed:
+        logger.info(f"Resuming from checkpoint {journal.path}: {len(completed)} rows already done")
+    return completed
+
+
+def _batch_request(model_type, system_prompt, user_prompt, max_tokens, temperature, cache_system_prompt=False):
+    """Return (cache_model_name, system, messages, params) for one row of a provider batch."""
+    if model_type == "claude":
+        system_prompt = _claude_system(system_prompt, cache_system_prompt)
+        messages = _format_claude_messages([{"user": user_prompt}])
+        return CLAUDE_MODEL_NAME, system_prompt, messages, {
+            "model": CLAUDE_MODEL_NAME,
+            "max_tokens": max_tokens,
+            "messages": messages,
+            "system": system_prompt,
+            "temperature": temperature,
+        }
+    messages = _format_gpt_messages(system_prompt, [{"user": user_prompt}])
+    return GPT_MODEL_NAME, system_prompt, messages, {
+        "model": GPT_MODEL_NAME,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+    }
+
+
+def _process_df_batch_mode(result_df, model_type, client, system_prompt, user_prompt_col, result_col,
+                           max_tokens, temperature, batch_size, bypass_cache, cache_system_prompt,
+                           journal, completed, fingerprint_of, poll_interval, timeout):
+    """
+    Send all outstanding rows through the provider batch API and write results back by index.
+
+    With a journal, each batch is recorded in a BatchLedger as soon as it is submitted and each
+    batch's rows are journaled as soon as it finishes. A rerun after an interruption collects the
+    batches that were never finished instead of submitting their rows again.
+    """
+    requests = {}
+    request_rows = {}
+    for position, (idx, user_prompt) in enumerate(result_df[user_prompt_col].items()):
+        if idx in completed or pd.isna(user_prompt):
+            continue
+        model_name, system, messages, params = _batch_request(
+            model_type, system_prompt, user_prompt, max_tokens, temperature, cache_system_prompt
+        )
+        cache, cache_key, cached = _cache_lookup(
+            model_type, model_name, system, messages, max_tokens, temperature, bypass_cache
+        )
+        if cached is not None:
+            response, token_usage = cached
+            _store_result(result_df, idx, result_col, response, token_usage)
+            if journal is not None:
+                journal.append(idx, fingerprint_of(idx), response, token_usage)
+            continue
+        # Batch custom_ids must be short and alphanumeric, so rows are addressed by position
+        custom_id = f"row-{position}"
+        requests[custom_id] = params
+        request_rows[custom_id] = (idx, model_name, cache, cache_key)
+
+    # custom_id -> row of every batch being waited for; a rerun's rows may reuse an earlier run's ids
+    batch_rows = {}
+    ledger = BatchLedger(BatchLedger.path_for(journal.path)) if journal is not None else None
+    if ledger is not None:
+        outstanding = {index_key(row[0]): custom_id for custom_id, row in request_rows.items()}
+        for batch_id, record in ledger.load().items():
+            if record["model_type"] != model_type:
+                continue
+            rows = {}
+            for custom_id, (key, fingerprint) in record["rows"].items():
+                if key in outstanding and fingerprint == fingerprint_of(request_rows[outstanding[key]][0]):
+                    new_id = outstanding.pop(key)
+                    rows[custom_id] = request_rows[new_id]
+                    del requests[new_id]
+            batch_rows[batch_id] = rows
+        if batch_rows:
+            logger.info(f"Collecting {len(batch_rows)} {model_type} batches submitted by an earlier run "
+                        f"({sum(map(len, batch_rows.values()))} rows)")
+
+    def on_submit(batch_id, custom_ids):
+        batch_rows[batch_id] = {custom_id: request_rows[custom_id] for custom_id in custom_ids}
+        if ledger is not None:
+            ledger.submitted(batch_id, model_type, {
+                custom_id: (request_rows[custom_id][0], fingerprint_of(request_rows[custom_id][0]))
+                for custom_id in custom_ids
+            })
+
+    metrics = get_metrics_registry()
+
+    def on_results(batch_id, results):
+        rows = batch_rows[batch_id]
+        for custom_id, (response, token_usage) in results.items():
+            if custom_id not in rows:
+                continue  # A row whose prompt changed since an earlier run submitted it
+            idx, model_name, cache, cache_key = rows[custom_id]
+            _store_result(result_df, idx, result_col, response, token_usage)
+            metrics.record(
+                model_type, model_name, mode="batch",
+                prompt_tokens=token_usage.get("prompt_tokens") or 0,
+                completion_tokens=token_usage.get("completion_tokens") or 0,
+                cache_creation_input_tokens=token_usage.get("cache_creation_input_tokens") or 0,
+                cache_read_input_tokens=token_usage.get("cache_read_input_tokens") or 0
+            )
+            if cache is not None:
+                cache.put(cache_key, response, token_usage)
+            if journal is not None:
+                journal.append(idx, fingerprint_of(idx), response, token_usage)
+        if ledger is not None:
+            ledger.finished(batch_id)
+
+    if not requests and not batch_rows:
+        return
+    logger.info(f"Submitting {len(requests)} {model_type} requests through the batch API")
+    try:
+        run_batch(model_type, client, requests, max_requests_per_batch=batch_size, poll_interval=poll_interval,
+                  timeout=timeout, pending=list(batch_rows), on_submit=on_submit, on_results=on_results)
+    finally:
+        if ledger is not None:
+            ledger.close()
+
+
+def _log_failed_rows(result_df, user_prompt_col, result_col):
+    failed = result_df.index[result_df[user_prompt_col].notna() & result_df[result_col].isna()]
+    if len(failed):
+        logger.warning(
+            f"{len(failed)} of {len(result_df)} rows got no response "
+            f"(first indices: {list(failed[:10])})"
         )
-       
-    else:
-        logger.error(f"Unsupported model type: {model_type}")
+
+
+def process_df_prompts(df, model_type, system_prompt="You are a helpful AI assistant.", user_prompt_col='prompt',
+                       result_col='response', max_tokens=100, temperature=1.0,
+                       batch_size=None, max_workers=1, show_progress=True, bypass_cache=False,
+                       checkpoint_path=None, cache_system_prompt=False, mode="interactive", client=None,
+                       batch_poll_interval=DEFAULT_POLL_INTERVAL, batch_timeout=None, stream_callback=None):
+    """
+    Process a dataframe of prompts with the specified model using a single system prompt.
+
+    Args:
+        df (pandas.DataFrame): DataFrame containing prompts
+        model_type (str): Model to use ("gpt" or "claude")
+        system_prompt (str): System prompt to use for all rows (defaults to "You are a helpful AI assistant.")
+        user_prompt_col (str): Column name with user prompts
+        result_col (str): Column name to store model responses
+        max_tokens (int): Maximum tokens to generate
+        temperature (float): Sampling temperature (0.0 = deterministic, 1.0 = creative)
+        batch_size (int, optional): Interactive mode: maximum number of rows dispatched but not yet
+                                    finished (defaults to all rows). Batch mode: maximum rows per
+                                    provider batch submission (defaults to the provider limit)
+        max_workers (int): Number of rows processed concurrently (interactive mode)
+        show_progress (bool): Whether to show progress bar
+        bypass_cache (bool): Skip the completion cache (only temperature 0 requests are cached)
+        checkpoint_path (str, optional): JSONL journal of completed rows; rerunning with the same
+                                         path skips rows that are already in it. In batch mode the
+                                         submitted batch ids are kept next to it (see BatchLedger), so a
+                                         rerun collects running batches instead of resubmitting them
+        cache_system_prompt (bool): Mark the shared system prompt as a cacheable prefix (Claude only);
+                                    cache writes/reads are reported in the cache_*_input_tokens columns
+        mode (str): "interactive" for one request per row, or "batch" to submit all rows through
+                    the provider batch API (Message Batches / OpenAI Batch) and poll for results
+        client (optional): Anthropic/OpenAI client to use (defaults to the shared client from get_client)
+        batch_poll_interval (float): Batch mode: seconds between batch status checks
+        batch_timeout (float, optional): Batch mode: stop waiting for the batches after this many seconds
+                                         and cancel the unfinished ones; their rows are left without a
+                                         response (with a checkpoint, a rerun collects what the
+                                         cancelled batches completed)
+        stream_callback (callable, optional): Interactive mode: stream each row and call
+                                              stream_callback(index, text_delta) as text arrives
+                                              (from worker threads). Adds a time_to_first_token column
+
+    Returns:
+        pandas.DataFrame: Original dataframe with added response and token columns
+    """
+    result_df = _prepare_result_df(df, result_col)
+
+    if mode not in ("interactive", "batch"):
+        logger.error(f"Unsupported mode: {mode}")
+        return result_df
+
+    # Initialize the client based on model type
+    if client is None:
+        client = get_client(model_type)
+        if client is None:
+            return result_df
+
+    def fingerprint_of(idx):
+        return prompt_fingerprint(model_type, system_prompt, result_df.at[idx, user_prompt_col], max_tokens, temperature)
+
+    journal = CompletionJournal(checkpoint_path) if checkpoint_path else None
+    completed = _resume_from_journal(result_df, journal, fingerprint_of, result_col) if journal else set()
+
+    if mode == "batch":
+        try:
+            _process_df_batch_mode(
+                result_df, model_type, client, system_prompt, user_prompt_col, result_col,
+                max_tokens, temperature, batch_size, bypass_cache, cache_system_prompt,
+                journal, completed, fingerprint_of, batch_poll_interval, batch_timeout
+            )
+        finally:
+            if journal is not None:
+                journal.close()
+        _log_failed_rows(result_df, user_prompt_col, result_col)
         return result_df
-    
+
+    if stream_callback is not None:
+        result_df['time_to_first_token'] = None
+
+    def stream_row(idx, conversation_history):
+        for event, payload in stream_completion(
+            model_type, system_prompt, conversation_history, client, max_tokens=max_tokens,
+            temperature=temperature, bypass_cache=bypass_cache, cache_system_prompt=cache_system_prompt
+        ):
+            if event == "text":
+                stream_callback(idx, payload)
+            else:
+                # Written back to the dataframe on the main thread along with the token counts; a
+                # stream that ended without reporting usage keeps its text with empty token columns
+                token_usage = dict(payload["token_usage"] or {}, time_to_first_token=payload["time_to_first_token"])
+                return payload["response"], token_usage
+        return None, None
+
     # Function to process a single row
-    def process_row(row):
+    def process_row(idx, row):
         # Get user prompt
         user_prompt = row[user_prompt_col]
         if pd.isna(user_prompt):
             return None, None
-        
+
         # Create conversation history
         conversation_history = [{"user": user_prompt}]
-        
+
+        if stream_callback is not None:
+            return stream_row(idx, conversation_history)
+
         # Get model completion
         if model_type == "claude":
             return get_claude_completion(
@@ -177,7 +931,9 @@ def process_df_prompts(df, model_type, system_prompt="You are a helpful AI assis
                 conversation_history,
                 client,
                 max_tokens=max_tokens,
-                temperature=temperature
+                temperature=temperature,
+                bypass_cache=bypass_cache,
+                cache_system_prompt=cache_system_prompt
             )
         elif model_type == "gpt":
             return get_gpt_completion(
@@ -185,34 +941,180 @@ def process_df_prompts(df, model_type, system_prompt="You are a helpful AI assis
                 conversation_history,
                 client,
                 max_tokens=max_tokens,
-                temperature=temperature
+                temperature=temperature,
+                bypass_cache=bypass_cache
             )
-    
-    # Process in batches or all at once
+
+    # At most batch_size rows are dispatched ahead of the ones already finished
     total_rows = len(result_df)
     if batch_size is None:
         batch_size = total_rows
-    
-    # Process in batches sequentially
-    for start_idx in range(0, total_rows, batch_size):
-        end_idx = min(start_idx + batch_size, total_rows)
-        batch = result_df.iloc[start_idx:end_idx]
-        
-        # Wrap with tqdm for progress bar if requested
-        iterator = tqdm(batch.iterrows(), total=len(batch), desc=f"Processing {model_type} batch") if show_progress else batch.iterrows()
-        
-        # Process each row sequentially
-        for idx, row in iterator:
-            response, token_usage = process_row(row)
-            
-            if response and token_usage:
-                result_df.at[idx, result_col] = response
-                result_df.at[idx, 'prompt_tokens'] = token_usage.get('prompt_tokens')
-                result_df.at[idx, 'completion_tokens'] = token_usage.get('completion_tokens')
-                result_df.at[idx, 'total_tokens'] = token_usage.get('total_tokens')
-    
+    batch_size = max(1, batch_size)
+    max_workers = max(1, max_workers)
+
+    rows = ((idx, row) for idx, row in result_df.iterrows() if idx not in completed)
+    progress = tqdm(total=total_rows, initial=len(completed), desc=f"Processing {model_type} prompts") if show_progress else None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+
+        def dispatch():
+            # Keep the dispatch window full
+            while len(pending) < batch_size:
+                next_row = next(rows, None)
+                if next_row is None:
+                    return
+                idx, row = next_row
+                pending[executor.submit(process_row, idx, row)] = idx
+
+        dispatch()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                idx = pending.pop(future)
+                try:
+                    response, token_usage = future.result()
+                except Exception as e:
+                    logger.error(f"Error processing row {idx}: {str(e)}")
+                    response, token_usage = None, None
+
+                # Results are written back by index, so completion order does not matter
+                _store_result(result_df, idx, result_col, response, token_usage)
+                if journal is not None and response and token_usage:
+                    journal.append(idx, fingerprint_of(idx), response, token_usage)
+                if progress is not None:
+                    progress.update(1)
+            dispatch()
+
+    if progress is not None:
+        progress.close()
+    if journal is not None:
+        journal.close()
+
+    _log_failed_rows(result_df, user_prompt_col, result_col)
+    return result_df
+
+
+async def aprocess_df_prompts(df, model_type, system_prompt="You are a helpful AI assistant.", user_prompt_col='prompt',
+                              result_col='response', max_tokens=100, temperature=1.0,
+                              max_concurrency=50, client=None, show_progress=True, bypass_cache=False,
+                              checkpoint_path=None, cache_system_prompt=False):
+    """
+    Async variant of process_df_prompts that keeps up to max_concurrency requests in flight
+    on a single event loop instead of one thread per request.
+
+    Await it directly from a notebook, or wrap it with run_async() from a script.
+
+    Args:
+        df (pandas.DataFrame): DataFrame containing prompts
+        model_type (str): Model to use ("gpt" or "claude")
+        system_prompt (str): System prompt to use for all rows
+        user_prompt_col (str): Column name with user prompts
+        result_col (str): Column name to store model responses
+        max_tokens (int): Maximum tokens to generate
+        temperature (float): Sampling temperature (0.0 = deterministic, 1.0 = creative)
+        max_concurrency (int): Maximum number of requests in flight at once
+        client (optional): AsyncAnthropic/AsyncOpenAI client to use (defaults to the shared client from get_client)
+        show_progress (bool): Whether to show progress bar
+        bypass_cache (bool): Skip the completion cache (only temperature 0 requests are cached)
+        checkpoint_path (str, optional): JSONL journal of completed rows; rerunning with the same
+                                         path skips rows that are already in it
+        cache_system_prompt (bool): Mark the shared system prompt as a cacheable prefix (Claude only);
+                                    cache writes/reads are reported in the cache_*_input_tokens columns
+
+    Returns:
+        pandas.DataFrame: Original dataframe with added response and token columns
+    """
+    result_df = _prepare_result_df(df, result_col)
+
+    if client is None:
+        client = get_client(model_type, use_async=True)
+        if client is None:
+            return result_df
+
+    def fingerprint_of(idx):
+        return prompt_fingerprint(model_type, system_prompt, result_df.at[idx, user_prompt_col], max_tokens, temperature)
+
+    journal = CompletionJournal(checkpoint_path) if checkpoint_path else None
+    completed = _resume_from_journal(result_df, journal, fingerprint_of, result_col) if journal else set()
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    progress = tqdm(total=len(result_df), initial=len(completed), desc=f"Processing {model_type} prompts") if show_progress else None
+
+    async def process_row(idx, user_prompt):
+        try:
+            if pd.isna(user_prompt):
+                return
+            async with semaphore:
+                response, token_usage = await aget_completion(
+                    model_type,
+                    system_prompt,
+                    [{"user": user_prompt}],
+                    client,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    bypass_cache=bypass_cache,
+                    cache_system_prompt=cache_system_prompt
+                )
+            _store_result(result_df, idx, result_col, response, token_usage)
+            if journal is not None and response and token_usage:
+                journal.append(idx, fingerprint_of(idx), response, token_usage)
+        finally:
+            if progress is not None:
+                progress.update(1)
+
+    try:
+        await asyncio.gather(*(
+            process_row(idx, user_prompt)
+            for idx, user_prompt in result_df[user_prompt_col].items()
+            if idx not in completed
+        ))
+    finally:
+        if progress is not None:
+            progress.close()
+        if journal is not None:
+            journal.close()
+
+    _log_failed_rows(result_df, user_prompt_col, result_col)
     return result_df
 
+
+def run_async(coro):
+    """
+    Run a coroutine to completion from synchronous code.
+
+    Uses asyncio.run() when no event loop is running (scripts). Inside a running loop
+    (e.g. Jupyter) the coroutine is run on a fresh loop in a helper thread, so this
+    never fails with "asyncio.run() cannot be called from a running event loop".
+    Either way the loop is discarded afterwards, so the shared async clients created
+    on it are closed before it ends.
+    """
+    async def run_and_close_clients():
+        try:
+            return await coro
+        finally:
+            await aclose_clients()
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(run_and_close_clients())
+
+    outcome = {}
+
+    def runner():
+        try:
+            outcome["result"] = asyncio.run(run_and_close_clients())
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=runner)
+    thread.start()
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
 """
 # example usage
 import pandas as pd
@@ -228,9 +1130,34 @@ results = process_df_prompts(
     model_type="claude",
     system_prompt="Explain AI concepts clearly to beginners.",  # Single system prompt for all rows
     user_prompt_col="question",  # Column containing user prompts
-    max_tokens=200
+    max_tokens=200,
+    max_workers=8  # Rows processed concurrently
+)
+
+# Or keep many requests in flight on one event loop
+# (in a notebook: results = await aprocess_df_prompts(...))
+results = run_async(aprocess_df_prompts(
+    df,
+    model_type="claude",
+    system_prompt="Explain AI concepts clearly to beginners.",
+    user_prompt_col="question",
+    max_tokens=200,
+    max_concurrency=100
+))
+
+# Stream partial output per row as it is generated
+results = process_df_prompts(
+    df,
+    model_type="claude",
+    user_prompt_col="question",
+    max_tokens=200,
+    stream_callback=lambda idx, delta: print(f"[{idx}] {delta}", end="", flush=True)
 )
 
 # Print results
 print(results[['question', 'response', 'total_tokens']])
+
+# Latency percentiles, throughput and estimated cost of every call made so far
+print(get_metrics_registry().summary())
+get_metrics_registry().write_prometheus("model_completions.prom")
 """
@@ -0,0 +1,115 @@
+"""
+Near-duplicate paragraph detection with MinHash and locality-sensitive hashing.
+
+Evidence submissions repeat boilerplate and quote the same passages, so many
+extracted paragraphs are near-copies of each other. Each paragraph is reduced
+to a MinHash signature over its word shingles; LSH banding proposes candidate
+pairs without comparing every pair, and candidates whose estimated Jaccard
+similarity clears the threshold are merged. Each group keeps its first
+paragraph and the source/page references of every member.
+"""
+
+import re
+import zlib
+import logging
+from typing import Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NUM_PERMUTATIONS = 128
+# 16 bands of 8 rows: pairs above ~0.7 Jaccard are very likely to share a band
+LSH_BANDS = 16
+SHINGLE_WORDS = 5
+DEFAULT_SIMILARITY_THRESHOLD = 0.8
+# Smallest prime above 2**32, modulus of the universal hash family (a * x + b) mod p
+_PRIME = np.uint64(4294967311)
+_WORD_RE = re.compile(r"\w+")
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_WORDS) -> np.ndarray:
+    """32-bit hashes of the text's lowercased word shingles (the whole text if it is shorter)."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+class MinHasher:
+    """MinHash signatures from a fixed, seeded family of hash permutations."""
+
+    def __init__(self, num_permutations: int = NUM_PERMUTATIONS, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_permutations = num_permutations
+        self._a = rng.integers(1, int(_PRIME), size=num_permutations, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=num_permutations, dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        # hashes and a are below 2**32, so a * x + b stays within uint64
+        permuted = (np.outer(hashes, self._a) + self._b) % _PRIME
+        return permuted.min(axis=0)
+
+
+def find_near_duplicates(texts: List[str], threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                         num_permutations: int = NUM_PERMUTATIONS, bands: int = LSH_BANDS) -> List[int]:
+    """
+    Group near-duplicate texts.
+
+    Returns:
+        list: For each text, the index of the first text of its group (itself if it has no duplicates)
+    """
+    if num_permutations % bands:
+        raise ValueError(f"num_permutations ({num_permutations}) must be a multiple of bands ({bands})")
+    hasher = MinHasher(num_permutations)
+    signatures = np.array([hasher.signature(shingle_hashes(text)) for text in texts]).reshape(len(texts), -1)
+    rows = num_permutations // bands
+
+    parent = list(range(len(texts)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets = {}
+        for i, key in enumerate(map(bytes, signatures[:, band * rows:(band + 1) * rows])):
+            buckets.setdefault(key, []).append(i)
+        for members in buckets.values():
+            first = members[0]
+            for other in members[1:]:
+                root_first, root_other = find(first), find(other)
+                if root_first == root_other:
+                    continue
+                # Confirm the candidate with the estimated Jaccard similarity over all permutations
+                if np.mean(signatures[first] == signatures[other]) >= threshold:
+                    # The earlier paragraph stays the representative
+                    parent[max(root_first, root_other)] = min(root_first, root_other)
+    return [find(i) for i in range(len(texts))]
+
+
+def dedupe_paragraphs(paragraphs: List[Dict], threshold: float = DEFAULT_SIMILARITY_THRESHOLD) -> List[Dict]:
+    """
+    Collapse near-duplicate paragraphs, keeping the first of each group in the original order.
+
+    Every kept paragraph gets a 'references' list of {'source', 'page'} for itself and all
+    of its duplicates, so no citation is lost.
+    """
+    if not paragraphs:
+        return []
+    groups = find_near_duplicates([p['text'] for p in paragraphs], threshold)
+    kept = {}
+    for paragraph, representative in zip(paragraphs, groups):
+        reference = {'source': paragraph['source'], 'page': paragraph['page']}
+        if representative not in kept:
+            kept[representative] = {**paragraphs[representative], 'references': []}
+        if reference not in kept[representative]['references']:
+            kept[representative]['references'].append(reference)
+    deduped = [kept[i] for i in sorted(kept)]
+    logger.info(f"Collapsed {len(paragraphs) - len(deduped)} near-duplicate paragraphs "
+                f"({len(paragraphs)} -> {len(deduped)})")
+    return deduped
@@ -0,0 +1,113 @@
+"""
+BM25 ranking of extracted paragraphs against research questions.
+
+The paragraphs are indexed once as a sparse term-frequency matrix; scoring a
+question is then one sparse matrix-vector product over the question's terms.
+Each question is only analysed against its top-ranked paragraphs instead of
+every keyword-matching paragraph in the corpus. That only pays off when the
+corpus is much larger than the selections: a paragraph picked for several
+questions is sent once per question, so when the selections add up to as much
+text as the whole corpus, the corpus is analysed once for all questions instead.
+"""
+
+import logging
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+from scipy import sparse
+
+from finding_clusters import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Standard Okapi BM25 parameters: term-frequency saturation and length normalisation
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Paragraphs scoring below this fraction of a question's best score are not selected for it
+DEFAULT_MIN_SCORE_RATIO = 0.3
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of texts.
+
+    Args:
+        texts (list): Texts to rank (e.g. paragraph texts)
+        k1 (float): Term-frequency saturation
+        b (float): Document length normalisation (0 = none, 1 = full)
+    """
+
+    def __init__(self, texts: List[str], k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.vocabulary: Dict[str, int] = {}
+        rows, columns, counts = [], [], []
+        for row, text in enumerate(texts):
+            for token, count in Counter(tokenize(text)).items():
+                rows.append(row)
+                columns.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+                counts.append(count)
+        shape = (len(texts), len(self.vocabulary))
+        tf = sparse.csr_matrix((np.array(counts, dtype=np.float32), (rows, columns)), shape=shape)
+
+        lengths = np.asarray(tf.sum(axis=1)).ravel()
+        average_length = lengths.mean() if len(texts) and lengths.mean() > 0 else 1.0
+        document_frequency = np.bincount(tf.indices, minlength=len(self.vocabulary))
+        self.idf = np.log(1.0 + (len(texts) - document_frequency + 0.5) / (document_frequency + 0.5))
+
+        # Precompute the saturated, length-normalised term weights once; a query then only
+        # sums the columns of its terms
+        norm = k1 * (1.0 - b + b * lengths / average_length)
+        weights = tf.copy()
+        weights.data = tf.data * (k1 + 1.0) / (tf.data + np.repeat(norm, np.diff(tf.indptr)))
+        self._weights = weights.tocsc()
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every text for the query."""
+        query_terms = Counter(token for token in tokenize(query) if token in self.vocabulary)
+        if not query_terms:
+            return np.zeros(self._weights.shape[0], dtype=np.float64)
+        columns = [self.vocabulary[token] for token in query_terms]
+        query_weights = np.array([self.idf[c] * n for c, n in zip(columns, query_terms.values())])
+        return np.asarray(self._weights[:, columns] @ query_weights).ravel()
+
+    def top_k(self, query: str, k: int, min_score_ratio: float = 0.0) -> List[int]:
+        """
+        Indices of the k best-scoring texts, best first.
+
+        Only texts with a positive score of at least min_score_ratio times the best score are
+        returned. Ties are broken by index, so reruns select the same texts.
+        """
+        scores = self.scores(query)
+        best = scores.max() if len(scores) else 0.0
+        candidates = np.flatnonzero((scores > 0) & (scores >= min_score_ratio * best))
+        order = np.lexsort((candidates, -scores[candidates]))
+        return candidates[order[:k]].tolist()
+
+
+def select_paragraphs(paragraphs: List[Dict], questions: Dict, top_k: int,
+                      min_score_ratio: float = DEFAULT_MIN_SCORE_RATIO) -> Optional[Dict]:
+    """
+    Pick up to top_k paragraphs for each question.
+
+    Returns:
+        dict: question number -> selected paragraphs, in their original (document) order; or
+              None when the selections hold at least as much text as the paragraphs themselves,
+              so analysing every paragraph once against all questions is cheaper
+    """
+    if len(paragraphs) <= top_k:
+        return None
+    index = BM25Index([p['text'] for p in paragraphs])
+    selected = {}
+    for question_num, question in questions.items():
+        ranked = index.top_k(question, top_k, min_score_ratio)
+        selected[question_num] = [paragraphs[i] for i in sorted(ranked)]
+        logger.info(f"Question {question_num}: selected {len(ranked)} of {len(paragraphs)} paragraphs")
+    selected_chars = sum(len(p['text']) for chosen in selected.values() for p in chosen)
+    total_chars = sum(len(p['text']) for p in paragraphs)
+    if selected_chars >= total_chars:
+        logger.info(f"Per-question selections hold {selected_chars} of {total_chars} characters; "
+                    f"analysing all paragraphs at once")
+        return None
+    return selected
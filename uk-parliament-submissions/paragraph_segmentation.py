@@ -0,0 +1,257 @@
+"""
+Paragraph segmentation of PDF pages.
+
+PyPDF2 rarely emits blank lines between paragraphs, so splitting its text on
+'\\n\\n' leaves most pages as one block. Two segmenters are provided:
+
+- layout_paragraphs() reads the text lines of each page with pypdfium2,
+  takes their positions from the boxes of their first and last characters and
+  starts a new paragraph where the vertical gap to the previous line is clearly larger
+  than the page's usual line spacing, where the text jumps back up the page
+  (a new column or block), at list bullets and numbered items, and after a
+  short line ending a sentence.
+- text_paragraphs() works on plain page text (the cached extracted text, or
+  pages pypdfium2 finds no text on) and is what the analysis uses by default:
+  it needs no second parse of the PDF and its spans are offsets into the
+  cached text, which the corpus index can be queried with. It applies the
+  blank-line, list-item and short-last-line rules to the text's lines, splits
+  lines that run paragraphs together at bullets and double-spaced sentence
+  ends, and returns spans of the original text.
+
+Run this module on a folder to benchmark both in pages/sec:
+
+    python paragraph_segmentation.py 2025-05-UKParliament-Evidence
+"""
+
+import re
+import sys
+import time
+import logging
+from pathlib import Path
+from statistics import median
+from typing import List, Tuple
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+logger = logging.getLogger(__name__)
+
+# A gap this many line heights above the page's usual line gap starts a new paragraph
+PARAGRAPH_GAP_LINE_HEIGHTS = 0.5
+# A line ending a sentence this much shorter than the page's full line width ends a paragraph
+SHORT_LINE_RATIO = 0.8
+# Text paragraphs longer than this are split further at sentence ends
+MAX_TEXT_PARAGRAPH_CHARS = 1500
+_LIST_ITEM_RE = re.compile(r"^\s*(?:[•●▪◦■▸►*–-]\s|\(?\d+(?:\.\d+)*[.)]\s|\(?[a-z]{1,4}\)\s)")
+_SENTENCE_END_RE = re.compile(r"[.!?:;][\"'”’)]?\s*$")
+# Paragraph breaks PyPDF2 leaves inside a line: a sentence end followed by two or more
+# spaces, or a bullet
+_INLINE_BREAK_RE = re.compile(r"(?<=[.!?:;])\s{2,}(?=\S)|\s+(?=[•●▪◦■▸►]\s)")
+_SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?])\s+(?=[\"“(]?[A-Z0-9])")
+
+
+def _is_list_item(text):
+    return _LIST_ITEM_RE.match(text) is not None
+
+
+def _ends_sentence(text):
+    return _SENTENCE_END_RE.search(text) is not None
+
+
+def _join_lines(lines: List[str]) -> str:
+    """Join wrapped lines with spaces, without one after a line-end hyphen."""
+    text = ""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if text and not text.endswith("-"):
+            text += " "
+        text += line
+    return text
+
+
+def _page_lines(textpage):
+    """A page's text lines as (left, bottom, right, top, text), in reading order."""
+    text = textpage.get_text_range()
+    lines = []
+    position = 0
+    # pdfium ends each line it recognises with CR LF; character indices line up with the text
+    for line in text.split("\r\n"):
+        first = position + len(line) - len(line.lstrip())
+        last = position + len(line.rstrip()) - 1
+        position += len(line) + 2
+        if last < first:
+            continue
+        # Loose boxes span the font's full height, so lines of small letters are not shorter
+        left, first_bottom, _, first_top = textpage.get_charbox(first, loose=True)
+        _, last_bottom, right, last_top = textpage.get_charbox(last, loose=True)
+        lines.append((left, min(first_bottom, last_bottom), right, max(first_top, last_top), line.strip()))
+    return lines
+
+
+def _layout_page_paragraphs(lines) -> List[str]:
+    if not lines:
+        return []
+    line_height = median(top - bottom for _, bottom, _, top, _ in lines) or 1.0
+    gaps = [prev[1] - line[3] for prev, line in zip(lines, lines[1:]) if prev[1] - line[3] >= 0]
+    usual_gap = median(gaps) if gaps else 0.0
+    full_width = sorted(line[2] for line in lines)[int(0.9 * (len(lines) - 1))]
+
+    paragraphs, current = [], [lines[0][4]]
+    for prev, line in zip(lines, lines[1:]):
+        gap = prev[1] - line[3]
+        new_paragraph = (
+            gap > usual_gap + PARAGRAPH_GAP_LINE_HEIGHTS * line_height
+            or gap < -0.5 * line_height  # moved back up the page: new column or block
+            or _is_list_item(line[4])
+            or (_ends_sentence(prev[4]) and prev[2] - prev[0] < SHORT_LINE_RATIO * (full_width - prev[0]))
+        )
+        if new_paragraph:
+            paragraphs.append(_join_lines(current))
+            current = []
+        current.append(line[4])
+    paragraphs.append(_join_lines(current))
+    return [p for p in paragraphs if p]
+
+
+def layout_paragraphs(pdf_path) -> List[List[str]]:
+    """
+    Paragraphs of every page of a PDF, segmented from text-run coordinates with pypdfium2.
+
+    Returns:
+        list: One list of paragraph texts per page (empty for pages without a text layer)
+
+    Raises:
+        RuntimeError: If pypdfium2 is not installed
+    """
+    if pdfium is None:
+        raise RuntimeError("pypdfium2 is not installed; use text_paragraphs() instead")
+    pdf = pdfium.PdfDocument(str(pdf_path))
+    try:
+        pages = []
+        for page_num in range(len(pdf)):
+            page = pdf[page_num]
+            textpage = page.get_textpage()
+            try:
+                pages.append(_layout_page_paragraphs(_page_lines(textpage)))
+            finally:
+                textpage.close()
+                page.close()
+        return pages
+    finally:
+        pdf.close()
+
+
+def _trimmed(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _split_span(text, start, end) -> List[Tuple[int, int]]:
+    """Split one line-based paragraph at inline breaks, then overly long pieces at sentence ends."""
+    pieces = []
+    for match in _INLINE_BREAK_RE.finditer(text, start, end):
+        pieces.append((start, match.start()))
+        start = match.end()
+    pieces.append((start, end))
+
+    spans = []
+    for start, end in pieces:
+        while end - start > MAX_TEXT_PARAGRAPH_CHARS:
+            # Last sentence end that keeps the piece under the limit, else the first one after it
+            cut = None
+            for match in _SENTENCE_BREAK_RE.finditer(text, start, end):
+                if cut is not None and match.start() - start > MAX_TEXT_PARAGRAPH_CHARS:
+                    break
+                cut = match
+            if cut is None:
+                break
+            spans.append(_trimmed(text, start, cut.start()))
+            start = cut.end()
+        spans.append(_trimmed(text, start, end))
+    return [(s, e) for s, e in spans if e > s]
+
+
+def text_paragraphs(text: str) -> List[Tuple[int, int]]:
+    """
+    Split plain page text into paragraphs with line-based heuristics, splitting lines that run
+    several paragraphs together (as PyPDF2 often produces) at bullets and double-spaced sentence
+    ends, and anything still longer than MAX_TEXT_PARAGRAPH_CHARS at sentence ends.
+
+    Returns:
+        list: (start, end) offsets of each paragraph in text, whitespace trimmed
+    """
+    lines = []
+    position = 0
+    for raw in text.split("\n"):
+        lines.append((position, position + len(raw), raw.strip()))
+        position += len(raw) + 1
+    lengths = sorted(len(line) for _, _, line in lines if line)
+    full_length = lengths[int(0.9 * (len(lengths) - 1))] if lengths else 0
+
+    spans = []
+    start = end = None
+    prev = ""
+    for line_start, line_end, line in lines:
+        if not line:
+            prev = ""
+            if start is not None:
+                spans.append((start, end))
+                start = None
+            continue
+        if start is not None and (
+                _is_list_item(line)
+                or (_ends_sentence(prev) and len(prev) < SHORT_LINE_RATIO * full_length)):
+            spans.append((start, end))
+            start = None
+        if start is None:
+            start = line_start + (len(text[line_start:line_end]) - len(text[line_start:line_end].lstrip()))
+        end = line_start + len(text[line_start:line_end].rstrip())
+        prev = line
+    if start is not None:
+        spans.append((start, end))
+    return [piece for start, end in spans for piece in _split_span(text, start, end)]
+
+
+def benchmark(pdf_paths) -> None:
+    """Print pages/sec and paragraph statistics of both segmenters over the given PDFs."""
+    from pdf_extraction import load_pages
+
+    page_texts = [[page.text for page in load_pages(path)] for path in pdf_paths]
+    page_count = sum(len(pages) for pages in page_texts)
+    print(f"{len(pdf_paths)} PDFs, {page_count} pages")
+
+    def report(name, elapsed, paragraphs):
+        kept = [p for p in paragraphs if len(p) > 50]
+        average = sum(map(len, kept)) / len(kept) if kept else 0
+        print(f"{name:>12}: {page_count / elapsed:8.1f} pages/sec, {len(kept) / max(page_count, 1):5.1f} "
+              f"paragraphs/page over 50 chars, {average:6.0f} chars on average")
+
+    start = time.perf_counter()
+    paragraphs = [p.strip() for pages in page_texts for text in pages for p in text.split("\n\n")]
+    report("blank lines", time.perf_counter() - start, paragraphs)
+
+    start = time.perf_counter()
+    paragraphs = [text[s:e] for pages in page_texts for text in pages for s, e in text_paragraphs(text)]
+    report("heuristic", time.perf_counter() - start, paragraphs)
+
+    if pdfium is not None:
+        start = time.perf_counter()
+        paragraphs = []
+        for path in pdf_paths:
+            try:
+                paragraphs.extend(p for page in layout_paragraphs(path) for p in page)
+            except Exception as e:
+                logger.error(f"Layout segmentation failed for {path}: {e}")
+        report("layout", time.perf_counter() - start, paragraphs)  # includes parsing the PDFs
+
+
+if __name__ == "__main__":
+    folder = Path(sys.argv[1] if len(sys.argv) > 1 else "2025-05-UKParliament-Evidence")
+    benchmark(sorted(folder.rglob("*.pdf")))
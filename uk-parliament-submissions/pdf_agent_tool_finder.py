@@ -6,36 +6,44 @@ Uses pypdfium2 for reliable PDF text extraction.
 
 import os
 import shutil
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-import pypdfium2 as pdfium
+from pdf_extraction import EXTRACTOR_BACKEND, iter_page_texts
+from term_filter import TermFilter, FilterResult, any_of
+from corpus_index import CorpusIndex, DEFAULT_INDEX_DIR
 
-def contains_keywords(pdf_path, keywords):
-    """Check if PDF contains any of the keywords."""
+# Extractor backend for scanning PDFs without the index (see pdf_extraction.EXTRACTOR_BACKENDS)
+SCAN_BACKEND = "pypdfium2"
+
+def contains_keywords(pdf_path, keywords, index=None):
+    """
+    Check if PDF contains any of the keywords (or matches a term expression such as
+    "agent AND NOT insurance"). Stops reading at the first page that decides it.
+    Returns a FilterResult, truthy on a match, with the page each keyword was found on.
+    With a CorpusIndex that covers the PDF and single-word keywords this is a lookup and
+    the PDF is not read.
+    """
+    term_filter = TermFilter(keywords if isinstance(keywords, str) else any_of(keywords))
+    result = index.match(term_filter, pdf_path) if index is not None else None
+    if result is not None:
+        return result
     try:
-        pdf = pdfium.PdfDocument(pdf_path)
-        for page_num in range(len(pdf)):
-            page = pdf[page_num]
-            textpage = page.get_textpage()
-            text = textpage.get_text_range()
-            textpage.close()
-            page.close()
-            
-            if text:
-                text_lower = text.lower()
-                for keyword in keywords:
-                    if keyword in text_lower:
-                        pdf.close()
-                        return True
-        pdf.close()
+        # Pages are extracted only as they are requested
+        return term_filter.match(iter_page_texts(pdf_path, backend=SCAN_BACKEND))
     except Exception as e:
         print(f"Error reading {pdf_path.name}: {e}")
-    return False
+    return FilterResult(False)
 
 def main():
     # Configuration
     source_dir = Path("2025-05-UKParliament-Evidence")
     target_dir = source_dir / "agent_tool_pdfs"
     keywords = ["agent"]
+    # Answer from the persistent corpus index (only new or changed PDFs are read) when it is
+    # built from the same pypdfium2 text the scan reads (PDF_EXTRACTOR_BACKEND=pypdfium2);
+    # otherwise scan every PDF with pypdfium2
+    index_dir = DEFAULT_INDEX_DIR if EXTRACTOR_BACKEND == SCAN_BACKEND else None
     
     # Verify we're in the right directory
     if not source_dir.exists():
@@ -54,15 +62,26 @@ def main():
     
     moved_count = 0
     
+    if index_dir:
+        index = CorpusIndex(index_dir)
+        index.update(pdf_files)
+        matches = (contains_keywords(pdf_path, keywords, index) for pdf_path in pdf_files)
+    else:
+        # Check PDFs in parallel worker processes; results come back in file order
+        with ProcessPoolExecutor() as executor:
+            matches = list(executor.map(contains_keywords, pdf_files, repeat(keywords)))
+    results = zip(pdf_files, matches)
+    
     # Process each PDF
-    for i, pdf_path in enumerate(pdf_files, 1):
+    for i, (pdf_path, matched) in enumerate(results, 1):
         print(f"[{i}/{len(pdf_files)}] Checking: {pdf_path.name}", end=" ... ")
         
-        if contains_keywords(pdf_path, keywords):
+        if matched:
             # Move file
             target_path = target_dir / pdf_path.name
             shutil.move(str(pdf_path), str(target_path))
-            print("✓ Found keywords - Moved")
+            found_on = ", ".join(f"'{k}' p.{page}" for k, page in matched.term_pages.items() if page)
+            print(f"✓ Found keywords ({found_on}) - Moved")
             moved_count += 1
         else:
             print("✗ No match")
@@ -1,121 +1,269 @@
-def analyze_paragraph_batch(self, paragraphs: List[Dict], question_set: Dict) -> Dict:
-        """Analyze a batch of paragraphs using Claude via model_completions.py"""
-        # Prepare context
-        context = "\n\n".join([
-            f"[Source: {p['source']}, Page {p['page']}]\n{p['text']}"
-            for p in paragraphs
-        ])
-        
-        # System prompt
-        system_prompt = """You are analyzing UK Parliament evidence on AI risks in finance.
-        
-Focus ONLY on content about AI agents or general-purpose AI as defined:
-AI agent = Software program that can interact with its environment, collect data, 
-and use the data for executing self-determined actions that impact the environment, 
-to meet predetermined, underspecified goals.
-
-Return your response as valid JSON only."""
-        
-        # User message
-        user_message = f"""Analyze these paragraphs for the following questions:
-{json.dumps(question_set, indent=2)}
-
-For EACH relevant finding:
-1. Provide the EXACT quote from the document
-2. Include source document and page number
-3. Categorize by question number
-
-Context:
-{context}
-
-Returnimport os
+import os
 import json
-import time
 from pathlib import Path
-from typing import List, Dict, Tuple
-import PyPDF2
+from typing import List, Dict, Tuple, Iterable, Optional
 from collections import defaultdict
+import numpy as np
 import re
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
 
 # Import the model_completions script
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from model_completions import get_completion
+from model_completions import get_claude_completion, get_client, cacheable_text, MIN_CACHEABLE_PROMPT_TOKENS
+from pdf_extraction import PageRecord, iter_pages, join_pages, extract_documents
+from term_filter import FilterResult, TermFilter
+from keyword_matcher import KeywordMatcher
+from rate_limiting import estimate_tokens
+from finding_clusters import precluster_findings
+from paragraph_dedup import dedupe_paragraphs
+from corpus_index import CorpusIndex, DEFAULT_INDEX_DIR
+from paragraph_retrieval import select_paragraphs
+from paragraph_segmentation import layout_paragraphs, text_paragraphs
+from analysis_manifest import AnalysisManifest, DEFAULT_MANIFEST_PATH
+from checkpointing import prompt_fingerprint
+
+MODEL_CONTEXT_TOKENS = 200_000  # Context window of the Claude model used for analysis
+ANALYSIS_MAX_TOKENS = 4000  # Output tokens per analysis call
+# Paragraph tokens packed into one analysis call. Bigger batches mean fewer calls, but all
+# findings of a batch must still fit in ANALYSIS_MAX_TOKENS of JSON output
+DEFAULT_BATCH_TOKEN_BUDGET = 12_000
+# Token counts are ~4 chars/token estimates; keep this fraction of the context spare
+CONTEXT_SAFETY_MARGIN = 0.1
+# Analysis calls in flight at once; the shared rate limiter in model_completions keeps
+# them within the provider's request and token limits
+DEFAULT_ANALYSIS_WORKERS = 8
+CLUSTER_MAX_TOKENS = 2000  # Output tokens per clustering call
+# Findings (or clusters, when merging) per clustering prompt; larger sets are clustered
+# in chunks and the chunk clusters merged (see cluster_question)
+DEFAULT_CLUSTER_TOKEN_BUDGET = 30_000
+# Distinct quotes per pre-formed cluster shown to the model when it writes the cluster summary
+MAX_QUOTES_PER_CLUSTER = 25
+# Paragraphs analysed per question, ranked by BM25 against the question text
+DEFAULT_RETRIEVAL_TOP_K = 60
+# Bump when the clustering prompts change so stored clusters are regenerated
+CLUSTER_PROMPT_VERSION = 1
+ANALYSIS_QUESTIONS = {
+    1: "Which scenarios are described as likely risks to financial stability from AI agents?",
+    2: "What data sources and evidence would we need to track and measure these risks?",
+    3: "What are the most consequential general-purpose AI capabilities & tools currently in finance?",
+    4: "What AI capabilities are expected in finance over the next ten years?",
+    5: "What are the most significant vulnerabilities and systems affected?"
+}
+# Shared by every analysis batch; with the system prompt and the questions it makes the prompt prefix
+# long enough to be cached (MIN_CACHEABLE_PROMPT_TOKENS) for the full question set and each single question
+ANALYSIS_GUIDELINES = """Guidelines:
+- Quote the document word for word. Copy the shortest passage that carries the point, usually one or
+  two sentences. Never paraphrase inside "quote" and never join text from different paragraphs into one quote.
+- Each paragraph starts with a [Source: ...] line naming the document and page it comes from. A paragraph
+  that appears in several submissions lists every document and page, separated by semicolons; report each
+  finding from it once, with the first document and page listed.
+- Only report content about AI agents or general-purpose AI as defined above. Passages about conventional
+  models, rule-based automation or AI in general count only when the point they make applies to agents.
+- A passage can answer several questions; report it once for each question it answers, each time with a
+  summary written for that question.
+- Report distinct points separately. If a batch makes the same point twice, report the clearest statement.
+- Skip headings, tables of contents, footnote markers, page headers and footers, and restatements of the
+  committee's questions.
+- Report risks, evidence needs, capabilities and vulnerabilities as the submission describes them,
+  including hedged or conditional claims; keep the hedge in the quote rather than dropping it.
+- Attribute claims to the submission even when it reports someone else's view, and say so in the summary.
+- "summary" is one sentence in your own words stating what the quote claims, readable without the quote.
+- "page" is the page number from the [Source: ...] line as an integer.
+- If no paragraph is relevant to any question, return {"findings": []}.
+
+Example (question numbers are illustrative)
+Paragraphs:
+[Source: example_submission.pdf, Page 1]
+1. Introduction 2. Summary of recommendations 3. Response to the committee's questions
+
+[Source: example_submission.pdf, Page 4]
+Firms are piloting AI agents that rebalance client portfolios without human sign-off. If many firms rely
+on agents built on the same few foundation models, their trades could move together in a stress event
+and amplify price falls.
+
+[Source: bank_response.pdf, Page 2; trade_body.pdf, Page 7]
+Supervisors receive no data on which third-party models the agents of regulated firms call, so a failure
+at one model provider could not be traced to the firms exposed to it.
+
+Response:
+{
+    "findings": [
+        {
+            "question_num": 1,
+            "quote": "If many firms rely on agents built on the same few foundation models, their trades could move together in a stress event and amplify price falls.",
+            "source": "example_submission.pdf",
+            "page": 4,
+            "summary": "Agents built on the same foundation models could trade in the same direction in a stress event and deepen market falls."
+        },
+        {
+            "question_num": 3,
+            "quote": "Firms are piloting AI agents that rebalance client portfolios without human sign-off.",
+            "source": "example_submission.pdf",
+            "page": 4,
+            "summary": "Autonomous portfolio rebalancing by AI agents is already being piloted."
+        },
+        {
+            "question_num": 2,
+            "quote": "Supervisors receive no data on which third-party models the agents of regulated firms call",
+            "source": "bank_response.pdf",
+            "page": 2,
+            "summary": "Supervisors would need data on which third-party models firms' agents depend on to trace a provider failure."
+        }
+    ]
+}"""
 
 class AIFinanceRiskAnalyzer:
     """Analyzes PDFs for AI agent risks in finance using Claude via model_completions.py"""
     
-    def __init__(self, pdf_folder: str):
+    def __init__(self, pdf_folder: str, extraction_workers: int = None,
+                 batch_token_budget: int = DEFAULT_BATCH_TOKEN_BUDGET,
+                 analysis_workers: int = DEFAULT_ANALYSIS_WORKERS,
+                 cluster_token_budget: int = DEFAULT_CLUSTER_TOKEN_BUDGET,
+                 precluster: bool = True,
+                 dedupe: bool = True,
+                 index_dir: str = DEFAULT_INDEX_DIR,
+                 retrieval_top_k: int = DEFAULT_RETRIEVAL_TOP_K,
+                 manifest_path: str = DEFAULT_MANIFEST_PATH,
+                 segmentation: str = "text"):
         self.pdf_folder = Path(pdf_folder)
+        self.extraction_workers = extraction_workers  # Processes for PDF extraction (default: CPU count)
+        self.batch_token_budget = batch_token_budget  # Paragraph tokens per analysis call
+        self.analysis_workers = analysis_workers  # Concurrent analysis calls
+        self.cluster_token_budget = cluster_token_budget  # Findings tokens per clustering call
+        # Group and de-duplicate findings locally (TF-IDF) so the model only writes summaries;
+        # set False to have the model form the clusters itself
+        self.precluster = precluster
+        self.dedupe = dedupe  # Collapse near-duplicate paragraphs before analysis
+        # Persistent inverted index answering the term and keyword filters (see corpus_index.py);
+        # None to scan the page text instead
+        self.index = CorpusIndex(index_dir) if index_dir else None
+        # In a large corpus only the best matching paragraphs are analysed for each question
+        # (see paragraph_retrieval.py); None to always analyse every relevant paragraph against all questions at once
+        self.retrieval_top_k = retrieval_top_k
+        # Findings and clusters of earlier runs (see analysis_manifest.py): only paragraphs no earlier
+        # run analysed are sent to the model and only questions whose findings changed are re-clustered;
+        # None to start from scratch every run
+        self.manifest = AnalysisManifest(manifest_path) if manifest_path else None
+        # "text" splits the cached page text with line heuristics, keeping each paragraph's offset
+        # for index lookups; "layout" splits by text position instead (pypdfium2), which parses
+        # every PDF again and has no offsets (see paragraph_segmentation.py)
+        self.segmentation = segmentation
         self.results = defaultdict(list)
+        self.anthropic_client = get_client("claude")  # Shared, pooled client
+        self.total_pdfs = 0
+        self.relevant_pdfs = None  # Set by process_pdfs
+        # Document pre-filter; see term_filter.py for the expression syntax
+        self.required_terms = TermFilter("agent AND stability")
         self.ai_agent_keywords = [
             "AI agent", "AI agents", "autonomous AI", "general-purpose AI",
             "GPAI", "frontier AI", "computer-use", "self-determined",
             "autonomous system", "AI execution", "AI tooling"
         ]
+        # Compiled once; scans each paragraph in a single pass for all keywords
+        self.keyword_matcher = KeywordMatcher(self.ai_agent_keywords)
         
     def extract_full_text_from_pdf(self, pdf_path: Path) -> str:
         """Extract all text from PDF for initial filtering"""
-        full_text = ""
-        try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    full_text += page.extract_text() + "\n"
-        except Exception as e:
-            print(f"Error reading {pdf_path}: {e}")
-        return full_text
+        # Pages are parsed once and cached on disk (see pdf_extraction.py)
+        return join_pages(iter_pages(pdf_path))[0]
         
     def pdf_contains_required_terms(self, pdf_path: Path) -> bool:
         """Check if PDF contains both 'agent' and 'stability'"""
-        full_text = self.extract_full_text_from_pdf(pdf_path).lower()
-        contains_agent = 'agent' in full_text
-        contains_stability = 'stability' in full_text
-        return contains_agent and contains_stability
+        return self.required_terms_result(pdf_path).matched
+        
+    def required_terms_result(self, pdf_path: Path) -> FilterResult:
+        """Match the required terms from the index when it can answer exactly, else by reading the PDF"""
+        result = self.index.match(self.required_terms, pdf_path) if self.index is not None else None
+        if result is not None:
+            return result
+        # Pages are read lazily, so extraction stops once both terms have been seen
+        return self.required_terms.match(iter_pages(pdf_path))
+        
+    def pages_contain_required_terms(self, pages: Iterable[PageRecord]) -> bool:
+        """Check if extracted pages contain both 'agent' and 'stability'"""
+        return self.required_terms.match(pages).matched
         
     def extract_paragraphs_from_pdf(self, pdf_path: Path) -> List[Dict]:
         """Extract text from PDF, returning paragraphs with metadata"""
+        layout = []
+        if self.segmentation == "layout":
+            try:
+                layout = layout_paragraphs(pdf_path)
+            except Exception as e:
+                print(f"Layout segmentation failed for {pdf_path.name}, using text heuristics: {e}")
+        
         paragraphs = []
-        try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page_num, page in enumerate(pdf_reader.pages):
-                    text = page.extract_text()
-                    # Split into paragraphs
-                    paras = text.split('\n\n')
-                    for para in paras:
-                        if len(para.strip()) > 50:  # Filter short fragments
-                            paragraphs.append({
-                                'text': para.strip(),
-                                'source': pdf_path.name,
-                                'page': page_num + 1
-                            })
-        except Exception as e:
-            print(f"Error reading {pdf_path}: {e}")
+        for page in iter_pages(pdf_path):
+            blocks = layout[page.page - 1] if page.page <= len(layout) else None
+            if blocks:
+                # Layout text differs from the extracted text, so it has no offsets for index lookups
+                spans = [(text, None) for text in blocks]
+            else:
+                # Offsets of the paragraph in the extracted page text, for index lookups
+                spans = [(page.text[start:end], start) for start, end in text_paragraphs(page.text)]
+            for text, offset in spans:
+                if len(text) > 50:  # Filter short fragments
+                    paragraphs.append({
+                        'text': text,
+                        'source': page.source,
+                        'page': page.page,
+                        'offset': offset
+                    })
         return paragraphs
     
     def is_relevant_paragraph(self, text: str) -> bool:
         """Check if paragraph mentions AI agents or general-purpose AI"""
-        text_lower = text.lower()
-        return any(keyword.lower() in text_lower for keyword in self.ai_agent_keywords)
+        return self.keyword_matcher.contains_any(text)
     
-    def analyze_paragraph_batch(self, paragraphs: List[Dict], question_set: Dict) -> Dict:
-        """Analyze a batch of paragraphs using Claude via model_completions.py"""
-        # Prepare context
-        context = "\n\n".join([
-            f"[Source: {p['source']}, Page {p['page']}]\n{p['text']}"
-            for p in paragraphs
-        ])
-        
-        prompt = f"""You are analyzing UK Parliament evidence on AI risks in finance.
+    def relevant_paragraphs(self, pdf_path: Path, paragraphs: List[Dict]) -> List[Dict]:
+        """
+        Paragraphs of one PDF that mention AI agents.
+
+        When the index covers the PDF it only pre-selects paragraphs with a keyword hit inside
+        their span of the page text; each candidate is then confirmed on the paragraph text,
+        so the result is the same as checking every paragraph.
+        """
+        keyword_offsets = self.index.offsets(self.ai_agent_keywords, pdf_path) if self.index is not None else None
+        if keyword_offsets is None:
+            return [p for p in paragraphs if self.is_relevant_paragraph(p['text'])]
+        relevant = []
+        for p in paragraphs:
+            if p['offset'] is not None:
+                offsets = keyword_offsets.get(p['page'])
+                if offsets is None:
+                    continue
+                first_hit = np.searchsorted(offsets, p['offset'])
+                if first_hit == len(offsets) or offsets[first_hit] >= p['offset'] + len(p['text']):
+                    continue
+            # Phrase hits may run past the paragraph end or across punctuation
+            if self.is_relevant_paragraph(p['text']):
+                relevant.append(p)
+        return relevant
+    
+    def format_paragraph(self, paragraph: Dict) -> str:
+        """Paragraph as it appears in the analysis context"""
+        # De-duplicated paragraphs cite every document/page the text appeared on
+        references = paragraph.get('references') or [paragraph]
+        cited = "; ".join(f"{r['source']}, Page {r['page']}" for r in references)
+        return f"[Source: {cited}]\n{paragraph['text']}"
+    
+    def analysis_prompts(self, question_set: Dict) -> Tuple[str, str]:
+        """System prompt and instructions shared by every analysis batch"""
+        # System prompt
+        system_prompt = """You are analyzing UK Parliament evidence on AI risks in finance.
         
 Focus ONLY on content about AI agents or general-purpose AI as defined:
 AI agent = Software program that can interact with its environment, collect data, 
 and use the data for executing self-determined actions that impact the environment, 
 to meet predetermined, underspecified goals.
 
-Analyze these paragraphs for the following questions:
+Return your response as valid JSON only."""
+        
+        # Instructions are identical for every batch, so they go before the context
+        # and can be cached as a prompt prefix together with the system prompt
+        instructions = f"""Analyze the paragraphs given below for the following questions:
 {json.dumps(question_set, indent=2)}
 
 For EACH relevant finding:
@@ -123,8 +271,7 @@ For EACH relevant finding:
 2. Include source document and page number
 3. Categorize by question number
 
-Context:
-{context}
+{ANALYSIS_GUIDELINES}
 
 Return response as JSON with structure:
 {{
@@ -138,96 +285,301 @@ Return response as JSON with structure:
         }}
     ]
 }}"""
+        return system_prompt, instructions
+    
+    def paragraph_token_budget(self, question_set: Dict) -> int:
+        """Paragraph tokens allowed per batch: the configured budget, capped by what fits in the context"""
+        system_prompt, instructions = self.analysis_prompts(question_set)
+        overhead = estimate_tokens(system_prompt) + estimate_tokens(instructions) + estimate_tokens("Context:\n")
+        context_room = int(MODEL_CONTEXT_TOKENS * (1 - CONTEXT_SAFETY_MARGIN)) - ANALYSIS_MAX_TOKENS - overhead
+        return max(1, min(self.batch_token_budget, context_room))
+    
+    def split_paragraph(self, paragraph: Dict, max_tokens: int) -> List[Dict]:
+        """Split a paragraph too long for one batch into pieces at whitespace, keeping its source and page"""
+        header_tokens = estimate_tokens(self.format_paragraph({**paragraph, 'text': ''}))
+        max_chars = max(1, (max_tokens - header_tokens - 1) * 4)
+        text = paragraph['text']
+        pieces = []
+        while len(text) > max_chars:
+            cut = text.rfind(' ', 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append({**paragraph, 'text': text[:cut].strip()})
+            text = text[cut:].strip()
+        if text:
+            pieces.append({**paragraph, 'text': text})
+        return pieces
+    
+    def pack_paragraphs(self, paragraphs: List[Dict], question_set: Dict) -> List[List[Dict]]:
+        """
+        Group paragraphs into batches that fill the per-call token budget, keeping document order.
+        Paragraphs longer than the budget on their own are split so no request exceeds the context.
+        """
+        budget = self.paragraph_token_budget(question_set)
+        batches = []
+        batch, batch_tokens = [], 0
+        for paragraph in paragraphs:
+            for piece in self.split_paragraph(paragraph, budget):
+                # +1 for the blank line between paragraphs
+                tokens = estimate_tokens(self.format_paragraph(piece)) + 1
+                if batch and batch_tokens + tokens > budget:
+                    batches.append(batch)
+                    batch, batch_tokens = [], 0
+                batch.append(piece)
+                batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def analyze_paragraph_batch(self, paragraphs: List[Dict], question_set: Dict) -> Optional[Dict]:
+        """
+        Analyze a batch of paragraphs using Claude via model_completions.py.
+        Returns None if the call failed or gave no parsable JSON, as opposed to no findings.
+        """
+        # Prepare context
+        context = "\n\n".join([self.format_paragraph(p) for p in paragraphs])
+        system_prompt, instructions = self.analysis_prompts(question_set)
+        # Only mark the shared prefix for caching when it is long enough to be cached at all
+        cache_prefix = estimate_tokens(system_prompt) + estimate_tokens(instructions) >= MIN_CACHEABLE_PROMPT_TOKENS
+        
+        # User message
+        user_message = [
+            cacheable_text(instructions) if cache_prefix else {"type": "text", "text": instructions},
+            {"type": "text", "text": f"Context:\n{context}"}
+        ]
         
         try:
-            # Use model_completions.py function
-            response = get_completion(
-                prompt=prompt,
-                model="claude-3-sonnet-20240229",
-                max_tokens=4000,
-                temperature=0
+            # Rate limiting and retries are handled by model_completions
+            response, token_usage = get_claude_completion(
+                system_prompt=system_prompt,
+                conversation_history=[{"user": user_message}],
+                anthropic_client=self.anthropic_client,
+                max_tokens=ANALYSIS_MAX_TOKENS,
+                temperature=0,
+                cache_system_prompt=cache_prefix
             )
             
             # Parse JSON response
             # Extract JSON from response if it's wrapped in other text
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
+            json_match = re.search(r'\{.*\}', response or "", re.DOTALL)
             if json_match:
-                result = json.loads(json_match.group())
-            else:
-                result = {"findings": []}
-            return result
+                return json.loads(json_match.group())
+            print("Claude analysis returned no JSON" if response else "Claude analysis failed")
+            return None
             
         except Exception as e:
             print(f"Error in Claude analysis: {e}")
-            return {"findings": []}
+            return None
     
     def process_pdfs(self):
         """Main processing loop"""
-        questions = {
-            1: "Which scenarios are described as likely risks to financial stability from AI agents?",
-            2: "What data sources and evidence would we need to track and measure these risks?",
-            3: "What are the most consequential general-purpose AI capabilities & tools currently in finance?",
-            4: "What AI capabilities are expected in finance over the next ten years?",
-            5: "What are the most significant vulnerabilities and systems affected?"
-        }
+        questions = ANALYSIS_QUESTIONS
         
         # First, filter PDFs that contain both 'agent' and 'stability'
         print("Filtering PDFs for 'agent' AND 'stability'...")
-        pdf_files = list(self.pdf_folder.glob("*.pdf"))
+        pdf_files = sorted(self.pdf_folder.glob("*.pdf"))
         relevant_pdfs = []
         
-        for pdf_path in pdf_files:
-            if self.pdf_contains_required_terms(pdf_path):
+        if self.index is not None:
+            # Only new or changed PDFs are extracted; the filter is then an index lookup
+            self.index.update(pdf_files, max_workers=self.extraction_workers)
+            results = ((p, self.required_terms_result(p)) for p in pdf_files)
+        else:
+            # Text is extracted in parallel worker processes, documents come back in order
+            results = ((p, self.required_terms.match(pages))
+                       for p, pages in extract_documents(pdf_files, max_workers=self.extraction_workers))
+        for pdf_path, result in results:
+            if result:
                 relevant_pdfs.append(pdf_path)
-                print(f"✓ Relevant: {pdf_path.name}")
+                found_on = ", ".join(f"'{t}' p.{page}" for t, page in result.term_pages.items())
+                print(f"✓ Relevant: {pdf_path.name} ({found_on})")
             else:
                 print(f"✗ Skipping: {pdf_path.name} (missing required terms)")
         
         print(f"\nFound {len(relevant_pdfs)} relevant PDFs out of {len(pdf_files)} total")
+        self.total_pdfs = len(pdf_files)
+        self.relevant_pdfs = relevant_pdfs
+        
+        # Paragraphs analysed unchanged by an earlier run reuse their findings (see analyze_pdfs)
+        findings_by_pdf = self.analyze_pdfs(relevant_pdfs, questions)
         
+        # Store results by question, in document order
+        for pdf_path in relevant_pdfs:
+            for finding in findings_by_pdf[pdf_path.name]:
+                self.results[finding['question_num']].append(finding)
+    
+    def paragraph_key(self, paragraph: Dict, question_set: Dict) -> str:
+        """Manifest key of a paragraph analysed for a question set: its prompt, text and citations"""
+        system_prompt, instructions = self.analysis_prompts(question_set)
+        return prompt_fingerprint(system_prompt, instructions, self.format_paragraph(paragraph))
+    
+    def finding_paragraph(self, finding: Dict, batch: List[Dict]) -> Dict:
+        """Paragraph of a batch a finding quotes, else the first one citing its page, else the first"""
+        quote = " ".join(str(finding.get('quote') or '').split()).lower()
+        if quote:
+            for paragraph in batch:
+                if quote in " ".join(paragraph['text'].split()).lower():
+                    return paragraph
+        cited = (str(finding.get('source') or ''), str(finding.get('page')))
+        for paragraph in batch:
+            if cited in {(r['source'], str(r['page'])) for r in paragraph.get('references') or [paragraph]}:
+                return paragraph
+        return batch[0]
+    
+    def finding_document(self, finding: Dict, paragraph: Dict, names: Iterable[str]) -> str:
+        """Name of the analysed PDF a finding came from, falling back to the first one its paragraph cites"""
+        source = str(finding.get('source') or '')
+        if source in names:
+            return source
+        for name in names:
+            if name in source:
+                return name
+        return (paragraph.get('references') or [paragraph])[0]['source']
+    
+    def select_paragraph_sets(self, paragraphs: List[Dict], questions: Dict) -> Tuple[List[Dict], Dict]:
+        """
+        De-duplicate paragraphs and select them per question.
+
+        Returns:
+            tuple: (paragraphs to analyse against all questions, question number -> paragraphs
+                   to analyse against that question alone)
+        """
+        if self.dedupe:
+            # Boilerplate and quoted passages repeat across submissions; send each text once
+            paragraphs = dedupe_paragraphs(paragraphs)
+        selected = None
+        if self.retrieval_top_k:
+            selected = select_paragraphs(paragraphs, questions, self.retrieval_top_k)
+        if selected is None:
+            # Few enough paragraphs that one pass over all of them for all questions is cheaper
+            return paragraphs, {}
+        return [], selected
+    
+    def analyze_pdfs(self, pdf_paths: List[Path], questions: Dict) -> Dict[str, List[Dict]]:
+        """
+        Analyze the given PDFs against the questions.
+
+        Paragraphs are de-duplicated and selected across all the PDFs. With a manifest each analysed
+        paragraph's findings are stored under its paragraph_key, and paragraphs analysed by an earlier
+        run are not sent again. Paragraphs in a batch whose call failed are not stored, so the next
+        run retries them.
+
+        Returns:
+            dict: PDF name -> findings
+        """
         # Collect all relevant paragraphs from filtered PDFs
         all_relevant_paragraphs = []
         
         print("\nExtracting relevant paragraphs from filtered PDFs...")
-        for pdf_path in relevant_pdfs:
+        for pdf_path in pdf_paths:
             print(f"Processing: {pdf_path.name}")
             paragraphs = self.extract_paragraphs_from_pdf(pdf_path)
             
             # Filter for relevant paragraphs (AI agent mentions)
-            relevant = [p for p in paragraphs if self.is_relevant_paragraph(p['text'])]
-            all_relevant_paragraphs.extend(relevant)
+            all_relevant_paragraphs.extend(self.relevant_paragraphs(pdf_path, paragraphs))
         
         print(f"\nFound {len(all_relevant_paragraphs)} relevant paragraphs")
         
-        # Process in batches to respect context window
-        batch_size = 10  # Adjust based on paragraph length
+        # Each unit is a paragraph and the questions it is analysed for
+        shared, selected = self.select_paragraph_sets(all_relevant_paragraphs, questions)
+        units = [(questions, p) for p in shared]
+        for q_num in questions:
+            if selected.get(q_num):
+                # Each question gets its own batches of its top-ranked paragraphs
+                print(f"Question {q_num}: {len(selected[q_num])} paragraphs selected")
+                units.extend(({q_num: questions[q_num]}, p) for p in selected[q_num])
+        keys = [self.paragraph_key(p, question_set) for question_set, p in units]
+        unit_findings = [self.manifest.findings(key) if self.manifest is not None else None for key in keys]
         
-        for i in range(0, len(all_relevant_paragraphs), batch_size):
-            batch = all_relevant_paragraphs[i:i+batch_size]
-            print(f"Analyzing batch {i//batch_size + 1}/{(len(all_relevant_paragraphs)-1)//batch_size + 1}")
-            
-            results = self.analyze_paragraph_batch(batch, questions)
-            
-            # Store results by question
+        # Pack the paragraphs still to analyse into batches filling the token budget (see pack_paragraphs)
+        to_analyze = defaultdict(list)
+        for unit_num, ((question_set, paragraph), findings) in enumerate(zip(units, unit_findings)):
+            if findings is None:
+                to_analyze[tuple(question_set)].append({**paragraph, 'unit': unit_num})
+        batches = []
+        for q_nums, paragraphs in to_analyze.items():
+            question_set = {q: questions[q] for q in q_nums}
+            batches.extend((question_set, batch) for batch in self.pack_paragraphs(paragraphs, question_set))
+        print(f"{len(shared)} paragraphs analysed for all questions, {len(units) - len(shared)} for single "
+              f"questions; {len(units) - sum(map(len, to_analyze.values()))} unchanged since the last run, "
+              f"the rest in {len(batches)} batches")
+        
+        # Batches run concurrently; findings are merged afterwards by paragraph, in paragraph
+        # order, so they come out in the same order on every run
+        batch_results = [None] * len(batches)
+        with ThreadPoolExecutor(max_workers=self.analysis_workers) as executor:
+            futures = {
+                executor.submit(self.analyze_paragraph_batch, batch, question_set): batch_num
+                for batch_num, (question_set, batch) in enumerate(batches)
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                batch_num = futures[future]
+                batch_results[batch_num] = future.result()
+                print(f"Analyzed batch {batch_num + 1} ({len(batches[batch_num][1])} paragraphs), "
+                      f"{done}/{len(batches)} done")
+        
+        new_findings = defaultdict(list)
+        failed = set()
+        for (question_set, batch), results in zip(batches, batch_results):
+            if results is None:
+                failed.update(p['unit'] for p in batch)
+                continue
             for finding in results.get('findings', []):
-                self.results[finding['question_num']].append(finding)
-            
-            # Rate limiting
-            time.sleep(1)
+                if len(question_set) == 1:
+                    # A batch asked one question; don't trust the model to echo its number
+                    finding['question_num'] = next(iter(question_set))
+                new_findings[self.finding_paragraph(finding, batch)['unit']].append(finding)
+        # A paragraph split over several batches is only complete if all of them succeeded
+        analysed = {p['unit'] for _, batch in batches for p in batch} - failed
+        for unit_num in analysed:
+            unit_findings[unit_num] = new_findings[unit_num]
+        if failed:
+            print(f"Analysis failed for {len(failed)} paragraphs; they will be analysed again on the next run")
+        if self.manifest is not None:
+            for unit_num in analysed:
+                self.manifest.set_findings(keys[unit_num], unit_findings[unit_num])
+            dropped = self.manifest.retain(keys)
+            print(f"{len(dropped)} paragraphs of earlier runs dropped from the manifest")
+            self.manifest.save()
+        
+        names = [p.name for p in pdf_paths]
+        findings_by_pdf = {name: [] for name in names}
+        for (question_set, paragraph), findings in zip(units, unit_findings):
+            for finding in findings or []:
+                findings_by_pdf[self.finding_document(finding, paragraph, names)].append(finding)
+        return findings_by_pdf
     
-    def cluster_and_summarize(self):
-        """Cluster findings by theme and create summaries"""
-        clustered_results = {}
+    def _cluster_call(self, user_message: str, label: str):
+        """Run one clustering prompt and return the parsed JSON, or None on failure"""
+        # System prompt
+        system_prompt = "You are a research analyst specializing in AI risks in finance. Return your response as valid JSON only."
         
-        for question_num, findings in self.results.items():
-            if not findings:
-                continue
-                
-            # System prompt
-            system_prompt = "You are a research analyst specializing in AI risks in finance. Return your response as valid JSON only."
+        try:
+            # Prepare conversation history
+            conversation_history = [{"user": user_message}]
             
-            # User message
-            user_message = f"""Group these findings into thematic clusters and provide a summary for each cluster.
+            response, token_usage = get_claude_completion(
+                system_prompt=system_prompt,
+                conversation_history=conversation_history,
+                anthropic_client=self.anthropic_client,
+                max_tokens=CLUSTER_MAX_TOKENS,
+                temperature=0
+            )
+            
+            if response:
+                # Extract JSON from response
+                json_match = re.search(r'\{.*\}', response, re.DOTALL)
+                if json_match:
+                    return json.loads(json_match.group())
+        
+        except Exception as e:
+            print(f"Error clustering {label}: {e}")
+        return None
+    
+    def cluster_findings(self, question_num, findings: List[Dict], offset: int = 0):
+        """Cluster one list of findings; finding_indices are shifted by offset to index the full list"""
+        # User message
+        user_message = f"""Group these findings into thematic clusters and provide a summary for each cluster.
 
 Findings for Question {question_num}:
 {json.dumps(findings, indent=2)}
@@ -243,41 +595,239 @@ Return as JSON:
         }}
     ]
 }}"""
-            
-            try:
-                # Prepare conversation history
-                conversation_history = [{"user": user_message}]
-                
-                response, token_usage = get_claude_completion(
-                    system_prompt=system_prompt,
-                    conversation_history=conversation_history,
-                    anthropic_client=self.anthropic_client,
-                    max_tokens=2000,
-                    temperature=0
-                )
-                
-                if response:
-                    # Extract JSON from response
-                    json_match = re.search(r'\{.*\}', response, re.DOTALL)
-                    if json_match:
-                        clustered_results[question_num] = json.loads(json_match.group())
-                
-            except Exception as e:
-                print(f"Error clustering question {question_num}: {e}")
+        result = self._cluster_call(user_message, f"question {question_num}")
+        if result is None:
+            return None
+        clusters = result.get('clusters', [])
+        for cluster in clusters:
+            cluster['finding_indices'] = [
+                i + offset for i in cluster.get('finding_indices', [])
+                if isinstance(i, int) and 0 <= i < len(findings)
+            ]
+        return result
+    
+    def merge_clusters(self, question_num, clusters: List[Dict]) -> Tuple[List[Dict], bool]:
+        """
+        Merge clusters that share a theme. The model only chooses which clusters to merge;
+        finding indices are combined here so no finding is dropped or invented.
+        Returns the clusters and whether the merge call succeeded (on failure they are returned unmerged).
+        """
+        listed = [
+            {"cluster_id": i, "theme": c.get('theme'), "summary": c.get('summary'), "key_quotes": c.get('key_quotes', [])}
+            for i, c in enumerate(clusters)
+        ]
+        user_message = f"""These thematic clusters were formed separately from parts of the findings for Question {question_num}.
+Merge clusters that cover the same theme, and write a combined summary for each merged cluster.
+
+Clusters:
+{json.dumps(listed, indent=2)}
+
+Return as JSON:
+{{
+    "clusters": [
+        {{
+            "theme": "cluster theme",
+            "summary": "comprehensive summary",
+            "merged_cluster_ids": [0, 3],
+            "key_quotes": ["most important quote 1", "quote 2"]
+        }}
+    ]
+}}"""
+        if len(clusters) < 2:
+            return clusters, True
+        result = self._cluster_call(user_message, f"question {question_num} (merge)")
+        if result is None:
+            return clusters, False
+        
+        merged, used = [], set()
+        for cluster in result.get('clusters', []):
+            ids = [i for i in cluster.get('merged_cluster_ids', [])
+                   if isinstance(i, int) and 0 <= i < len(clusters) and i not in used]
+            if not ids:
+                continue
+            used.update(ids)
+            merged.append({
+                "theme": cluster.get('theme'),
+                "summary": cluster.get('summary'),
+                "finding_indices": sorted({f for i in ids for f in clusters[i].get('finding_indices', [])}),
+                "key_quotes": cluster.get('key_quotes', [])
+            })
+        # Clusters the model left out are kept as they were
+        merged.extend(c for i, c in enumerate(clusters) if i not in used)
+        return merged, True
+    
+    def _token_chunks(self, items: List, budget: int) -> List[Tuple[int, List]]:
+        """Split items into (offset, chunk) pieces of at most budget estimated tokens each"""
+        chunks, chunk, chunk_tokens, offset = [], [], 0, 0
+        for i, item in enumerate(items):
+            tokens = estimate_tokens(json.dumps(item, indent=2))
+            if chunk and chunk_tokens + tokens > budget:
+                chunks.append((offset, chunk))
+                chunk, chunk_tokens, offset = [], 0, i
+            chunk.append(item)
+            chunk_tokens += tokens
+        if chunk:
+            chunks.append((offset, chunk))
+        return chunks
+    
+    def summarize_cluster_chunk(self, question_num, payloads: List[Dict]) -> Optional[Dict]:
+        """Name and summarise pre-formed clusters; returns cluster_id -> {theme, summary, key_quotes}, or None on failure"""
+        user_message = f"""These findings for Question {question_num} have already been grouped into thematic clusters.
+For each cluster, name its theme and write a summary of what its findings say.
+
+Clusters:
+{json.dumps(payloads, indent=2)}
+
+Return as JSON:
+{{
+    "clusters": [
+        {{
+            "cluster_id": 0,
+            "theme": "cluster theme",
+            "summary": "comprehensive summary",
+            "key_quotes": ["most important quote 1", "quote 2"]
+        }}
+    ]
+}}"""
+        result = self._cluster_call(user_message, f"question {question_num} (summaries)")
+        if result is None:
+            return None
+        summaries = {}
+        for cluster in result.get('clusters', []):
+            if isinstance(cluster.get('cluster_id'), int):
+                summaries[cluster['cluster_id']] = cluster
+        return summaries
+    
+    def summarize_preclusters(self, question_num, findings: List[Dict]):
+        """
+        Cluster findings locally (see finding_clusters.py) and have the model write a theme and
+        summary for each cluster, several clusters per call and calls in parallel.
+        Returns the clusters and whether every summary call succeeded.
+        """
+        preclusters = precluster_findings(findings)
+        payloads = [
+            {"cluster_id": cluster_id, "findings": [
+                {key: findings[i].get(key) for key in ('quote', 'source', 'page')}
+                for i in cluster['representative_indices'][:MAX_QUOTES_PER_CLUSTER]
+            ]}
+            for cluster_id, cluster in enumerate(preclusters)
+        ]
+        chunks = self._token_chunks(payloads, self.cluster_token_budget)
+        print(f"Question {question_num}: {len(findings)} findings pre-clustered into {len(preclusters)} clusters, "
+              f"summarising in {len(chunks)} calls")
+        summaries = {}
+        complete = True
+        with ThreadPoolExecutor(max_workers=self.analysis_workers) as executor:
+            for chunk_summaries in executor.map(lambda chunk: self.summarize_cluster_chunk(question_num, chunk[1]), chunks):
+                if chunk_summaries is None:
+                    complete = False
+                    continue
+                summaries.update(chunk_summaries)
+        
+        clusters = []
+        for cluster_id, cluster in enumerate(preclusters):
+            # Clusters the model did not summarise keep their top terms as the theme
+            summary = summaries.get(cluster_id, {})
+            representatives = cluster['representative_indices']
+            clusters.append({
+                "theme": summary.get('theme') or ", ".join(cluster['top_terms']) or "Other",
+                "summary": summary.get('summary', ""),
+                "finding_indices": cluster['finding_indices'],
+                "key_quotes": summary.get('key_quotes') or [findings[i].get('quote') for i in representatives[:2]]
+            })
+        return {"clusters": clusters}, complete
+    
+    def cluster_question(self, question_num, findings: List[Dict]):
+        """
+        Cluster the findings for one question. With precluster (the default) clusters are formed
+        locally and the model only summarises them. Otherwise findings that fit in one prompt are
+        clustered in a single call; larger sets are clustered chunk by chunk in parallel (map) and
+        the chunk clusters are then merged, in rounds if needed, until one set remains (reduce).
+        
+        Returns:
+            tuple: (clusters or None, whether every model call succeeded)
+        """
+        if self.precluster:
+            return self.summarize_preclusters(question_num, findings)
+        chunks = self._token_chunks(findings, self.cluster_token_budget)
+        if len(chunks) == 1:
+            result = self.cluster_findings(question_num, findings)
+            return result, result is not None
+        
+        print(f"Question {question_num}: clustering {len(findings)} findings in {len(chunks)} chunks")
+        with ThreadPoolExecutor(max_workers=self.analysis_workers) as executor:
+            partials = list(executor.map(
+                lambda chunk: self.cluster_findings(question_num, chunk[1], offset=chunk[0]), chunks
+            ))
+        complete = all(partial is not None for partial in partials)
+        clusters = [c for partial in partials if partial for c in partial.get('clusters', [])]
+        if not clusters:
+            return None, False
+        
+        while True:
+            groups = self._token_chunks(clusters, self.cluster_token_budget)
+            if len(groups) == 1:
+                merged_clusters, merged_ok = self.merge_clusters(question_num, clusters)
+                return {"clusters": merged_clusters}, complete and merged_ok
+            with ThreadPoolExecutor(max_workers=self.analysis_workers) as executor:
+                merged = list(executor.map(lambda group: self.merge_clusters(question_num, group[1]), groups))
+            complete = complete and all(merged_ok for _, merged_ok in merged)
+            merged_clusters = [c for group, _ in merged for c in group]
+            if len(merged_clusters) >= len(clusters):
+                # Nothing merged this round; stop rather than loop forever
+                return {"clusters": merged_clusters}, complete
+            clusters = merged_clusters
+    
+    def cluster_and_summarize(self):
+        """Cluster findings by theme and create summaries"""
+        clustered_results = {}
+        
+        # Each question is clustered independently, so they run concurrently
+        questions = [(q, findings) for q, findings in self.results.items() if findings]
+        fingerprints = {
+            q: prompt_fingerprint(CLUSTER_PROMPT_VERSION, self.precluster, self.cluster_token_budget,
+                                  json.dumps(findings, sort_keys=True))
+            for q, findings in questions
+        }
+        to_cluster = questions
+        if self.manifest is not None:
+            # Clusters are only regenerated for questions whose findings changed
+            for q, _ in questions:
+                cached = self.manifest.cached_clusters(q, fingerprints[q])
+                if cached is not None:
+                    clustered_results[q] = cached
+            to_cluster = [(q, findings) for q, findings in questions if q not in clustered_results]
+            print(f"Reusing clusters for {len(clustered_results)} questions, clustering {len(to_cluster)}")
+        with ThreadPoolExecutor(max_workers=max(1, len(to_cluster))) as executor:
+            futures = {executor.submit(self.cluster_question, q, findings): q for q, findings in to_cluster}
+            for future in as_completed(futures):
+                result, complete = future.result()
+                if result is not None:
+                    q = futures[future]
+                    clustered_results[q] = result
+                    # Fallback clusters from failed calls are reported but regenerated on the next run
+                    if self.manifest is not None and complete:
+                        self.manifest.set_clusters(q, fingerprints[q], result)
+        if self.manifest is not None:
+            self.manifest.save()
         
-        return clustered_results
+        # Keep question order stable regardless of completion order
+        return {q: clustered_results[q] for q, _ in questions if q in clustered_results}
     
     def generate_report(self):
         """Generate final analysis report"""
         clustered = self.cluster_and_summarize()
         
-        # Count relevant PDFs
-        pdf_files = list(self.pdf_folder.glob("*.pdf"))
-        relevant_pdfs = [p for p in pdf_files if self.pdf_contains_required_terms(p)]
+        # Count relevant PDFs (reuses the filter results from process_pdfs when available)
+        relevant_pdfs = self.relevant_pdfs
+        if relevant_pdfs is None:
+            pdf_files = list(self.pdf_folder.glob("*.pdf"))
+            self.total_pdfs = len(pdf_files)
+            relevant_pdfs = [p for p in pdf_files if self.pdf_contains_required_terms(p)]
         
         report = {
             "analysis_date": datetime.now().isoformat(),
-            "total_documents": len(pdf_files),
+            "total_documents": self.total_pdfs,
             "relevant_documents": len(relevant_pdfs),
             "total_findings": sum(len(findings) for findings in self.results.values()),
             "filter_criteria": "PDFs containing both 'agent' AND 'stability'",
@@ -346,10 +896,9 @@ Filter applied: Only analyzed PDFs containing both 'agent' and 'stability' terms
 if __name__ == "__main__":
     # Configuration
     PDF_FOLDER = "2025-05-UKParliament-Evidence"
-    API_KEY = os.getenv("ANTHROPIC_API_KEY")  # Get from environment or specify directly
     
-    # Run analysis
-    analyzer = AIFinanceRiskAnalyzer(PDF_FOLDER, API_KEY)
+    # Run analysis (reads ANTHROPIC_API_KEY from the environment)
+    analyzer = AIFinanceRiskAnalyzer(PDF_FOLDER)
     
     print("Starting AI Finance Risk Analysis...")
     print("=" * 50)
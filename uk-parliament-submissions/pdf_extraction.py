@@ -0,0 +1,565 @@
+"""
+Single-pass PDF text extraction with a persistent per-page cache.
+
+Each document is parsed once into a list of per-page text records that are
+stored in a local SQLite file. Entries are keyed on the file's content hash
+and the extractor version; the file's size and mtime are remembered so an
+unchanged file is recognised without re-hashing it. Filtering, paragraph
+splitting and report generation all read the cached pages instead of
+re-parsing the PDF.
+
+Text is extracted by one of several backends (PyPDF2, pypdfium2,
+pdfplumber) chosen with the PDF_EXTRACTOR_BACKEND environment variable; the
+backend and its version are part of the cache key, so switching backends
+never serves another backend's text. A backend that is not installed falls
+back to PyPDF2 with a warning. benchmark_extractors.py compares them.
+
+Pages are PageRecord(source, page, text) tuples. iter_pages() yields them
+lazily as each page is extracted, so callers can stop reading a document as
+soon as they have what they need; extract_documents() is the bulk entry
+point: documents missing from the cache are fanned out over a process pool,
+with large documents split into page ranges, and the page records are
+yielded back in input order.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import PyPDF2
+
+try:
+    import pypdfium2 as pdfium
+    from pypdfium2.version import PYPDFIUM_INFO
+except ImportError:
+    pdfium = None
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_CACHE_PATH = os.environ.get("PDF_PAGE_CACHE_PATH", ".pdf_page_cache.sqlite")
+# Always installed; used when PDF_EXTRACTOR_BACKEND names a backend that is not
+DEFAULT_EXTRACTOR_BACKEND = "pypdf2"
+# "pypdf2", "pypdfium2" or "pdfplumber" (see EXTRACTOR_BACKENDS)
+EXTRACTOR_BACKEND = os.environ.get("PDF_EXTRACTOR_BACKEND", DEFAULT_EXTRACTOR_BACKEND)
+HASH_CHUNK_SIZE = 1 << 20
+# Large documents are split into tasks of this many pages so no worker holds a whole
+# large document's text, and its pages are extracted by several workers at once
+PAGES_PER_TASK = 25
+
+
+class PageRecord(NamedTuple):
+    """Text of one PDF page."""
+    source: str  # File name
+    page: int  # 1-based page number
+    text: str
+
+
+def file_sha256(path) -> str:
+    """SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _PyPDF2Document:
+    """PDF opened with PyPDF2 (pure Python)."""
+
+    def __init__(self, pdf_path):
+        self._file = open(pdf_path, "rb")
+        try:
+            self._reader = PyPDF2.PdfReader(self._file)
+        except Exception:
+            self._file.close()
+            raise
+
+    def __len__(self):
+        return len(self._reader.pages)
+
+    def page_text(self, index):
+        return self._reader.pages[index].extract_text() or ""
+
+    def close(self):
+        self._file.close()
+
+
+class _PdfiumDocument:
+    """PDF opened with pypdfium2 (PDFium, native)."""
+
+    def __init__(self, pdf_path):
+        self._pdf = pdfium.PdfDocument(str(pdf_path))
+
+    def __len__(self):
+        return len(self._pdf)
+
+    def page_text(self, index):
+        page = self._pdf[index]
+        textpage = page.get_textpage()
+        try:
+            # PDFium ends lines with CR LF; the other backends use LF
+            return (textpage.get_text_range() or "").replace("\r\n", "\n")
+        finally:
+            textpage.close()
+            page.close()
+
+    def close(self):
+        self._pdf.close()
+
+
+class _PdfplumberDocument:
+    """PDF opened with pdfplumber (pdfminer.six layout analysis, pure Python)."""
+
+    def __init__(self, pdf_path):
+        self._pdf = pdfplumber.open(pdf_path)
+
+    def __len__(self):
+        return len(self._pdf.pages)
+
+    def page_text(self, index):
+        page = self._pdf.pages[index]
+        try:
+            return page.extract_text() or ""
+        finally:
+            # Drop the page's parsed layout objects so memory does not grow with the document
+            page.close()
+
+    def close(self):
+        self._pdf.close()
+
+
+# name -> (document class, library version, or None if the library is not installed)
+EXTRACTOR_BACKENDS = {
+    "pypdf2": (_PyPDF2Document, PyPDF2.__version__),
+    "pypdfium2": (_PdfiumDocument, str(PYPDFIUM_INFO) if pdfium is not None else None),
+    "pdfplumber": (_PdfplumberDocument, pdfplumber.__version__ if pdfplumber is not None else None),
+}
+
+
+def _backend(backend):
+    if backend not in EXTRACTOR_BACKENDS:
+        raise ValueError(f"Unknown PDF extractor backend {backend!r}; choose from {', '.join(EXTRACTOR_BACKENDS)}")
+    document_class, version = EXTRACTOR_BACKENDS[backend]
+    if version is None:
+        raise RuntimeError(f"PDF extractor backend {backend!r} is not installed")
+    return document_class, version
+
+
+def _available_backend(backend: str) -> str:
+    """The backend if it is known and installed, else DEFAULT_EXTRACTOR_BACKEND with a warning."""
+    try:
+        _backend(backend)
+    except (ValueError, RuntimeError) as e:
+        logger.warning(f"{e}; extracting text with {DEFAULT_EXTRACTOR_BACKEND} instead")
+        return DEFAULT_EXTRACTOR_BACKEND
+    return backend
+
+
+# Resolved once at import so the cache key below never names a backend that cannot run
+EXTRACTOR_BACKEND = _available_backend(EXTRACTOR_BACKEND)
+
+
+def extractor_version(backend: str = EXTRACTOR_BACKEND) -> str:
+    """Version tag of a backend's text, used to key cached pages and indexes."""
+    # Bump the suffix when the extraction logic changes so cached pages are re-extracted
+    return f"{backend}-{_backend(backend)[1]}-1"
+
+
+EXTRACTOR_VERSION = extractor_version()
+
+
+def open_document(pdf_path, backend: str = EXTRACTOR_BACKEND):
+    """Open a PDF with the given backend; the document has len(), page_text(index) and close()."""
+    return _backend(backend)[0](pdf_path)
+
+
+def iter_page_texts(pdf_path, backend: str = EXTRACTOR_BACKEND, start: int = 0,
+                    stop: Optional[int] = None) -> Iterator[str]:
+    """Yield the text of pages [start, stop) one at a time, parsing each page only when asked for (uncached)."""
+    document = open_document(pdf_path, backend)
+    try:
+        for index in range(start, len(document) if stop is None else min(stop, len(document))):
+            yield document.page_text(index)
+    finally:
+        document.close()
+
+
+def read_pdf_pages(pdf_path, start: int = 0, stop: Optional[int] = None,
+                   backend: str = EXTRACTOR_BACKEND) -> List[str]:
+    """Extract the text of pages [start, stop) of a PDF (uncached)."""
+    return _extract_range(pdf_path, start, stop, backend)[0]
+
+
+def _extract_range(pdf_path, start, stop, backend=EXTRACTOR_BACKEND):
+    """Worker task: (page texts of [start, stop), total page count)."""
+    document = open_document(pdf_path, backend)
+    try:
+        page_count = len(document)
+        stop = page_count if stop is None else min(stop, page_count)
+        texts = [document.page_text(index) for index in range(start, stop)]
+    finally:
+        document.close()
+    return texts, page_count
+
+
+class PageCache:
+    """
+    SQLite-backed cache of extracted page text.
+
+    Args:
+        path (str): SQLite file to store pages in
+        extractor_version (str): Version tag stored with every entry; entries with
+                                 another version are ignored and re-extracted
+    """
+
+    def __init__(self, path=DEFAULT_PAGE_CACHE_PATH, extractor_version=EXTRACTOR_VERSION):
+        self.path = path
+        self.extractor_version = extractor_version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS pages (
+                    sha256 TEXT NOT NULL,
+                    extractor_version TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    PRIMARY KEY (sha256, extractor_version, page)
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS documents (
+                    sha256 TEXT NOT NULL,
+                    extractor_version TEXT NOT NULL,
+                    page_count INTEGER NOT NULL,
+                    extracted_at REAL NOT NULL,
+                    PRIMARY KEY (sha256, extractor_version)
+                )"""
+            )
+
+    def file_hash(self, pdf_path) -> str:
+        """Content hash of a file, re-hashing only when its size or mtime changed."""
+        key = str(Path(pdf_path).resolve())
+        stat = os.stat(pdf_path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, sha256 FROM files WHERE path = ?", (key,)
+            ).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        sha256 = file_sha256(pdf_path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (key, stat.st_size, stat.st_mtime_ns, sha256),
+            )
+        return sha256
+
+    def get(self, sha256) -> Optional[List[str]]:
+        """Return the cached page texts of a document, or None on a miss."""
+        with self._lock:
+            document = self._conn.execute(
+                "SELECT page_count FROM documents WHERE sha256 = ? AND extractor_version = ?",
+                (sha256, self.extractor_version),
+            ).fetchone()
+            if document is None:
+                self.misses += 1
+                return None
+            rows = self._conn.execute(
+                "SELECT text FROM pages WHERE sha256 = ? AND extractor_version = ? ORDER BY page",
+                (sha256, self.extractor_version),
+            ).fetchall()
+            self.hits += 1
+        return [row[0] for row in rows]
+
+    def put(self, sha256, pages: List[str]):
+        """Store the page texts of a document, replacing any previous entry."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM pages WHERE sha256 = ? AND extractor_version = ?",
+                (sha256, self.extractor_version),
+            )
+            self._conn.executemany(
+                "INSERT INTO pages (sha256, extractor_version, page, text) VALUES (?, ?, ?, ?)",
+                [(sha256, self.extractor_version, page_num, text) for page_num, text in enumerate(pages, 1)],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (sha256, extractor_version, page_count, extracted_at) "
+                "VALUES (?, ?, ?, ?)",
+                (sha256, self.extractor_version, len(pages), time.time()),
+            )
+
+    def clear(self):
+        """Remove every entry and reset the hit/miss counters."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("DELETE FROM pages")
+            self._conn.execute("DELETE FROM documents")
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters and the number of cached documents."""
+        lookups = self.hits + self.misses
+        with self._lock:
+            documents = self._conn.execute(
+                "SELECT COUNT(*) FROM documents WHERE extractor_version = ?", (self.extractor_version,)
+            ).fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "documents": documents,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_page_cache = None
+_page_cache_enabled = os.environ.get("PDF_PAGE_CACHE_DISABLED") != "1"
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    """Return the shared page cache, or None if disabled via PDF_PAGE_CACHE_DISABLED=1."""
+    global _page_cache
+    if not _page_cache_enabled:
+        return None
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageCache()
+        return _page_cache
+
+
+def set_page_cache(cache):
+    """Replace the shared page cache (pass None to disable caching)."""
+    global _page_cache, _page_cache_enabled
+    with _page_cache_lock:
+        _page_cache = cache
+        _page_cache_enabled = cache is not None
+
+
+def document_hash(pdf_path) -> str:
+    """SHA-256 of a PDF's contents, remembered by the shared page cache while the file is unchanged."""
+    cache = get_page_cache()
+    return cache.file_hash(pdf_path) if cache is not None else file_sha256(pdf_path)
+
+
+def load_pages(pdf_path, cache=None) -> List[PageRecord]:
+    """
+    Return a PDF's pages as records, parsing the file only if it is not cached.
+
+    Args:
+        pdf_path (str or Path): PDF to read
+        cache (PageCache, optional): Cache to use instead of the shared one
+
+    Returns:
+        list: PageRecord per page; empty if the file could not be read
+    """
+    pdf_path = Path(pdf_path)
+    cache = cache or get_page_cache()
+    try:
+        sha256 = cache.file_hash(pdf_path) if cache else None
+        pages = cache.get(sha256) if cache else None
+        if pages is None:
+            pages = read_pdf_pages(pdf_path)
+            if cache:
+                cache.put(sha256, pages)
+    except Exception as e:
+        logger.error(f"Error reading {pdf_path}: {e}")
+        return []
+    return _page_records(pdf_path, pages)
+
+
+def _page_records(pdf_path, pages):
+    return [PageRecord(pdf_path.name, page_num, text) for page_num, text in enumerate(pages, 1)]
+
+
+def iter_pages(pdf_path, cache=None) -> Iterator[PageRecord]:
+    """
+    Yield a PDF's pages one at a time as they are extracted.
+
+    Cached documents are served from the cache. Otherwise each page is parsed only
+    when the consumer asks for it, and the document is added to the cache once every
+    page has been read; a consumer that stops early leaves the rest unparsed.
+    Read errors are logged and end the iteration.
+    """
+    pdf_path = Path(pdf_path)
+    cache = cache or get_page_cache()
+    try:
+        sha256 = cache.file_hash(pdf_path) if cache else None
+        pages = cache.get(sha256) if cache else None
+    except Exception as e:
+        logger.error(f"Error reading {pdf_path}: {e}")
+        return
+    if pages is not None:
+        yield from _page_records(pdf_path, pages)
+        return
+
+    texts = []
+    try:
+        for text in iter_page_texts(pdf_path):
+            texts.append(text)
+            yield PageRecord(pdf_path.name, len(texts), text)
+    except Exception as e:
+        logger.error(f"Error reading {pdf_path}: {e}")
+        return
+    if cache:
+        cache.put(sha256, texts)
+
+
+def join_pages(pages: Iterable[PageRecord], max_chars: Optional[int] = None) -> Tuple[str, bool]:
+    """
+    Join page texts with newlines, stopping once max_chars characters have been collected.
+
+    Pages are consumed only up to the limit, so with iter_pages() the rest of the
+    document is never extracted.
+
+    Returns:
+        tuple: (text, truncated)
+    """
+    parts = []
+    length = 0
+    for page in pages:
+        if not page.text:
+            continue
+        parts.append(page.text + "\n")
+        length += len(parts[-1])
+        if max_chars is not None and length > max_chars:
+            return "".join(parts)[:max_chars], True
+    return "".join(parts), False
+
+
+def extract_documents(pdf_paths, max_workers: Optional[int] = None, pages_per_task: int = PAGES_PER_TASK,
+                      cache=None):
+    """
+    Extract many PDFs in parallel, yielding (pdf_path, page records) in input order.
+
+    Cached documents are yielded straight from the cache. The rest are extracted
+    in a process pool: each document starts as one task for its first
+    pages_per_task pages, and documents found to be longer are split into further
+    page-range tasks, which wait for room in the same bounded window of tasks in
+    flight. The number of tasks in flight and of documents waiting to be yielded
+    are both bounded, so memory stays flat however many files or pages are given.
+
+    Args:
+        pdf_paths (list): PDFs to read
+        max_workers (int, optional): Worker processes (defaults to the CPU count; 1 extracts inline)
+        pages_per_task (int): Pages extracted per task
+        cache (PageCache, optional): Cache to use instead of the shared one
+
+    Yields:
+        tuple: (Path, [PageRecord, ...]); the list is empty if the file could not be read
+    """
+    pdf_paths = [Path(p) for p in pdf_paths]
+    cache = cache or get_page_cache()
+    max_workers = max_workers or os.cpu_count() or 1
+
+    if max_workers == 1:
+        for pdf_path in pdf_paths:
+            yield pdf_path, load_pages(pdf_path, cache)
+        return
+
+    max_in_flight = max_workers * 2
+    documents = {}  # position -> {"path", "sha256", "ranges": {start: texts}, "page_count", "error"}
+    futures = {}  # future -> (position, start)
+    queued_ranges = deque()  # (position, start, stop) of long documents, waiting for room in the window
+    next_position = 0  # next document to schedule
+    next_yield = 0  # next document to hand back
+
+    def schedule(position, start, stop):
+        future = executor.submit(_extract_range, documents[position]["path"], start, stop, EXTRACTOR_BACKEND)
+        futures[future] = (position, start)
+
+    def is_complete(document):
+        if document["error"] is not None or document["pages"] is not None:
+            return True
+        return (document["page_count"] is not None
+                and sum(len(texts) for texts in document["ranges"].values()) >= document["page_count"])
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        while next_yield < len(pdf_paths):
+            # Remaining ranges of documents already started go first, so the head of the queue
+            # finishes (and is yielded) before more documents are admitted
+            while queued_ranges and len(futures) < max_in_flight:
+                position, start, stop = queued_ranges.popleft()
+                document = documents.get(position)
+                if document is not None and document["error"] is None:
+                    schedule(position, start, stop)
+
+            # Admit new documents while there is room in the window
+            while (next_position < len(pdf_paths) and len(futures) < max_in_flight
+                   and next_position - next_yield < max_in_flight):
+                pdf_path = pdf_paths[next_position]
+                document = {"path": pdf_path, "sha256": None, "ranges": {}, "page_count": None,
+                            "pages": None, "error": None}
+                documents[next_position] = document
+                try:
+                    if cache:
+                        document["sha256"] = cache.file_hash(pdf_path)
+                        document["pages"] = cache.get(document["sha256"])
+                except Exception as e:
+                    document["error"] = e
+                if document["pages"] is None and document["error"] is None:
+                    schedule(next_position, 0, pages_per_task)
+                next_position += 1
+
+            # Hand back every finished document at the head of the queue
+            while next_yield in documents and is_complete(documents[next_yield]):
+                document = documents.pop(next_yield)
+                pdf_path = document["path"]
+                next_yield += 1
+                if document["error"] is not None:
+                    logger.error(f"Error reading {pdf_path}: {document['error']}")
+                    yield pdf_path, []
+                    continue
+                pages = document["pages"]
+                if pages is None:
+                    pages = [text for start in sorted(document["ranges"]) for text in document["ranges"][start]]
+                    if cache:
+                        cache.put(document["sha256"], pages)
+                yield pdf_path, _page_records(pdf_path, pages)
+
+            if not futures:
+                continue
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                position, start = futures.pop(future)
+                document = documents.get(position)
+                if document is None:
+                    # Another range of this document failed and it was already yielded
+                    continue
+                try:
+                    texts, page_count = future.result()
+                except Exception as e:
+                    document["error"] = e
+                    continue
+                document["ranges"][start] = texts
+                if start == 0:
+                    document["page_count"] = page_count
+                    queued_ranges.extend((position, range_start, range_start + pages_per_task)
+                                         for range_start in range(pages_per_task, page_count, pages_per_task))
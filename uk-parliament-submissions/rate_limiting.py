@@ -0,0 +1,325 @@
+"""
+Shared per-provider rate limiting and retry scheduling for model completions.
+
+A RateLimiter tracks requests, input tokens and output tokens over a sliding
+one-minute window and only admits a request once all three budgets have room
+for it. It also caps the number of requests in flight and adapts that cap to
+observed throttling: it is halved when the provider returns a 429 and grows
+back by one slot after a run of successful calls (AIMD). 429s for requests
+sent before the last cut are part of the same burst and don't halve it again.
+
+call_with_retries / acall_with_retries wrap a single API call with the
+limiter and retry 429, 5xx and connection errors with jittered exponential
+backoff, honouring any retry-after header the provider sends.
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Per-minute quotas per provider. Set these to the organisation's actual limits
+# (or override with configure_rate_limiter) to run at the full allowed throughput.
+DEFAULT_RATE_LIMITS = {
+    "claude": {
+        "requests_per_minute": int(os.environ.get("CLAUDE_RPM", 1000)),
+        "input_tokens_per_minute": int(os.environ.get("CLAUDE_ITPM", 400_000)),
+        "output_tokens_per_minute": int(os.environ.get("CLAUDE_OTPM", 80_000)),
+        "max_concurrency": int(os.environ.get("CLAUDE_MAX_CONCURRENCY", 64)),
+    },
+    "gpt": {
+        "requests_per_minute": int(os.environ.get("GPT_RPM", 5000)),
+        "input_tokens_per_minute": int(os.environ.get("GPT_TPM", 800_000)),
+        "output_tokens_per_minute": None,
+        "max_concurrency": int(os.environ.get("GPT_MAX_CONCURRENCY", 64)),
+    },
+}
+
+MAX_RETRIES = 6
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+WINDOW_SECONDS = 60.0
+# Successful calls needed before the concurrency cap grows by one slot
+ADDITIVE_INCREASE_EVERY = 10
+
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token) used for budgeting before a call."""
+    if not text:
+        return 0
+    if not isinstance(text, str):
+        text = str(text)
+    return max(1, len(text) // 4)
+
+
+class RateLimiter:
+    """
+    Sliding-window limiter on requests, input tokens and output tokens per minute,
+    with an adaptive cap on concurrent requests.
+
+    Any limit set to None is not enforced.
+    """
+
+    def __init__(self, requests_per_minute=None, input_tokens_per_minute=None,
+                 output_tokens_per_minute=None, max_concurrency=None, name="default"):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.input_tokens_per_minute = input_tokens_per_minute
+        self.output_tokens_per_minute = output_tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = max_concurrency
+        self.in_flight = 0
+        self.throttle_events = 0
+        self._successes_since_increase = 0
+        self._last_decrease = float("-inf")
+        # [timestamp, input_tokens, output_tokens] per admitted request, plus running totals
+        self._window = deque()
+        self._input_used = 0
+        self._output_used = 0
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self._window and now - self._window[0][0] >= WINDOW_SECONDS:
+            _, input_tokens, output_tokens = self._window.popleft()
+            self._input_used -= input_tokens
+            self._output_used -= output_tokens
+
+    def _wait_time(self, now, input_tokens, output_tokens):
+        """Seconds until a request of this size fits every budget (0 if it fits now)."""
+        if self.concurrency_limit is not None and self.in_flight >= self.concurrency_limit:
+            return 0.05
+
+        waits = [0.0]
+        budgets = [
+            (self.requests_per_minute, 1, len(self._window), lambda entry: 1),
+            (self.input_tokens_per_minute, input_tokens, self._input_used, lambda entry: entry[1]),
+            (self.output_tokens_per_minute, output_tokens, self._output_used, lambda entry: entry[2]),
+        ]
+        for limit, needed, used, amount in budgets:
+            if limit is None:
+                continue
+            # A single request larger than the whole budget is admitted on an empty window
+            needed = min(needed, limit)
+            if used + needed <= limit:
+                continue
+            # Walk the window until enough usage has expired
+            for entry in self._window:
+                used -= amount(entry)
+                if used + needed <= limit:
+                    waits.append(entry[0] + WINDOW_SECONDS - now)
+                    break
+        return max(waits)
+
+    def _try_acquire(self, input_tokens, output_tokens):
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            wait = self._wait_time(now, input_tokens, output_tokens)
+            if wait > 0:
+                return None, wait
+            entry = [now, input_tokens, output_tokens]
+            self._window.append(entry)
+            self._input_used += input_tokens
+            self._output_used += output_tokens
+            self.in_flight += 1
+            return entry, 0.0
+
+    def acquire(self, input_tokens=0, output_tokens=0):
+        """Block until the request fits the budgets; returns a reservation for release()."""
+        while True:
+            reservation, wait = self._try_acquire(input_tokens, output_tokens)
+            if reservation is not None:
+                return reservation
+            time.sleep(min(wait, 1.0))
+
+    async def acquire_async(self, input_tokens=0, output_tokens=0):
+        """Async version of acquire() that yields to the event loop while waiting."""
+        while True:
+            reservation, wait = self._try_acquire(input_tokens, output_tokens)
+            if reservation is not None:
+                return reservation
+            await asyncio.sleep(min(wait, 1.0))
+
+    def release(self, reservation, input_tokens=None, output_tokens=None, throttled=False):
+        """
+        Finish a request: reconcile the reserved token counts with the actual usage
+        and adapt the concurrency cap.
+        """
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            # Entries that already left the window no longer count towards the totals
+            in_window = bool(self._window) and reservation[0] >= self._window[0][0]
+            if input_tokens is not None:
+                if in_window:
+                    self._input_used += input_tokens - reservation[1]
+                reservation[1] = input_tokens
+            if output_tokens is not None:
+                if in_window:
+                    self._output_used += output_tokens - reservation[2]
+                reservation[2] = output_tokens
+
+            if self.max_concurrency is None:
+                return
+            if throttled:
+                self.throttle_events += 1
+                self._successes_since_increase = 0
+                if reservation[0] <= self._last_decrease:
+                    # Sent before the cap was last cut; that cut already answered this burst
+                    return
+                self._last_decrease = time.monotonic()
+                new_limit = max(1, self.concurrency_limit // 2)
+                if new_limit != self.concurrency_limit:
+                    logger.warning(f"{self.name}: throttled, reducing concurrency to {new_limit}")
+                self.concurrency_limit = new_limit
+            else:
+                self._successes_since_increase += 1
+                if (self._successes_since_increase >= ADDITIVE_INCREASE_EVERY
+                        and self.concurrency_limit < self.max_concurrency):
+                    self.concurrency_limit += 1
+                    self._successes_since_increase = 0
+
+    def stats(self):
+        with self._lock:
+            self._prune(time.monotonic())
+            return {
+                "in_flight": self.in_flight,
+                "concurrency_limit": self.concurrency_limit,
+                "requests_last_minute": len(self._window),
+                "input_tokens_last_minute": self._input_used,
+                "output_tokens_last_minute": self._output_used,
+                "throttle_events": self.throttle_events,
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider):
+    """Return the process-wide limiter for a provider, creating it from DEFAULT_RATE_LIMITS."""
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = RateLimiter(name=provider, **DEFAULT_RATE_LIMITS.get(provider, {}))
+        return _limiters[provider]
+
+
+def configure_rate_limiter(provider, **limits):
+    """Replace the shared limiter for a provider, e.g. configure_rate_limiter("claude", requests_per_minute=4000)."""
+    settings = dict(DEFAULT_RATE_LIMITS.get(provider, {}))
+    settings.update(limits)
+    with _limiters_lock:
+        _limiters[provider] = RateLimiter(name=provider, **settings)
+        return _limiters[provider]
+
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_throttle_error(error):
+    return _status_code(error) == 429
+
+
+def is_retryable_error(error):
+    """429s, 5xx (including Anthropic's 529 overloaded) and connection/timeouts are retried."""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "ConnectionError", "TimeoutError")
+
+
+def backoff_delay(attempt, error=None):
+    """Full-jitter exponential backoff, or the provider's retry-after header when given."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers:
+        retry_after = headers.get("retry-after")
+        try:
+            if retry_after is not None:
+                return min(MAX_BACKOFF_SECONDS, float(retry_after)) + random.uniform(0, 0.5)
+        except ValueError:
+            pass
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt))
+
+
+def call_with_retries(call, limiter, input_tokens=0, output_tokens=0, usage_of=None, max_retries=MAX_RETRIES,
+                      on_retry=None):
+    """
+    Run call() under the limiter, retrying retryable errors with backoff.
+
+    Args:
+        call (callable): Performs the API request and returns the response
+        limiter (RateLimiter): Limiter to acquire/release around each attempt
+        input_tokens (int): Estimated input tokens to reserve
+        output_tokens (int): Estimated output tokens to reserve (usually max_tokens)
+        usage_of (callable, optional): Maps a response to (input_tokens, output_tokens) actually used
+        max_retries (int): Retries after the first attempt
+        on_retry (callable, optional): Called as on_retry(attempt, error) before each retry
+
+    Raises:
+        The last error once retries are exhausted, or any non-retryable error immediately.
+    """
+    attempt = 0
+    while True:
+        reservation = limiter.acquire(input_tokens, output_tokens)
+        try:
+            response = call()
+            used = usage_of(response) if usage_of else (None, None)
+        except Exception as e:
+            # A failed attempt produced no output; keep only its request in the window so
+            # retries are not starved by token budget that was never used
+            limiter.release(reservation, input_tokens=0, output_tokens=0, throttled=is_throttle_error(e))
+            if not is_retryable_error(e) or attempt >= max_retries:
+                raise
+            delay = backoff_delay(attempt, e)
+            logger.warning(f"{limiter.name}: attempt {attempt + 1} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            if on_retry is not None:
+                on_retry(attempt, e)
+            time.sleep(delay)
+            attempt += 1
+            continue
+        except BaseException:
+            # Cancelled or interrupted mid-request: free the slot (the request may still be
+            # billed, so its estimated tokens stay reserved) or the limiter would block forever
+            limiter.release(reservation)
+            raise
+        limiter.release(reservation, *used)
+        return response
+
+
+async def acall_with_retries(call, limiter, input_tokens=0, output_tokens=0, usage_of=None, max_retries=MAX_RETRIES,
+                             on_retry=None):
+    """Async version of call_with_retries; call() must return an awaitable."""
+    attempt = 0
+    while True:
+        reservation = await limiter.acquire_async(input_tokens, output_tokens)
+        try:
+            response = await call()
+            used = usage_of(response) if usage_of else (None, None)
+        except Exception as e:
+            # A failed attempt produced no output; keep only its request in the window so
+            # retries are not starved by token budget that was never used
+            limiter.release(reservation, input_tokens=0, output_tokens=0, throttled=is_throttle_error(e))
+            if not is_retryable_error(e) or attempt >= max_retries:
+                raise
+            delay = backoff_delay(attempt, e)
+            logger.warning(f"{limiter.name}: attempt {attempt + 1} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            if on_retry is not None:
+                on_retry(attempt, e)
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        except BaseException:
+            # Cancelled or interrupted mid-request: free the slot (the request may still be
+            # billed, so its estimated tokens stay reserved) or the limiter would block forever
+            limiter.release(reservation)
+            raise
+        limiter.release(reservation, *used)
+        return response
@@ -3,6 +3,7 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import re # For parsing
+from agent_use_keywords import DESCRIPTION_KEYWORDS, GOVERNMENT_ORGS # Shared classification keywords
 
 # %% Main Functions (Data Loading and Processing)
 
@@ -33,27 +34,28 @@ def parse_and_classify_entry(org_name_line, description_text, current_sector, cu
 
     # Keywords for Kind_of_Agent
     desc_lower = full_description.lower()
+    desc_labels = DESCRIPTION_KEYWORDS.matched_labels(desc_lower)
     # Prioritize Robotics and Chatbot/LLM as they are often more distinct
-    if any(k in desc_lower for k in ["robot", "autonomous vehicle", "autonomous driving", "digital twin ", "physical store", "factory worker", "3d models", "3d model", "vehicle", "trucks", "hardware", "sensor", "geospatial ai workloads", "expedition vehicles", "smart cockpit", "in-vehicle", "on the road", "fulfillment solutions", "smartest billboard", "digital twin of its entire distribution network"]):
+    if "robotics_agent" in desc_labels:
         kind_of_agent = "Robotics agent (real-world)"
-    elif any(k in desc_lower for k in ["conversational ai", "virtual assistant", "chatbot", "natural language", "summaries", "text generation", "translation", "gemini for google workspace", "gemini in gmail", "gemini in docs", "dialogflow", "speech-command", "voice", "chat features", "language model", "llm", "generative ai-powered virtual assistant"]):
+    elif "chatbot_agent" in desc_labels:
         kind_of_agent = "Chatbot / LLM"
-    elif any(k in desc_lower for k in ["code assist", "software development", "developer productivity", "coding", "debug", "deploy code", "software engineering", "ticket-to-code", "codebase", "code generation", "gemini code assist"]):
+    elif "code_agent" in desc_labels:
         kind_of_agent = "Execution agent (computer)" # Often code related, but can be broader
-    elif any(k in desc_lower for k in ["automate", "streamline process", "deploy model", "workflow automation", "order management", "risk score", "claims processing", "gen ai framework", "api", "sdk", "platform for building", "automating tasks", "engine", "automating the generation", "automates", "operational impact", "process documents", "make decisions", "system", "platform", "tool", "solution", "ai models to streamline", "ai agent that helps", "ai-powered solutions", "intelligent search", "prediction", "predictive ai tools", "machine learning models", "ai platform"]):
+    elif "execution_agent" in desc_labels:
         kind_of_agent = "Execution agent (computer)"
-    elif any(k in desc_lower for k in ["search", "find information", "knowledge center", "data analysis", "document processing", "insights", "analytics", "vertex ai search", "bigquery", "looker", "reporting", "monitoring", "classif", "analyze data", "data points", "information retrieval", "data-driven", "research tool", "data insights", "data foundation", "data management", "data governance"]): # "classif" for classify
+    elif "retrieval_agent" in desc_labels:
         kind_of_agent = "Info-retrieval agent (computer)"
 
 
     # Heuristics for Economic Value
-    if any(k in desc_lower for k in ["revolutioniz", "transforming industry", "next-generation platform", "first-of-its-kind", "50% total-cost-of-ownership savings", "market leader", "$1.9 million roi", "doubling underwriter productivity", "brl 1.5 million since adoption", "global leader", "significant roi", "substantial market impact", "game-changing", "breakthrough", "pioneering", "10x faster", "90% reduction in costs", "brl 15 million in tax overcharges", "profit of $22.3 million", "200% growth", "100,000 transactions per second"]):
+    if "value_5" in desc_labels:
         economic_value = 5
-    elif any(k in desc_lower for k in ["major operational transformation", "significant reduction", "significant improvements", "significant improvement", "10,000 man-hours per year", "400% performance", "90% faster", "80% reduction in errors", "$20 million in savings", "20% price and performance improvement", "accelerate", "optimize", "enhance efficiency", "streamline", "boost productivity", "increase revenue", "large scale", "billions of data points", "millions of users", "thousands of simulations", "75% in the time taken", "99% reduction in audit costs", "10-20% in accuracy", "95% reduction in time", "30% to 40% efficiency", "5x faster", "double-digit reduction", "workload gains", "transform massive volumes", "speeding up campaign creations from eight weeks to eight hours"]):
+    elif "value_4" in desc_labels:
         economic_value = 4
-    elif any(k in desc_lower for k in ["cost savings", "customer impact", "new product feature", "improved", "faster", "more efficient", "better", "20% faster", "15% increase", "operational cost savings", "increased efficiency", "time savings", "enhanced communication", "higher quality work", "reduced time", "reduction in technical debt", "improved click-through rate", "increased conversion rates", "boost accuracy", "unlock unique insights", "save time", "increase productivity", "streamlining workflows", "more culturally diverse and inclusive workplace", "reduces the time", "speeds inventory tracking", "automating insights", "13% increase in productivity", "average five hours per week", "20% faster", "30-35% reduction in time", "40% improvement in forecasting accuracy", "reduce food waste", "75% reduction in calls abandoned", "30% decrease in case handling times", "50% faster investigations"]):
+    elif "value_3" in desc_labels:
         economic_value = 3
-    elif any(k in desc_lower for k in ["departmental improvement", "some enhancement", "more effective", "easier", "helpful", "better able to recognize", "more responsive features", "simplify", "user-focused", "make marketing processes more efficient", "keeping customers secure", "convenient self-service", "easier to find", "more agile, intuitive, and fluid", "valuable productivity and collaboration tool", "enhance the workplace experience", "personalized guidance", "smoother stays", "better and more cost-effective services", "more time to focus", "winning back time", "more time and flexibility", "improve the quality of work", "better work and customer experiences", "getting things done faster", "greater productivity", "better security monitoring", "making it easier", "more accessible", "more personalized", "better tailored recommendations"]):
+    elif "value_2" in desc_labels:
         economic_value = 2
     else: # Basic utility, not enough info, or very niche
         economic_value = 1 
@@ -70,43 +72,43 @@ def parse_and_classify_entry(org_name_line, description_text, current_sector, cu
             proximity_ncf = 4
         else:
             proximity_ncf = 3
-    elif any(k in org_name_lower for k in ["u.s. air force", "u.s. dept. of veterans affairs", "national institutes of health", "government of singapore", "qatari ministry of labour", "state of nevada", "new york state department of motor vehicles", "air force research laboratory", "colombia’s ministry of information", "brazil’s ministry of education", "noaa", "usaid", "world bank", "serpro", "prodam", "minas gerais state government", "israel antiquities authority", "belo horizonte municipal finance office"]):
+    elif GOVERNMENT_ORGS.contains_any(org_name_lower):
         proximity_ncf = 5 # Government and critical public services
     elif "public sector" in sector_lower:
         proximity_ncf = 4 # General public sector, can be 5 if description implies critical function
-        if any(k in desc_lower for k in ["national security", "emergency management", "critical infrastructure", "public safety", "essential services"]):
+        if "public_sector_critical" in desc_labels:
             proximity_ncf = 5
     elif any(s in sector_lower for s in ["healthcare & life sciences", "financial services", "telecommunications"]):
         proximity_ncf = 4 # These sectors often have high NCF impact
-        if any(k in desc_lower for k in ["cancer detection", "drug discovery", "diagnostics", "patient care", "life-threatening diseases", "critical patient insights", "financial markets", "banking", "insurance", "payment systems", "anti money laundering", "network operations", "critical communications", "emergency services", "national critical functions", "supply chain resilience", "energy grid", "power generation", "water management"]):
+        if "critical_sector_function" in desc_labels:
             proximity_ncf = 5
     elif any(s in sector_lower for s in ["automotive & logistics", "manufacturing, industrial & electronics"]):
         proximity_ncf = 3 # Important for economy and infrastructure
-        if any(k in desc_lower for k in ["supply chain", "transportation network", "autonomous driving safety", "critical manufacturing", "energy infrastructure", "defense contracting"]):
+        if "critical_supply_chain" in desc_labels:
             proximity_ncf = 4
-            if "defense" in desc_lower or "military" in desc_lower:
+            if "defense" in desc_labels:
                  proximity_ncf = 5
     elif "technology" in sector_lower:
         proximity_ncf = 2 # Can vary wildly, default to lower unless specified
-        if any(k in desc_lower for k in ["cybersecurity", "critical infrastructure support", "cloud infrastructure for government/healthcare", "data privacy for sensitive sectors"]):
+        if "technology_critical" in desc_labels:
             proximity_ncf = 4
-        if "ai risk management" in desc_lower or "safe superintelligence" in desc_lower:
+        if "ai_safety" in desc_labels:
             proximity_ncf = 5
     elif any(s in sector_lower for s in ["business & professional services", "retail"]):
         proximity_ncf = 2 # Generally lower NCF unless supporting critical functions
-        if "supply chain risk" in desc_lower or "financial compliance" in desc_lower:
+        if "business_critical" in desc_labels:
             proximity_ncf = 3
     else: # Media, Hospitality, some general creative/entertainment
         proximity_ncf = 1
         
     # Override for Robotics if not already set and description implies it, can sometimes increase NCF
-    if kind_of_agent != "Robotics agent (real-world)" and any(k in desc_lower for k in ["autonomous vehicle", "robotics", "autonomous driving company", "physical world", "in-home robot", "drones"]):
+    if kind_of_agent != "Robotics agent (real-world)" and "robotics_override" in desc_labels:
         kind_of_agent = "Robotics agent (real-world)"
-        if proximity_ncf < 3 and any(k in desc_lower for k in ["logistics", "delivery", "inspection of infrastructure", "security robot"]):
+        if proximity_ncf < 3 and "robotics_critical_use" in desc_labels:
             proximity_ncf = 3 # Robotics in these areas have higher NCF
 
     # Final check: if description mentions "national critical functions" or similar, elevate NCF
-    if "national critical functions" in desc_lower or "critical national infrastructure" in desc_lower:
+    if "national_critical_functions" in desc_labels:
         proximity_ncf = 5
 
     return {
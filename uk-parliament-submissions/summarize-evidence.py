@@ -1,16 +1,17 @@
 # %% Imports and Setup
 import os
 import glob
+from itertools import chain
 import pandas as pd
-from PyPDF2 import PdfReader
 import logging # For consistency with model_completions.py logging
 
 # Assuming model_completions.py is in the same directory
 try:
-    from model_completions import process_df_prompts # Key function to use
+    from model_completions import process_df_prompts, aprocess_df_prompts, run_async # Key functions to use
 except ImportError:
     print("ERROR: model_completions.py not found. Make sure it's in the same directory or accessible in PYTHONPATH.")
     exit()
+from pdf_extraction import iter_pages, join_pages, extract_documents # Cached, parallel PDF text extraction
 
 # Configure basic logging for this script if desired, or rely on model_completions logging
 logger = logging.getLogger(__name__)
@@ -22,37 +23,40 @@ logging.basicConfig(
 # --- Configuration ---
 PDF_DOWNLOAD_DIR = "parliament_ai_evidence_pdfs_api" # From previous script
 SUMMARIES_OUTPUT_CSV = "parliament_ai_evidence_summaries.csv"
+SUMMARIES_CHECKPOINT = "parliament_ai_evidence_summaries.checkpoint.jsonl" # Completed summaries; rerun to resume
 CLAUDE_MAX_TOKENS_SUMMARY = 700 # Max tokens for the summary from Claude. Adjust as needed.
                                 # The default in process_df_prompts is 100, which is too low for summaries.
+MAX_CONCURRENT_REQUESTS = 4 # Summaries in flight at once. Keep low to avoid API rate limits.
+USE_BATCH_API = False # Submit all summaries as one Message Batch: cheaper, but results can take hours
+# Heuristic limit on characters sent per document. Claude Sonnet's context is 200K tokens (~800K chars
+# at ~4 chars/token); pages beyond the limit are not read.
+MAX_INPUT_CHARS = 750000
+EXTRACTION_WORKERS = None # Processes for PDF text extraction (None = one per CPU core)
 
 # %% Helper Function - PDF Text Extraction (adapted from previous script)
 
-def extract_text_from_pdf(pdf_path):
+def extract_text_from_pdf(pdf_path, pages=None, max_chars=None):
     """
     Extracts text from a PDF file path.
+    `pages` takes page records already produced by extract_documents; otherwise pages are
+    read lazily (or fetched from the page cache) and reading stops once max_chars is reached.
     Returns the extracted text as a string or None if extraction fails.
     """
     if not pdf_path or not os.path.exists(pdf_path):
         logger.warning(f"PDF path invalid or file does not exist: {pdf_path}")
         return None
-    try:
-        with open(pdf_path, 'rb') as f:
-            reader = PdfReader(f)
-            text = ""
-            if len(reader.pages) == 0:
-                logger.warning(f"No pages found in PDF: {pdf_path}")
-                return None
-            for page_num, page in enumerate(reader.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-        if not text.strip():
-            logger.warning(f"No text extracted from {pdf_path}. The PDF might be image-based or scanned.")
-            return None
-        return text
-    except Exception as e:
-        logger.error(f"Error extracting text from {pdf_path}: {e}")
-    return None
+    records = iter(pages if pages is not None else iter_pages(pdf_path))
+    first_page = next(records, None)
+    if first_page is None:
+        logger.warning(f"No pages found in PDF: {pdf_path}")
+        return None
+    text, truncated = join_pages(chain([first_page], records), max_chars)
+    if truncated:
+        logger.warning(f"Text from {pdf_path} is very long, truncated to {max_chars} chars for summarization.")
+    if not text.strip():
+        logger.warning(f"No text extracted from {pdf_path}. The PDF might be image-based or scanned.")
+        return None
+    return text
 
 # %% --- Main Execution ---
 
@@ -81,26 +85,19 @@ if api_key_set:
         logger.info(f"Found {len(pdf_files)} PDF files to process.")
         
         documents_data = []
-        for pdf_path in pdf_files:
+        logger.info(f"Extracting text from {len(pdf_files)} PDFs...")
+        # PDFs are parsed in parallel worker processes and come back in file order
+        for pdf_path, pages in extract_documents(pdf_files, max_workers=EXTRACTION_WORKERS):
+            pdf_path = str(pdf_path)
             filename = os.path.basename(pdf_path)
             # Attempt to get a cleaner title (remove .pdf and potentially sanitize_filename remnants)
             title = filename.replace(".pdf", "").replace("_", " ").strip() # Basic cleaning
             
-            logger.info(f"Extracting text from: {filename}")
-            extracted_text = extract_text_from_pdf(pdf_path)
+            logger.info(f"Extracted text from: {filename}")
+            # Very long texts are truncated to MAX_INPUT_CHARS without building the full string
+            extracted_text = extract_text_from_pdf(pdf_path, pages, max_chars=MAX_INPUT_CHARS)
             
             if extracted_text:
-                # Truncate very long texts if necessary, though Claude Sonnet handles large contexts
-                # Max context for Sonnet 3.5 is 200K tokens. Let's be generous but mindful.
-                # Average token is ~4 chars. 200K tokens ~ 800K chars.
-                # The model used in model_completions.py is "claude-3-7-sonnet-20250219"
-                # which may have different limits.
-                # For now, we pass the full text. Claude API will truncate if needed or error.
-                max_input_chars = 750000 # Heuristic limit, adjust if needed
-                if len(extracted_text) > max_input_chars:
-                    logger.warning(f"Text from {filename} is very long ({len(extracted_text)} chars), truncating to {max_input_chars} for summarization.")
-                    extracted_text = extracted_text[:max_input_chars]
-
                 documents_data.append({
                     'pdf_filename': filename,
                     'pdf_title': title,
@@ -137,13 +134,11 @@ if not df_for_summaries.empty and api_key_set:
         "The summary should be well-structured and easy to read."
     )
 
-    logger.info("Starting summarization process using Claude via process_df_prompts...")
+    logger.info("Starting summarization process using Claude via aprocess_df_prompts...")
     # Ensure the 'user_prompt_col' matches the column name in df_for_summaries
     # Ensure the 'result_col' is what you want the summary column to be named
     
-    # Note: model_completions.py uses max_workers=1 by default, so it will be sequential.
-    # This is good for avoiding API rate limits initially.
-    summarized_df = process_df_prompts(
+    summarize_kwargs = dict(
         df=df_for_summaries,
         model_type="claude", # As requested
         system_prompt=system_prompt_summarize,
@@ -151,8 +146,14 @@ if not df_for_summaries.empty and api_key_set:
         result_col='claude_summary', # New column for the generated summary
         max_tokens=CLAUDE_MAX_TOKENS_SUMMARY, # Max tokens for the summary itself
         temperature=0.5, # Lower temperature for more factual summaries
+        checkpoint_path=SUMMARIES_CHECKPOINT, # Already summarised documents are skipped on rerun
         show_progress=True
     )
+    if USE_BATCH_API:
+        summarized_df = process_df_prompts(mode="batch", **summarize_kwargs)
+    else:
+        # run_async works both from a plain script and from an interactive session with a running event loop.
+        summarized_df = run_async(aprocess_df_prompts(max_concurrency=MAX_CONCURRENT_REQUESTS, **summarize_kwargs))
 
     logger.info("Summarization process completed.")
 
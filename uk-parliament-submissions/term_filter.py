@@ -0,0 +1,204 @@
+"""
+Early-exit document pre-filter on AND/OR/NOT term expressions.
+
+A TermFilter is built once from an expression such as
+
+    agent AND stability
+    (agent OR "tool use") AND NOT cryptocurrency
+
+and matched against a document's pages as they are extracted. Terms are
+case-insensitive substrings; quote multi-word phrases. Every term starts out
+unknown and becomes true on the first page it appears on, so the expression
+is evaluated with three-valued logic after each page and reading stops as
+soon as the outcome can no longer change. Terms not seen by the end of the
+document are false.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+_TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|([^\s()"]+))')
+OPERATORS = ("AND", "OR", "NOT")
+
+
+def term(text):
+    return ("term", text.lower())
+
+
+def all_of(terms):
+    """Expression node true when every term appears."""
+    return ("and", [term(t) for t in terms])
+
+
+def any_of(terms):
+    """Expression node true when at least one term appears."""
+    return ("or", [term(t) for t in terms])
+
+
+def parse_expression(expression: str):
+    """
+    Parse an expression string into nested ("and"|"or", [nodes]), ("not", node)
+    and ("term", text) tuples. NOT binds tighter than AND, which binds tighter than OR.
+
+    Raises:
+        ValueError: If the expression is malformed
+    """
+    tokens = []
+    position = 0
+    while position < len(expression):
+        match = _TOKEN_RE.match(expression, position)
+        if match is None or match.end() == position:
+            if expression[position:].strip():
+                raise ValueError(f"Unexpected character in term expression at {position}: {expression!r}")
+            break
+        position = match.end()
+        open_paren, close_paren, quoted, word = match.groups()
+        if open_paren or close_paren:
+            tokens.append(open_paren or close_paren)
+        elif quoted is not None:
+            tokens.append(("term", quoted))
+        elif word in OPERATORS:
+            tokens.append(word)
+        else:
+            tokens.append(("term", word))
+
+    def parse_or(i):
+        node, i = parse_and(i)
+        children = [node]
+        while i < len(tokens) and tokens[i] == "OR":
+            node, i = parse_and(i + 1)
+            children.append(node)
+        return (children[0] if len(children) == 1 else ("or", children)), i
+
+    def parse_and(i):
+        node, i = parse_not(i)
+        children = [node]
+        while i < len(tokens) and tokens[i] == "AND":
+            node, i = parse_not(i + 1)
+            children.append(node)
+        return (children[0] if len(children) == 1 else ("and", children)), i
+
+    def parse_not(i):
+        if i < len(tokens) and tokens[i] == "NOT":
+            node, i = parse_not(i + 1)
+            return ("not", node), i
+        return parse_atom(i)
+
+    def parse_atom(i):
+        if i >= len(tokens):
+            raise ValueError(f"Unexpected end of term expression: {expression!r}")
+        token = tokens[i]
+        if token == "(":
+            node, i = parse_or(i + 1)
+            if i >= len(tokens) or tokens[i] != ")":
+                raise ValueError(f"Missing ')' in term expression: {expression!r}")
+            return node, i + 1
+        if isinstance(token, tuple) and token[1].strip():
+            return term(token[1]), i + 1
+        raise ValueError(f"Unexpected {token!r} in term expression: {expression!r}")
+
+    node, i = parse_or(0)
+    if i != len(tokens):
+        raise ValueError(f"Unexpected {tokens[i]!r} in term expression: {expression!r}")
+    return node
+
+
+def _terms(node, found=None):
+    found = [] if found is None else found
+    if node[0] == "term":
+        if node[1] not in found:
+            found.append(node[1])
+    elif node[0] == "not":
+        _terms(node[1], found)
+    else:
+        for child in node[1]:
+            _terms(child, found)
+    return found
+
+
+def evaluate(node, term_pages: Dict[str, Optional[int]], final: bool = False) -> Optional[bool]:
+    """
+    Evaluate an expression given the terms seen so far.
+
+    Returns True/False once the outcome is decided, or None while it still depends on
+    terms that have not been seen yet (never None when final=True).
+    """
+    kind = node[0]
+    if kind == "term":
+        if term_pages.get(node[1]) is not None:
+            return True
+        return False if final else None
+    if kind == "not":
+        value = evaluate(node[1], term_pages, final)
+        return None if value is None else not value
+    values = [evaluate(child, term_pages, final) for child in node[1]]
+    if kind == "and":
+        if False in values:
+            return False
+        return True if all(v is True for v in values) else None
+    if True in values:
+        return True
+    return False if all(v is False for v in values) else None
+
+
+@dataclass
+class FilterResult:
+    """Outcome of matching a TermFilter against one document; truthy when it matched."""
+    matched: bool
+    term_pages: Dict[str, Optional[int]] = field(default_factory=dict)  # term -> first page it was seen on
+    pages_read: int = 0
+
+    def __bool__(self):
+        return self.matched
+
+
+class TermFilter:
+    """
+    Compiled term expression for early-exit document filtering.
+
+    Args:
+        expression (str or tuple): Expression string (see parse_expression) or node built with
+                                   all_of / any_of / parse_expression
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.root = parse_expression(expression) if isinstance(expression, str) else expression
+        self.terms: List[str] = _terms(self.root)
+
+    def match(self, pages: Iterable) -> FilterResult:
+        """
+        Read pages until the expression is decided.
+
+        Args:
+            pages (iterable): PageRecords (anything with .page and .text) or plain page strings
+
+        Returns:
+            FilterResult: whether the document matched, the page each term was first seen on
+                          (None if not seen before reading stopped) and how many pages were read
+        """
+        term_pages = {t: None for t in self.terms}
+        pages_read = 0
+        for page in pages:
+            pages_read += 1
+            if isinstance(page, str):
+                page_num, text = pages_read, page
+            else:
+                page_num, text = page.page, page.text
+            text = text.lower()
+            for t in self.terms:
+                if term_pages[t] is None and t in text:
+                    term_pages[t] = page_num
+            decided = evaluate(self.root, term_pages)
+            if decided is not None:
+                break
+        else:
+            decided = evaluate(self.root, term_pages, final=True)
+        if hasattr(pages, "close"):
+            # Stop a page generator (and its PDF parsing) as soon as the result is known
+            pages.close()
+        return FilterResult(decided, term_pages, pages_read)
+
+    def __repr__(self):
+        return f"TermFilter({self.expression!r})"
@@ -0,0 +1,35 @@
+import pytest
+
+import agent_use_keywords
+from agent_use_keywords import DESCRIPTION_GROUPS, GOVERNMENT_ORGS, SubstringKeywords, keyword_groups
+from keyword_matcher import KeywordMatcher
+
+DESCRIPTIONS = [
+    "Uses a Generative AI-powered virtual assistant to automate claims processing, 20% faster.",
+    "An autonomous vehicle fleet for logistics and delivery.",
+    "Gemini Code Assist boosts developer productivity for the Defense contracting supply chain.",
+    "Nothing to see here.",
+]
+
+
+@pytest.mark.parametrize("text", DESCRIPTIONS)
+def test_compiled_and_substring_groups_agree(text):
+    substring = SubstringKeywords(DESCRIPTION_GROUPS)
+    compiled = KeywordMatcher(DESCRIPTION_GROUPS)
+    assert substring.matched_labels(text.lower()) == compiled.matched_labels(text.lower())
+    expected = {label for label, keywords in DESCRIPTION_GROUPS.items()
+                if any(k in text.lower() for k in keywords)}
+    assert substring.matched_labels(text.lower()) == expected
+
+
+def test_substring_checks_without_pyahocorasick(monkeypatch):
+    monkeypatch.setattr(agent_use_keywords, "ahocorasick", None)
+    matcher = keyword_groups({"gov": ["World Bank", "noaa"]})
+    assert isinstance(matcher, SubstringKeywords)
+    assert matcher.contains_any("the world bank group")
+    assert not matcher.contains_any("a bank")
+
+
+def test_government_orgs():
+    assert GOVERNMENT_ORGS.contains_any("u.s. air force research")
+    assert not GOVERNMENT_ORGS.contains_any("acme corp")
@@ -0,0 +1,57 @@
+import json
+
+from analysis_manifest import MANIFEST_FORMAT_VERSION, AnalysisManifest
+
+FINDINGS = [{"question_num": 1, "quote": "q", "source": "a.pdf", "page": 1}]
+
+
+def test_findings_are_reused_by_paragraph_key(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = AnalysisManifest(path)
+    manifest.set_findings("key-a", FINDINGS)
+    manifest.set_findings("key-b", [])
+    manifest.save()
+
+    reloaded = AnalysisManifest(path)
+    assert reloaded.findings("key-a") == FINDINGS
+    # A paragraph analysed without findings is not the same as one never analysed
+    assert reloaded.findings("key-b") == []
+    assert reloaded.findings("key-c") is None
+
+
+def test_retain_drops_paragraphs_no_longer_analysed(tmp_path):
+    manifest = AnalysisManifest(str(tmp_path / "manifest.json"))
+    for key in ("a", "b"):
+        manifest.set_findings(key, [])
+    assert manifest.retain(["b", "c"]) == ["a"]
+    assert list(manifest.paragraphs) == ["b"]
+
+
+def test_clusters_are_keyed_by_question_and_fingerprint(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = AnalysisManifest(path)
+    manifest.set_clusters(2, "findings-1", {"clusters": []})
+    manifest.save()
+    reloaded = AnalysisManifest(path)
+    assert reloaded.cached_clusters(2, "findings-1") == {"clusters": []}
+    assert reloaded.cached_clusters(2, "findings-2") is None
+    assert reloaded.cached_clusters(3, "findings-1") is None
+
+
+def test_unreadable_or_old_manifests_start_empty(tmp_path):
+    broken = tmp_path / "broken.json"
+    broken.write_text("{not json")
+    assert AnalysisManifest(str(broken)).paragraphs == {}
+
+    old = tmp_path / "old.json"
+    old.write_text(json.dumps({"format": MANIFEST_FORMAT_VERSION - 1, "paragraphs": {"k": FINDINGS},
+                               "clusters": {"1": {"fingerprint": "f", "clusters": {}}}}))
+    assert AnalysisManifest(str(old)).findings("k") is None
+    assert AnalysisManifest(str(old)).cached_clusters(1, "f") is None
+
+
+def test_save_creates_the_directory_and_leaves_no_temporary_file(tmp_path):
+    path = tmp_path / "runs" / "manifest.json"
+    AnalysisManifest(str(path)).save()
+    assert json.loads(path.read_text())["format"] == MANIFEST_FORMAT_VERSION
+    assert [p.name for p in path.parent.iterdir()] == ["manifest.json"]
@@ -0,0 +1,260 @@
+import json
+import uuid
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from batch_completions import chunk_requests, run_batch
+
+
+def echo(params):
+    return f"Echo: {params['messages'][-1]['content']}"
+
+
+def fake_usage(params, text):
+    prompt_chars = sum(len(str(message["content"])) for message in params["messages"])
+    return max(1, prompt_chars // 4), max(1, len(text) // 4)
+
+
+class FakeAnthropicBatches:
+    """In-process stand-in for Anthropic().messages.batches."""
+
+    def __init__(self, responder, polls_until_done, events):
+        self._responder = responder
+        self._polls_until_done = polls_until_done
+        self._events = events
+        self._batches = {}
+        self.interrupt_polls = 0
+
+    def create(self, requests):
+        batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+        self._batches[batch_id] = {"requests": list(requests), "polls": 0}
+        self._events.append(("create", batch_id))
+        return SimpleNamespace(id=batch_id, processing_status="in_progress")
+
+    def retrieve(self, batch_id):
+        self._events.append(("retrieve", batch_id))
+        if self.interrupt_polls:
+            self.interrupt_polls -= 1
+            raise KeyboardInterrupt
+        state = self._batches[batch_id]
+        state["polls"] += 1
+        status = "ended" if state["polls"] >= self._polls_until_done else "in_progress"
+        return SimpleNamespace(id=batch_id, processing_status=status)
+
+    def cancel(self, batch_id):
+        self._batches[batch_id]["cancelled"] = True
+        return SimpleNamespace(id=batch_id, processing_status="canceling")
+
+    def results(self, batch_id):
+        for request in self._batches[batch_id]["requests"]:
+            params = request["params"]
+            try:
+                text = self._responder(params)
+            except Exception as e:
+                yield SimpleNamespace(custom_id=request["custom_id"],
+                                      result=SimpleNamespace(type="errored", error=str(e)))
+                continue
+            input_tokens, output_tokens = fake_usage(params, text)
+            message = SimpleNamespace(
+                content=[SimpleNamespace(type="text", text=text)],
+                usage=SimpleNamespace(input_tokens=input_tokens, output_tokens=output_tokens)
+            )
+            yield SimpleNamespace(custom_id=request["custom_id"],
+                                  result=SimpleNamespace(type="succeeded", message=message))
+
+
+class FakeAnthropicBatchClient:
+    """responder(params) -> text (raising marks the request errored); batches end after polls_until_done polls."""
+
+    def __init__(self, responder=echo, polls_until_done=2):
+        self.events = []
+        self.batches = FakeAnthropicBatches(responder, polls_until_done, self.events)
+        self.messages = SimpleNamespace(batches=self.batches)
+
+
+class FakeOpenAIFiles:
+    def __init__(self):
+        self._files = {}
+
+    def create(self, file, purpose):
+        _, handle = file
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        self._files[file_id] = handle.read().decode("utf-8")
+        return SimpleNamespace(id=file_id, purpose=purpose)
+
+    def content(self, file_id):
+        return SimpleNamespace(text=self._files[file_id])
+
+
+class FakeOpenAIBatches:
+    """In-process stand-in for OpenAI().batches; runs the uploaded requests when the batch completes."""
+
+    def __init__(self, files, responder, polls_until_done, events):
+        self._files = files
+        self._responder = responder
+        self._polls_until_done = polls_until_done
+        self._events = events
+        self._batches = {}
+
+    def create(self, input_file_id, endpoint, completion_window):
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        self._batches[batch_id] = {"input_file_id": input_file_id, "polls": 0, "output_file_id": None}
+        self._events.append(("create", batch_id))
+        return SimpleNamespace(id=batch_id, status="validating", output_file_id=None)
+
+    def retrieve(self, batch_id):
+        self._events.append(("retrieve", batch_id))
+        state = self._batches[batch_id]
+        state["polls"] += 1
+        if state["polls"] < self._polls_until_done:
+            return SimpleNamespace(id=batch_id, status="in_progress", output_file_id=None)
+        if state["output_file_id"] is None:
+            output_file_id = f"file-{uuid.uuid4().hex[:24]}"
+            self._files._files[output_file_id] = self._run(state["input_file_id"])
+            state["output_file_id"] = output_file_id
+        return SimpleNamespace(id=batch_id, status="completed", output_file_id=state["output_file_id"])
+
+    def cancel(self, batch_id):
+        self._batches[batch_id]["cancelled"] = True
+        return SimpleNamespace(id=batch_id, status="cancelling", output_file_id=None)
+
+    def _run(self, input_file_id):
+        output = []
+        for line in self._files.content(input_file_id).text.splitlines():
+            request = json.loads(line)
+            body = request["body"]
+            try:
+                text = self._responder(body)
+            except Exception as e:
+                output.append({"custom_id": request["custom_id"], "response": None,
+                               "error": {"message": str(e)}})
+                continue
+            prompt_tokens, completion_tokens = fake_usage(body, text)
+            output.append({
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "body": {
+                    "choices": [{"message": {"role": "assistant", "content": text}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens}
+                }},
+                "error": None
+            })
+        return "\n".join(json.dumps(record) for record in output)
+
+
+class FakeOpenAIBatchClient:
+    """responder(body) -> text (raising marks the request failed); batches complete after polls_until_done polls."""
+
+    def __init__(self, responder=echo, polls_until_done=2):
+        self.events = []
+        self.files = FakeOpenAIFiles()
+        self.batches = FakeOpenAIBatches(self.files, responder, polls_until_done, self.events)
+
+
+def claude_params(prompt):
+    return {"model": "m", "max_tokens": 10, "messages": [{"role": "user", "content": prompt}]}
+
+
+def failing_on(bad_prompt):
+    def responder(params):
+        prompt = params["messages"][-1]["content"]
+        if prompt == bad_prompt:
+            raise ValueError("bad request")
+        return prompt.upper()
+    return responder
+
+
+@pytest.mark.parametrize("model_type, client_class", [
+    ("claude", FakeAnthropicBatchClient),
+    ("gpt", FakeOpenAIBatchClient),
+])
+def test_batch_returns_results_by_custom_id(model_type, client_class):
+    client = client_class(responder=failing_on("b"), polls_until_done=3)
+    requests = {f"row-{i}": claude_params(p) for i, p in enumerate("abc")}
+    results = run_batch(model_type, client, requests, poll_interval=0)
+    assert {k: text for k, (text, _) in results.items()} == {"row-0": "A", "row-2": "C"}
+    assert results["row-0"][1]["total_tokens"] > 0
+
+
+@pytest.mark.parametrize("client_class", [FakeAnthropicBatchClient, FakeOpenAIBatchClient])
+def test_timed_out_batch_is_cancelled(client_class):
+    client = client_class(polls_until_done=10 ** 9)
+    model_type = "claude" if client_class is FakeAnthropicBatchClient else "gpt"
+    assert run_batch(model_type, client, {"row-0": claude_params("a")}, poll_interval=0, timeout=0) == {}
+    assert [state.get("cancelled") for state in client.batches._batches.values()] == [True]
+
+
+def test_every_chunk_is_submitted_before_polling():
+    client = FakeAnthropicBatchClient(polls_until_done=2)
+    requests = {f"row-{i}": claude_params(str(i)) for i in range(5)}
+    submitted = []
+    results = run_batch("claude", client, requests, max_requests_per_batch=2, poll_interval=0,
+                        on_submit=lambda batch_id, custom_ids: submitted.append(custom_ids))
+    assert submitted == [["row-0", "row-1"], ["row-2", "row-3"], ["row-4"]]
+    assert [event for event, _ in client.events[:4]] == ["create", "create", "create", "retrieve"]
+    assert sorted(results) == sorted(requests)
+
+
+def test_chunks_respect_the_payload_size():
+    requests = {f"row-{i}": claude_params("x" * size) for i, size in enumerate([10, 10, 500, 10])}
+    chunks = list(chunk_requests(requests, max_requests=100, max_bytes=300,
+                                 request_bytes=lambda custom_id, params: len(json.dumps(params))))
+    # A request over the limit gets a chunk of its own
+    assert [list(chunk) for chunk in chunks] == [["row-0", "row-1"], ["row-2"], ["row-3"]]
+
+
+def test_pending_batches_are_collected_not_resubmitted():
+    client = FakeAnthropicBatchClient(polls_until_done=1)
+    first = {f"row-{i}": claude_params(str(i)) for i in range(2)}
+    batch_id = client.batches.create([{"custom_id": k, "params": v} for k, v in first.items()]).id
+    finished = []
+    results = run_batch("claude", client, {"row-2": claude_params("2")}, poll_interval=0, pending=[batch_id],
+                        on_results=lambda batch_id, results: finished.append((batch_id, sorted(results))))
+    assert sorted(results) == ["row-0", "row-1", "row-2"]
+    assert len(client.batches._batches) == 2
+    assert (batch_id, ["row-0", "row-1"]) in finished
+
+
+@pytest.mark.parametrize("model_type, client_class", [
+    ("claude", FakeAnthropicBatchClient),
+    ("gpt", FakeOpenAIBatchClient),
+])
+def test_process_df_prompts_batch_mode_writes_back_by_index(model_type, client_class, no_completion_cache):
+    pytest.importorskip("aisitools")
+    import model_completions
+
+    df = pd.DataFrame({"prompt": ["a", "b", None, "d"]}, index=["w", "x", "y", "z"])
+    client = client_class(responder=failing_on("b"), polls_until_done=1)
+    result = model_completions.process_df_prompts(df, model_type, mode="batch", client=client,
+                                                  batch_size=2, batch_poll_interval=0)
+    assert result["response"].tolist() == ["A", None, None, "D"]
+    assert result.loc["w", "total_tokens"] > 0
+
+
+def test_interrupted_batch_run_resumes_without_resubmitting(tmp_path, no_completion_cache):
+    pytest.importorskip("aisitools")
+    import model_completions
+
+    checkpoint = str(tmp_path / "run.jsonl")
+    df = pd.DataFrame({"prompt": ["a", "b", "c"]}, index=[10, 20, 30])
+    client = FakeAnthropicBatchClient(responder=lambda params: params["messages"][-1]["content"].upper(),
+                                      polls_until_done=1)
+    kwargs = dict(mode="batch", client=client, batch_size=2, batch_poll_interval=0, checkpoint_path=checkpoint,
+                  show_progress=False)
+
+    # Ctrl-C while polling: both batches were submitted and must not be paid for twice
+    client.batches.interrupt_polls = 1
+    with pytest.raises(KeyboardInterrupt):
+        model_completions.process_df_prompts(df, "claude", **kwargs)
+    assert len(client.batches._batches) == 2
+
+    result = model_completions.process_df_prompts(df, "claude", **kwargs)
+    assert result["response"].tolist() == ["A", "B", "C"]
+    assert len(client.batches._batches) == 2
+
+    # Every batch is finished and every row journaled, so a third run sends nothing
+    client.events.clear()
+    model_completions.process_df_prompts(df, "claude", **kwargs)
+    assert client.events == []
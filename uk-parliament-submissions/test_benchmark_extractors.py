@@ -0,0 +1,20 @@
+from collections import Counter
+
+from benchmark_extractors import run_backend, word_counts, word_f1
+
+
+def test_run_backend_returns_word_counts_not_text(tmp_path, make_pdf):
+    paths = [make_pdf("a.pdf", [["Agents trade agents"], []]), tmp_path / "broken.pdf"]
+    paths[1].write_bytes(b"not a pdf")
+    result = run_backend("pypdf2", paths)
+    assert "texts" not in result
+    assert result["words"] == [[Counter({"agents": 2, "trade": 1}), Counter()], None]
+    assert result["errors"] == 1
+    assert result["peak_rss_mb"] >= result["baseline_rss_mb"] > 0
+
+
+def test_word_f1():
+    assert word_f1(word_counts("AI agents, agents"), word_counts("agents AI agents")) == 1.0
+    assert word_f1(word_counts(""), word_counts("")) == 1.0
+    assert word_f1(word_counts("a b"), word_counts("a c")) == 0.5
+    assert word_f1(word_counts("a"), word_counts("")) == 0.0
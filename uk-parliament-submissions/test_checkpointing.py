@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from checkpointing import CompletionJournal, index_key, prompt_fingerprint
+
+USAGE = {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5}
+
+
+def test_journal_round_trip(tmp_path):
+    path = tmp_path / "run" / "journal.jsonl"
+    with CompletionJournal(str(path)) as journal:
+        journal.append(0, "fp0", "zero", USAGE)
+        journal.append(("a", 1), "fp1", "tuple", USAGE)
+    completed = CompletionJournal(str(path)).load()
+    assert set(completed) == {0, ("a", 1)}
+    assert completed[("a", 1)]["response"] == "tuple"
+    assert completed[0]["total_tokens"] == 5
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    with CompletionJournal(str(path)) as journal:
+        journal.append(0, "fp0", "zero", USAGE)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"index": 1, "fingerprint": "fp1", "resp')
+    assert list(CompletionJournal(str(path)).load()) == [0]
+
+
+def test_append_after_truncated_tail_starts_a_new_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    with CompletionJournal(str(path)) as journal:
+        journal.append(0, "fp0", "zero", USAGE)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"index": 1, "fingerprint": "fp1", "resp')
+    # The resumed run's first record must survive the crashed run's partial line
+    with CompletionJournal(str(path)) as journal:
+        journal.append(2, "fp2", "two", USAGE)
+    completed = CompletionJournal(str(path)).load()
+    assert sorted(completed) == [0, 2]
+    assert completed[2]["response"] == "two"
+
+
+def test_index_key_normalises_numpy_labels():
+    np = pytest.importorskip("numpy")
+    assert index_key(np.int64(7)) == 7 and type(index_key(np.int64(7))) is int
+    assert index_key((np.int64(1), "x")) == (1, "x")
+
+
+def test_index_key_keys_other_labels_by_str():
+    pd_timestamp = pd.Timestamp("2024-01-02 03:04")
+    assert index_key(pd_timestamp) == str(pd_timestamp)
+    assert index_key(("a", pd_timestamp)) == ("a", str(pd_timestamp))
+    assert index_key(None) is None and index_key(1.5) == 1.5
+
+
+def test_prompt_fingerprint_changes_with_any_part():
+    assert prompt_fingerprint("claude", "sys", "a") == prompt_fingerprint("claude", "sys", "a")
+    assert prompt_fingerprint("claude", "sys", "a") != prompt_fingerprint("claude", "sys", "b")
+
+
+class FakeClaudeClient:
+    def __init__(self):
+        self.prompts = []
+        self.messages = SimpleNamespace(create=self.create)
+
+    def create(self, **params):
+        prompt = params["messages"][0]["content"]
+        self.prompts.append(prompt)
+        usage = SimpleNamespace(input_tokens=3, output_tokens=2, cache_creation_input_tokens=0,
+                                cache_read_input_tokens=0)
+        return SimpleNamespace(content=[SimpleNamespace(text=prompt.upper())], usage=usage)
+
+
+def test_process_df_prompts_resumes_from_checkpoint(tmp_path, no_completion_cache):
+    pytest.importorskip("aisitools")
+    import model_completions
+
+    path = str(tmp_path / "journal.jsonl")
+    df = pd.DataFrame({"prompt": ["a", "b", "c"]}, index=[10, 20, 30])
+
+    first = FakeClaudeClient()
+    model_completions.process_df_prompts(df.iloc[:2], "claude", client=first, checkpoint_path=path,
+                                         show_progress=False)
+    assert sorted(first.prompts) == ["a", "b"]
+
+    # A rerun only sends rows missing from the journal, and rows whose prompt changed
+    changed = df.copy()
+    changed.loc[20, "prompt"] = "b2"
+    second = FakeClaudeClient()
+    result = model_completions.process_df_prompts(changed, "claude", client=second, checkpoint_path=path,
+                                                  show_progress=False)
+    assert sorted(second.prompts) == ["b2", "c"]
+    assert result["response"].tolist() == ["A", "B2", "C"]
+    assert result["total_tokens"].tolist() == [5, 5, 5]
+
+
+def test_process_df_prompts_resumes_with_timestamp_index(tmp_path, no_completion_cache):
+    pytest.importorskip("aisitools")
+    import model_completions
+
+    path = str(tmp_path / "journal.jsonl")
+    df = pd.DataFrame({"prompt": ["a", "b"]}, index=pd.date_range("2024-01-01", periods=2))
+    model_completions.process_df_prompts(df.iloc[:1], "claude", client=FakeClaudeClient(), checkpoint_path=path,
+                                         show_progress=False)
+    client = FakeClaudeClient()
+    result = model_completions.process_df_prompts(df, "claude", client=client, checkpoint_path=path,
+                                                  show_progress=False)
+    assert client.prompts == ["b"]
+    assert result["response"].tolist() == ["A", "B"]
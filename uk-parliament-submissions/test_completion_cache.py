@@ -0,0 +1,98 @@
+import itertools
+import threading
+
+import pytest
+
+import completion_cache
+from completion_cache import CompletionCache, make_cache_key
+
+USAGE = {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A strictly increasing clock, so last_access orders entries even when calls share a timestamp."""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(completion_cache.time, "time", lambda: float(next(ticks)))
+
+
+def make_cache(tmp_path, **kwargs):
+    return CompletionCache(str(tmp_path / "cache.sqlite"), **kwargs)
+
+
+def test_key_is_stable_and_covers_every_parameter():
+    messages = [{"role": "user", "content": "hi"}]
+    key = make_cache_key("claude", "m", "sys", messages, 100, 0.0)
+    assert key == make_cache_key("claude", "m", "sys", [{"content": "hi", "role": "user"}], 100, 0.0)
+    # Pinned so an accidental change to the key format (which orphans every stored entry) is noticed
+    assert key == "b8e1c3695eb43e9de447da8a3390dea5546805c1a8e0d6e3822ac3484e4bae0b"
+    assert len({
+        key,
+        make_cache_key("gpt", "m", "sys", messages, 100, 0.0),
+        make_cache_key("claude", "m2", "sys", messages, 100, 0.0),
+        make_cache_key("claude", "m", "sys2", messages, 100, 0.0),
+        make_cache_key("claude", "m", "sys", [{"role": "user", "content": "ho"}], 100, 0.0),
+        make_cache_key("claude", "m", "sys", messages, 200, 0.0),
+        make_cache_key("claude", "m", "sys", messages, 100, 0.5),
+    }) == 7
+
+
+def test_entries_survive_reopening(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("k", "response", USAGE)
+    cache.close()
+    reopened = make_cache(tmp_path)
+    assert reopened.get("k") == ("response", USAGE)
+    assert reopened.get("missing") is None
+    assert reopened.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+    reopened.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.put("a", "A", USAGE)
+    cache.put("b", "B", USAGE)
+    assert cache.get("a") is not None  # "b" is now the least recently used
+    cache.put("c", "C", USAGE)
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == ("A", USAGE)
+    assert cache.get("c") == ("C", USAGE)
+    cache.close()
+
+
+def test_eviction_by_total_response_size(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=None, max_bytes=10)
+    cache.put("a", "x" * 4, USAGE)
+    cache.put("b", "y" * 4, USAGE)
+    cache.get("a")
+    cache.put("c", "z" * 4, USAGE)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    cache.close()
+
+
+def test_concurrent_writers_share_the_file(tmp_path):
+    # Two connections to one file (as two processes would have) writing from several threads
+    caches = [make_cache(tmp_path), make_cache(tmp_path)]
+    errors = []
+
+    def write(worker):
+        try:
+            cache = caches[worker % 2]
+            for i in range(25):
+                cache.put(f"{worker}-{i}", f"response {worker}-{i}", USAGE)
+                assert cache.get(f"{worker}-{i}") == (f"response {worker}-{i}", USAGE)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert caches[0]._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert len(caches[0]) == len(caches[1]) == 200
+    for cache in caches:
+        cache.close()
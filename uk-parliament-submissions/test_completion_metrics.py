@@ -0,0 +1,142 @@
+import re
+
+import pandas as pd
+import pytest
+
+from completion_metrics import (BATCH_DISCOUNT, MODEL_PRICES, CompletionRecord, MetricsRegistry, estimate_cost,
+                                track_completion)
+
+CLAUDE = "claude-3-7-sonnet-20250219"
+GPT = "gpt-4o-2024-08-06"
+MILLION = 1_000_000
+SAMPLE_RE = re.compile(r'^(\w+)\{((?:\w+="[^"]*",?)*)\} (\S+)$')
+
+
+def claude_record(**fields):
+    fields.setdefault("started_at", 0.0)
+    return CompletionRecord(provider="claude", model=CLAUDE, **fields)
+
+
+def test_claude_cost_prices_each_token_type():
+    record = claude_record(prompt_tokens=MILLION, completion_tokens=MILLION,
+                           cache_creation_input_tokens=MILLION, cache_read_input_tokens=MILLION)
+    prices = MODEL_PRICES[CLAUDE]
+    full = prices["input"] + prices["output"] + prices["cache_write"] + prices["cache_read"]
+    assert estimate_cost(record) == pytest.approx(full)
+
+    record.mode = "batch"
+    assert estimate_cost(record) == pytest.approx(full * BATCH_DISCOUNT)
+
+
+def test_gpt_cached_tokens_are_not_billed_twice():
+    # OpenAI reports cached tokens inside prompt_tokens
+    record = CompletionRecord(provider="gpt", model=GPT, started_at=0.0, prompt_tokens=MILLION,
+                              completion_tokens=100_000, cache_read_input_tokens=400_000)
+    prices = MODEL_PRICES[GPT]
+    expected = 0.6 * prices["input"] + 0.1 * prices["output"] + 0.4 * prices["cache_read"]
+    assert estimate_cost(record) == pytest.approx(expected)
+
+
+def test_cache_hits_and_unknown_models_cost_nothing():
+    assert estimate_cost(claude_record(prompt_tokens=MILLION, cached=True)) == 0.0
+    assert estimate_cost(CompletionRecord(provider="claude", model="unknown", started_at=0.0,
+                                          prompt_tokens=MILLION)) == 0.0
+
+
+@pytest.fixture
+def registry():
+    registry = MetricsRegistry()
+    for latency in (1.0, 2.0, 3.0, 4.0, 5.0):
+        registry.add(claude_record(latency=latency, time_to_first_token=latency / 10, prompt_tokens=100,
+                                   completion_tokens=10, retries=1))
+    # Neither errors nor cache hits count towards the latency percentiles
+    registry.add(claude_record(latency=60.0, error_class="RateLimitError"))
+    registry.add(claude_record(latency=0.001, cached=True, prompt_tokens=100, completion_tokens=10))
+    registry.add(CompletionRecord(provider="gpt", model=GPT, started_at=0.0, latency=2.0, completion_tokens=4))
+    return registry
+
+
+def test_summary_counts_and_percentiles(registry):
+    summary = registry.summary().set_index("provider")
+    claude = summary.loc["claude"]
+    assert (claude["calls"], claude["errors"], claude["cache_hits"], claude["retries"]) == (7, 1, 1, 5)
+    assert claude["prompt_tokens"] == 600
+    assert claude["latency_p50"] == pytest.approx(3.0)
+    assert claude["latency_p95"] == pytest.approx(4.8)
+    assert claude["latency_p99"] == pytest.approx(4.96)
+    assert claude["ttft_p50"] == pytest.approx(0.3)
+    assert claude["output_tokens_per_sec"] == pytest.approx(50 / 15)
+    assert claude["cost_usd"] == pytest.approx((500 * 3.00 + 50 * 15.00) / MILLION)
+    assert summary.loc["gpt", "calls"] == 1
+    assert pd.isna(summary.loc["gpt", "ttft_p50"])
+
+
+def test_summary_of_an_empty_registry():
+    assert MetricsRegistry().summary().empty
+    assert MetricsRegistry().to_prometheus() == "\n".join([
+        "# HELP model_completion_requests_total Completion calls by outcome.",
+        "# TYPE model_completion_requests_total counter",
+        "# HELP model_completion_tokens_total Tokens used by completion calls.",
+        "# TYPE model_completion_tokens_total counter",
+        "# HELP model_completion_retries_total Retries of rate limited or failed calls.",
+        "# TYPE model_completion_retries_total counter",
+        "# HELP model_completion_cost_usd_total Estimated cost of completion calls in USD.",
+        "# TYPE model_completion_cost_usd_total counter",
+        "# HELP model_completion_latency_seconds Latency of completion calls.",
+        "# TYPE model_completion_latency_seconds summary",
+    ]) + "\n"
+
+
+def test_prometheus_text_format(registry):
+    text = registry.to_prometheus()
+    assert text.endswith("\n")
+    samples = {}
+    declared = set()
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, metric_type = line.split(" ")
+            assert metric_type in ("counter", "summary")
+            declared.add(name)
+            continue
+        if line.startswith("# HELP "):
+            continue
+        match = SAMPLE_RE.match(line)
+        assert match, line
+        name, labels, value = match.groups()
+        # Every sample belongs to a metric whose TYPE was declared before it
+        assert name in declared or name.rsplit("_", 1)[0] in declared
+        samples[(name, labels)] = float(value)
+
+    claude = 'provider="claude",model="claude-3-7-sonnet-20250219"'
+    assert samples[("model_completion_requests_total", claude + ',status="ok"')] == 5
+    assert samples[("model_completion_requests_total", claude + ',status="cached"')] == 1
+    assert samples[("model_completion_requests_total", claude + ',status="error",error_class="RateLimitError"')] == 1
+    assert samples[("model_completion_tokens_total", claude + ',type="completion_tokens"')] == 60
+    assert samples[("model_completion_retries_total", claude)] == 5
+    assert samples[("model_completion_latency_seconds", claude + ',quantile="0.5"')] == 3.0
+    assert samples[("model_completion_latency_seconds_sum", claude)] == 15.0
+    assert samples[("model_completion_latency_seconds_count", claude)] == 5
+
+
+def test_write_prometheus(registry, tmp_path):
+    path = tmp_path / "completions.prom"
+    registry.write_prometheus(str(path), prefix="llm")
+    assert path.read_text() == registry.to_prometheus(prefix="llm")
+    assert "llm_requests_total{" in path.read_text()
+
+
+def test_track_completion_records_errors_and_usage():
+    registry = MetricsRegistry(max_records=2)
+    with track_completion("claude", CLAUDE, registry=registry) as call:
+        call.count_retry()
+        call.set_usage({"prompt_tokens": 7, "completion_tokens": 3})
+    with pytest.raises(ValueError):
+        with track_completion("claude", CLAUDE, registry=registry):
+            raise ValueError("boom")
+    ok, failed = registry.records()
+    assert (ok.prompt_tokens, ok.completion_tokens, ok.retries, ok.error_class) == (7, 3, 1, None)
+    assert failed.error_class == "ValueError"
+
+    # Only the most recent max_records calls are kept
+    registry.record("gpt", GPT)
+    assert [record.provider for record in registry.records()] == ["claude", "gpt"]
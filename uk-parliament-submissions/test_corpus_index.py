@@ -0,0 +1,95 @@
+import gc
+import weakref
+from pathlib import Path
+
+import pytest
+
+from corpus_index import CorpusIndex, is_exact_term
+from pdf_extraction import iter_pages
+from term_filter import TermFilter
+
+EVIDENCE = Path(__file__).parent / "2025-05-UKParliament-Evidence"
+PAGES = {
+    "a.pdf": [["AI agents and financial stability."], ["Nothing else."]],
+    "b.pdf": [["An agentic system."], ["Stability of markets, AI."], ["Agent."]],
+    "c.pdf": [["Unrelated text about cryptocurrency."]],
+}
+
+
+@pytest.fixture
+def corpus(tmp_path, make_pdf):
+    paths = [make_pdf(name, pages) for name, pages in PAGES.items()]
+    index = CorpusIndex(str(tmp_path / "index"))
+    index.update(paths, max_workers=1)
+    return index, paths
+
+
+@pytest.mark.parametrize("expression", ["agent AND stability", "agent AND NOT cryptocurrency",
+                                        "cryptocurrency OR markets", "NOT agent"])
+def test_match_agrees_with_scanning(corpus, expression):
+    index, paths = corpus
+    for path in paths:
+        result = index.match(expression, path)
+        scanned = TermFilter(expression).match(iter_pages(path))
+        assert result.matched == scanned.matched
+
+
+def test_phrases_are_left_to_the_scan(corpus):
+    index, paths = corpus
+    assert not is_exact_term("ai agent") and not is_exact_term("computer-use") and is_exact_term("GPAI")
+    assert index.match('"ai agent" OR stability', paths[0]) is None
+    # The phrase matches across the line break and comma in b.pdf, which the scan would not
+    assert "b.pdf" in {Path(p).name for p in index.term_pages("markets ai")}
+
+
+def test_offsets_point_at_the_hits(corpus):
+    index, paths = corpus
+    offsets = index.offsets(["stability"], paths[1])
+    text = list(iter_pages(paths[1]))[1].text
+    assert [text[o:o + 9].lower() for o in offsets[2]] == ["stability"]
+    assert index.offsets(["agent"], Path("missing.pdf")) is None
+
+
+def test_update_detects_moves_changes_and_removals(corpus, make_pdf, tmp_path):
+    index, paths = corpus
+    moved = tmp_path / "moved.pdf"
+    paths[2].rename(moved)
+    make_pdf("a.pdf", [["Changed text."]])
+    stats = index.update([paths[0], paths[1], moved], prune=True, max_workers=1)
+    assert stats == {"added": 0, "updated": 1, "moved": 1, "removed": 0, "unchanged": 1}
+    assert not index.match("agent", paths[0]).matched
+    assert index.match("cryptocurrency", moved).matched
+
+    stats = CorpusIndex(index.path).update([moved], prune=True, max_workers=1)
+    assert stats["removed"] == 2 and stats["unchanged"] == 1
+
+
+def test_query_caches_belong_to_each_index(corpus, make_pdf, tmp_path):
+    index, paths = corpus
+    other = CorpusIndex(str(tmp_path / "other"))
+    other.update([make_pdf("d.pdf", [["Stability only."]])], max_workers=1)
+    assert {Path(p).name for p in index.term_pages("stability")} == {"a.pdf", "b.pdf"}
+    assert {Path(p).name for p in other.term_pages("stability")} == {"d.pdf"}
+
+    # Updating one index refreshes its own answers and leaves the other's alone
+    make_pdf("a.pdf", [["Changed text."]])
+    index.update(paths, max_workers=1)
+    assert {Path(p).name for p in index.term_pages("stability")} == {"b.pdf"}
+    assert other._query_hits and {Path(p).name for p in other.term_pages("stability")} == {"d.pdf"}
+
+    # Nothing outside the index keeps it alive
+    ref = weakref.ref(other)
+    del other
+    gc.collect()
+    assert ref() is None
+
+
+def test_index_agrees_with_scan_on_evidence(tmp_path):
+    pdfs = sorted(EVIDENCE.glob("*.pdf"))[:6]
+    if not pdfs:
+        pytest.skip("evidence PDFs not available")
+    index = CorpusIndex(str(tmp_path / "index"))
+    index.update(pdfs, max_workers=1)
+    term_filter = TermFilter("agent AND stability")
+    for path in pdfs:
+        assert index.match(term_filter, path).matched == term_filter.match(iter_pages(path)).matched
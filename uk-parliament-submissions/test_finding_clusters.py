@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from finding_clusters import cluster_vectors, deduplicate, precluster_findings, tfidf_vectors, tokenize
+
+HERDING = "Autonomous trading agents could herd into the same positions and amplify market stress."
+HERDING_REWORDED = "Autonomous trading agents could herd into the same positions and amplify the market stress."
+CONCENTRATION = "Most banks rely on a handful of foundation model providers, a concentration risk."
+CONCENTRATION_2 = "Reliance on few foundation model providers creates concentration risk for banks."
+
+
+def test_tokenize_drops_stopwords_and_single_characters():
+    assert tokenize("The AI agent's X-ray of a market, and 2 risks") == ["ai", "agent's", "x-ray", "market", "risks"]
+
+
+def test_vectors_are_unit_length_and_empty_texts_are_zero():
+    vectors, terms = tfidf_vectors([HERDING, "", "the and of", CONCENTRATION])
+    assert vectors.shape == (4, len(terms))
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), [1, 0, 0, 1], atol=1e-6)
+    assert "herd" in terms and "the" not in terms
+
+
+def test_vocabulary_is_capped_at_the_most_frequent_terms():
+    vectors, terms = tfidf_vectors(["risk agents", "risk banks", "risk"], max_features=1)
+    assert terms == ["risk"]
+    assert vectors.shape == (3, 1)
+
+
+def test_exact_and_near_duplicates_collapse_onto_the_first():
+    texts = [HERDING, CONCENTRATION, "  " + HERDING.upper(), HERDING_REWORDED, CONCENTRATION_2]
+    vectors, _ = tfidf_vectors(texts)
+    assert deduplicate(texts, vectors).tolist() == [0, 1, 0, 0, 4]
+
+
+def test_exact_duplicates_of_a_near_duplicate_follow_it():
+    texts = [HERDING, HERDING_REWORDED, HERDING_REWORDED.lower()]
+    vectors, _ = tfidf_vectors(texts)
+    assert deduplicate(texts, vectors).tolist() == [0, 0, 0]
+
+
+def test_texts_without_terms_are_never_near_duplicates():
+    texts = ["", "the", "of and", "the"]
+    vectors, _ = tfidf_vectors(texts)
+    # Only the exact copy collapses; zero vectors do not match each other by similarity
+    assert deduplicate(texts, vectors).tolist() == [0, 1, 2, 1]
+
+
+def test_cluster_vectors_groups_similar_texts():
+    vectors, _ = tfidf_vectors([HERDING, CONCENTRATION, HERDING_REWORDED, CONCENTRATION_2])
+    labels = cluster_vectors(vectors).tolist()
+    assert labels[0] == labels[2] and labels[1] == labels[3] and labels[0] != labels[1]
+
+
+def test_cluster_vectors_of_empty_vectors():
+    assert cluster_vectors(np.zeros((0, 3), dtype=np.float32)).tolist() == []
+    assert cluster_vectors(np.zeros((1, 3), dtype=np.float32)).tolist() == [0]
+    # Vectors with no terms are unrelated to everything, so each gets its own cluster
+    assert sorted(cluster_vectors(np.zeros((3, 3), dtype=np.float32)).tolist()) == [0, 1, 2]
+
+
+def test_single_finding_is_its_own_cluster():
+    (cluster,) = precluster_findings([{"quote": HERDING}])
+    assert cluster["finding_indices"] == [0] and cluster["representative_indices"] == [0]
+    assert len(cluster["top_terms"]) == 5 and set(cluster["top_terms"]) <= set(tokenize(HERDING))
+
+
+def test_no_findings_give_no_clusters():
+    assert precluster_findings([]) == []
+
+
+def test_all_empty_quotes_are_kept():
+    findings = [{"quote": ""}, {"quote": None}, {}, {"quote": "the"}]
+    clusters = precluster_findings(findings)
+    assert sorted(i for c in clusters for i in c["finding_indices"]) == [0, 1, 2, 3]
+    assert all(c["top_terms"] == [] for c in clusters)
+
+
+def test_precluster_collapses_duplicates_and_orders_clusters_by_size():
+    findings = [{"quote": q} for q in [CONCENTRATION, HERDING, HERDING.lower(), HERDING_REWORDED, CONCENTRATION_2]]
+    clusters = precluster_findings(findings)
+    assert [c["finding_indices"] for c in clusters] == [[1, 2, 3], [0, 4]]
+    # Duplicates are represented once; distinct quotes in a cluster each keep a representative
+    assert [c["representative_indices"] for c in clusters] == [[1], [0, 4]]
+
+
+@pytest.mark.parametrize("text_key", ["quote", "summary"])
+def test_precluster_reads_the_given_field(text_key):
+    findings = [{text_key: HERDING}, {text_key: HERDING_REWORDED}, {text_key: CONCENTRATION}]
+    clusters = precluster_findings(findings, text_key=text_key)
+    assert [c["finding_indices"] for c in clusters] == [[0, 1], [2]]
@@ -0,0 +1,42 @@
+import pytest
+
+import keyword_matcher
+from keyword_matcher import KeywordMatcher
+
+KEYWORDS = {"agents": ["AI agent", "AI agents", "agent"], "risk": ["stability", "systemic risk"]}
+TEXT = "AI Agents threaten stability; an agentic AI agent, and systemic risk."
+
+
+@pytest.fixture(params=["pyahocorasick", "python"])
+def make_matcher(request, monkeypatch):
+    if request.param == "pyahocorasick":
+        pytest.importorskip("ahocorasick")
+    else:
+        monkeypatch.setattr(keyword_matcher, "ahocorasick", None)
+    return KeywordMatcher
+
+
+def test_matches_every_overlapping_occurrence(make_matcher):
+    matcher = make_matcher(KEYWORDS)
+    matches = matcher.find_all(TEXT)
+    for match in matches:
+        assert TEXT.lower()[match.start:match.end] == match.keyword
+    assert matcher.counts(TEXT) == {"agent": 3, "ai agent": 2, "ai agents": 1, "stability": 1, "systemic risk": 1}
+    assert matcher.matched_labels(TEXT) == {"agents", "risk"}
+
+
+def test_word_boundary_skips_partial_words(make_matcher):
+    matcher = make_matcher(["agent"], word_boundary=True)
+    assert [m.start for m in matcher.find_all(TEXT)] == [TEXT.lower().rindex("agent,")]
+
+
+def test_same_semantics_as_substring_checks(make_matcher):
+    keywords = ["ai", "risk", "he", "she", "hers"]
+    matcher = make_matcher(keywords)
+    for text in ["", "ushers", "AI RISK", "nothing"]:
+        assert matcher.contains_any(text) == any(k in text.lower() for k in keywords)
+        assert matcher.matched_keywords(text) == {k for k in keywords if k in text.lower()}
+
+
+def test_case_sensitive(make_matcher):
+    assert not make_matcher(["GPAI"], case_sensitive=True).contains_any("gpai")
@@ -0,0 +1,245 @@
+import time
+import asyncio
+import random
+import weakref
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("aisitools")
+import model_completions  # noqa: E402
+
+
+pytestmark = pytest.mark.usefixtures("no_completion_cache")
+
+
+def claude_response(text):
+    usage = SimpleNamespace(input_tokens=3, output_tokens=2, cache_creation_input_tokens=0,
+                            cache_read_input_tokens=0)
+    return SimpleNamespace(content=[SimpleNamespace(text=text)], usage=usage)
+
+
+class SlowClaudeClient:
+    """Answers each prompt with its upper-case text after a random delay, so calls finish out of order."""
+
+    def __init__(self):
+        self.messages = SimpleNamespace(create=self.create)
+
+    def create(self, **params):
+        time.sleep(random.uniform(0, 0.02))
+        return claude_response(params["messages"][0]["content"].upper())
+
+
+def test_concurrent_rows_are_written_back_by_index():
+    prompts = [f"prompt {i}" for i in range(40)]
+    df = pd.DataFrame({"prompt": prompts}, index=[f"row{i}" for i in range(40)])
+    df.loc["row5", "prompt"] = None
+    result = model_completions.process_df_prompts(df, "claude", client=SlowClaudeClient(), max_workers=8,
+                                                  batch_size=10, show_progress=False)
+    expected = [None if i == 5 else f"PROMPT {i}" for i in range(40)]
+    assert result["response"].tolist() == expected
+    assert result.index.tolist() == df.index.tolist()
+
+
+class SlowAsyncClaudeClient:
+    """Async client that tracks the peak number of requests in flight."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+        self.messages = SimpleNamespace(create=self.create)
+
+    async def create(self, **params):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(random.uniform(0, 0.02))
+        self.in_flight -= 1
+        return claude_response(params["messages"][0]["content"].upper())
+
+
+def test_async_rows_are_written_back_by_index_within_concurrency_limit():
+    df = pd.DataFrame({"prompt": [f"prompt {i}" for i in range(30)]}, index=range(100, 130))
+    client = SlowAsyncClaudeClient()
+    result = model_completions.run_async(model_completions.aprocess_df_prompts(
+        df, "claude", client=client, max_concurrency=5, show_progress=False
+    ))
+    assert result["response"].tolist() == [f"PROMPT {i}" for i in range(30)]
+    assert 1 < client.peak <= 5
+
+
+def test_run_async_inside_a_running_loop():
+    async def inner():
+        return 42
+
+    async def outer():
+        return model_completions.run_async(inner())
+    assert asyncio.run(outer()) == 42
+
+
+class CountingClaudeClient:
+    def __init__(self):
+        self.calls = 0
+        self.messages = SimpleNamespace(create=self.create)
+
+    def create(self, **params):
+        self.calls += 1
+        return claude_response(f"sample {self.calls}")
+
+
+@pytest.mark.parametrize("temperature, expected_calls", [(0, 1), (1.0, 2)])
+def test_only_temperature_zero_completions_are_cached(tmp_path, monkeypatch, temperature, expected_calls):
+    monkeypatch.setattr(model_completions, "_completion_cache",
+                        model_completions.CompletionCache(str(tmp_path / "cache.sqlite")))
+    monkeypatch.setattr(model_completions, "_completion_cache_enabled", True)
+    client = CountingClaudeClient()
+    responses = [
+        model_completions.get_claude_completion("sys", [{"role": "user", "content": "hi"}], client,
+                                                temperature=temperature)[0]
+        for _ in range(2)
+    ]
+    assert client.calls == expected_calls
+    assert len(set(responses)) == expected_calls
+
+
+class FakeClaudeStream:
+    def __init__(self, deltas):
+        self.text_stream = iter(deltas)
+        self._text = "".join(deltas)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def get_final_message(self):
+        return claude_response(self._text)
+
+
+class StreamingClaudeClient:
+    def __init__(self):
+        self.messages = SimpleNamespace(stream=self.stream)
+
+    def stream(self, **params):
+        return FakeClaudeStream(params["messages"][0]["content"].upper().split(" "))
+
+
+class StreamingGPTClient:
+    """Streams each word of the prompt as a chunk; the final usage chunk is only sent when send_usage is set."""
+
+    def __init__(self, send_usage):
+        self.send_usage = send_usage
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **params):
+        for word in params["messages"][-1]["content"].split(" "):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))], usage=None)
+        if self.send_usage:
+            usage = SimpleNamespace(prompt_tokens=3, completion_tokens=2, total_tokens=5, prompt_tokens_details=None)
+            yield SimpleNamespace(choices=[], usage=usage)
+
+
+def test_stream_yields_text_deltas_then_usage():
+    events = list(model_completions.stream_completion(
+        "claude", "sys", [{"user": "a b c"}], StreamingClaudeClient(), temperature=0
+    ))
+    assert events[:-1] == [("text", "A"), ("text", "B"), ("text", "C")]
+    event, info = events[-1]
+    assert event == "done"
+    assert info["response"] == "ABC"
+    assert info["token_usage"]["total_tokens"] == 5
+    assert info["time_to_first_token"] >= 0
+
+
+@pytest.mark.parametrize("send_usage", [True, False])
+def test_streamed_rows_keep_their_text_with_or_without_usage(send_usage):
+    df = pd.DataFrame({"prompt": ["x y", "z"]}, index=["r1", "r2"])
+    deltas = []
+    result = model_completions.process_df_prompts(
+        df, "gpt", client=StreamingGPTClient(send_usage), show_progress=False,
+        stream_callback=lambda idx, delta: deltas.append((idx, delta))
+    )
+    assert result["response"].tolist() == ["xy", "z"]
+    assert sorted(deltas) == [("r1", "x"), ("r1", "y"), ("r2", "z")]
+    assert result["time_to_first_token"].notna().all()
+    if send_usage:
+        assert result["total_tokens"].tolist() == [5, 5]
+    else:
+        assert result["total_tokens"].isna().all()
+
+
+class PooledClient:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class AsyncPooledClient(PooledClient):
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def client_pool(monkeypatch):
+    """Empty shared-client registries and a create_client that records every client it makes."""
+    created = []
+
+    def create_client(model_type, use_async=False, max_connections=None):
+        client = AsyncPooledClient() if use_async else PooledClient()
+        created.append(client)
+        return client
+
+    monkeypatch.setattr(model_completions, "_clients", {})
+    monkeypatch.setattr(model_completions, "_async_clients", weakref.WeakKeyDictionary())
+    monkeypatch.setattr(model_completions, "create_client", create_client)
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "key-a")
+    monkeypatch.setenv("OPENAI_API_KEY", "key-o")
+    return created
+
+
+def test_sync_clients_are_shared_per_provider_and_key(client_pool, monkeypatch):
+    claude = model_completions.get_client("claude")
+    assert model_completions.get_client("claude") is claude
+    assert model_completions.get_client("gpt") is not claude
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "key-b")
+    assert model_completions.get_client("claude") is not claude
+    assert len(client_pool) == 3
+
+    model_completions.close_clients()
+    assert all(client.closed for client in client_pool)
+    assert model_completions.get_client("claude") is client_pool[-1] and len(client_pool) == 4
+
+
+def test_async_clients_are_shared_per_loop_and_closed_with_it(client_pool):
+    async def two_lookups():
+        first = model_completions.get_client("claude", use_async=True)
+        assert model_completions.get_client("claude", use_async=True) is first
+        assert not first.closed
+        return first
+
+    first = model_completions.run_async(two_lookups())
+    assert first.closed
+
+    # A new loop gets its own client, also when run_async is called from inside a running loop
+    async def nested():
+        return model_completions.run_async(two_lookups())
+    second = asyncio.run(nested())
+    assert second is not first and second.closed
+    assert len(client_pool) == 2
+    assert len(model_completions._async_clients) == 0
+
+
+def test_create_client_needs_an_api_key(monkeypatch):
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    assert model_completions.create_client("claude") is None
+    assert model_completions.get_client("claude") is None
+    assert model_completions.create_client("llama") is None
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "key-a")
+    client = model_completions.create_client("claude", use_async=True, max_connections=4)
+    assert isinstance(client, model_completions.AsyncAnthropic)
+    assert client.max_retries == 0
+    asyncio.run(client.close())
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from paragraph_dedup import MinHasher, dedupe_paragraphs, find_near_duplicates, shingle_hashes
+
+BASE = ("The Bank of England should monitor how autonomous AI agents trading on behalf of firms "
+        "could amplify market stress through correlated behaviour across many institutions. ")
+OTHER = ("Data on model usage in retail lending is fragmented, so supervisors cannot yet measure "
+         "concentration risk from a handful of foundation model providers serving most banks. ")
+
+
+def jaccard(a, b):
+    a, b = set(shingle_hashes(a).tolist()), set(shingle_hashes(b).tolist())
+    return len(a & b) / len(a | b)
+
+
+def test_signature_estimates_jaccard():
+    text_a = BASE * 2 + OTHER
+    text_b = BASE * 2 + OTHER.replace("fragmented", "scattered")
+    hasher = MinHasher(512)
+    estimate = np.mean(hasher.signature(shingle_hashes(text_a)) == hasher.signature(shingle_hashes(text_b)))
+    assert estimate == pytest.approx(jaccard(text_a, text_b), abs=0.08)
+
+
+def test_near_duplicates_point_to_the_first_copy():
+    texts = [OTHER, BASE, BASE.replace("stress", "stress,").upper(), "Short unrelated line.", BASE + "Indeed."]
+    assert find_near_duplicates(texts) == [0, 1, 1, 3, 1]
+
+
+def test_distinct_texts_are_kept_apart():
+    texts = [BASE, OTHER, BASE.replace("Bank of England", "Financial Conduct Authority")
+             .replace("market stress", "liquidity shortfalls")]
+    assert find_near_duplicates(texts, threshold=0.8) == [0, 1, 2]
+
+
+def test_dedupe_keeps_order_and_every_reference():
+    paragraphs = [
+        {"text": OTHER, "source": "a.pdf", "page": 1},
+        {"text": BASE, "source": "a.pdf", "page": 2},
+        {"text": BASE, "source": "b.pdf", "page": 7},
+        {"text": BASE, "source": "b.pdf", "page": 7},
+    ]
+    deduped = dedupe_paragraphs(paragraphs)
+    assert [p["text"] for p in deduped] == [OTHER, BASE]
+    assert deduped[1]["references"] == [{"source": "a.pdf", "page": 2}, {"source": "b.pdf", "page": 7}]
+    assert "references" not in paragraphs[1]
+
+
+def test_bands_must_divide_permutations():
+    with pytest.raises(ValueError):
+        find_near_duplicates([BASE], num_permutations=100, bands=16)
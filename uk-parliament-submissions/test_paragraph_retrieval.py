@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+
+from finding_clusters import tokenize
+from paragraph_retrieval import BM25Index, select_paragraphs
+
+TEXTS = [
+    "AI agents could amplify stress in financial markets.",
+    "Supervisors need data on model providers and concentration.",
+    "Market stress from correlated AI agents trading at speed.",
+    "The weather was pleasant during the committee visit.",
+    "Concentration of cloud providers is a vulnerability for banks.",
+]
+
+
+def reference_bm25(texts, query, k1=1.5, b=0.75):
+    documents = [tokenize(t) for t in texts]
+    average = sum(map(len, documents)) / len(documents)
+    scores = []
+    for words in documents:
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in d for d in documents)
+            if not df:
+                continue
+            idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+            tf = words.count(term)
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(words) / average))
+        scores.append(score)
+    return scores
+
+
+def test_scores_match_reference_formula():
+    query = "AI agents market stress"
+    assert np.allclose(BM25Index(TEXTS).scores(query), reference_bm25(TEXTS, query))
+
+
+def test_top_k_breaks_ties_by_index():
+    index = BM25Index(["alpha beta"] * 6 + ["gamma"])
+    assert index.top_k("alpha", 4) == [0, 1, 2, 3]
+    assert index.top_k("gamma delta", 3) == [6]
+    assert index.top_k("unknown", 3) == []
+
+
+def test_top_k_drops_weak_matches():
+    index = BM25Index(TEXTS)
+    scores = index.scores("AI agents market stress")
+    strong = index.top_k("AI agents market stress", 5, min_score_ratio=0.5)
+    assert strong == [i for i in np.argsort(-scores, kind="stable") if scores[i] >= 0.5 * scores.max()]
+    assert 3 not in index.top_k("AI agents market stress", 5)
+
+
+def paragraphs(n):
+    topics = ["market stress from AI agents", "cloud provider concentration", "data for supervisors",
+              "committee logistics", "consumer lending models"]
+    return [{"text": f"Paragraph {i} about {topics[i % len(topics)]} with filler words {i}.",
+             "source": "a.pdf", "page": i} for i in range(n)]
+
+
+def test_selection_keeps_document_order():
+    corpus = paragraphs(100)
+    selected = select_paragraphs(corpus, {1: "market stress AI agents", 2: "cloud concentration"}, top_k=10)
+    assert set(selected) == {1, 2}
+    for chosen in selected.values():
+        assert 0 < len(chosen) <= 10
+        assert [p["page"] for p in chosen] == sorted(p["page"] for p in chosen)
+    assert all("market stress" in p["text"] for p in selected[1])
+
+
+def test_small_corpus_is_analysed_in_one_pass():
+    assert select_paragraphs(paragraphs(8), {1: "market stress"}, top_k=10) is None
+
+
+def test_overlapping_selections_fall_back_to_one_pass():
+    # Five broad questions that each select most of the corpus
+    questions = {q: "paragraph about filler words market cloud data committee consumer" for q in range(1, 6)}
+    assert select_paragraphs(paragraphs(30), questions, top_k=20, min_score_ratio=0.0) is None
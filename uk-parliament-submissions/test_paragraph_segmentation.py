@@ -0,0 +1,67 @@
+import pytest
+
+import paragraph_segmentation
+from paragraph_segmentation import layout_paragraphs, text_paragraphs
+
+
+def paragraphs(text):
+    spans = text_paragraphs(text)
+    return [text[start:end] for start, end in spans]
+
+
+def test_spans_are_offsets_into_the_text():
+    text = "  First paragraph line one\nline two.\n\n   Second paragraph.  \n"
+    spans = text_paragraphs(text)
+    assert [text[start:end] for start, end in spans] == [
+        "First paragraph line one\nline two.", "Second paragraph."
+    ]
+
+
+def test_list_items_and_short_sentence_ends_start_paragraphs():
+    text = "\n".join([
+        "This line is long enough to set the usual full width of the page text",
+        "and it ends here.",
+        "A new paragraph starts after the short line that ended a sentence",
+        "1. a numbered item",
+        "• a bullet",
+    ])
+    assert paragraphs(text) == [
+        "This line is long enough to set the usual full width of the page text\nand it ends here.",
+        "A new paragraph starts after the short line that ended a sentence",
+        "1. a numbered item",
+        "• a bullet",
+    ]
+
+
+def test_inline_breaks_are_split():
+    assert paragraphs("One ends here.  Two starts here • three is a bullet") == [
+        "One ends here.", "Two starts here", "• three is a bullet"
+    ]
+
+
+def test_long_paragraphs_are_split_at_sentence_ends(monkeypatch):
+    monkeypatch.setattr(paragraph_segmentation, "MAX_TEXT_PARAGRAPH_CHARS", 40)
+    text = " ".join(f"Sentence number {i} is here." for i in range(6))
+    pieces = paragraphs(text)
+    assert len(pieces) > 1
+    assert all(len(piece) <= 40 for piece in pieces)
+    assert " ".join(pieces) == text
+
+
+def test_empty_text():
+    assert text_paragraphs("") == []
+    assert text_paragraphs("\n \n") == []
+
+
+def test_layout_paragraphs_split_at_gaps(make_pdf):
+    pytest.importorskip("pypdfium2")
+    path = make_pdf("layout.pdf", [[
+        "The first paragraph runs over two lines of text on the page, with",
+        "a second line that continues it",
+        "",
+        "The second paragraph follows a blank line.",
+    ]])
+    assert layout_paragraphs(path) == [[
+        "The first paragraph runs over two lines of text on the page, with a second line that continues it",
+        "The second paragraph follows a blank line.",
+    ]]
@@ -0,0 +1,428 @@
+import re
+import json
+import time
+import random
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("aisitools")
+import pdf_analysis  # noqa: E402
+from model_completions import MIN_CACHEABLE_PROMPT_TOKENS  # noqa: E402
+from pdf_analysis import ANALYSIS_QUESTIONS, AIFinanceRiskAnalyzer  # noqa: E402
+from rate_limiting import estimate_tokens  # noqa: E402
+
+pytestmark = pytest.mark.usefixtures("no_completion_cache")
+
+
+class RecordingClaudeClient:
+    """Records each messages.create payload and answers with the given findings."""
+
+    def __init__(self, findings=()):
+        self.requests = []
+        self.findings = list(findings)
+        self.messages = SimpleNamespace(create=self.create)
+
+    def create(self, **params):
+        self.requests.append(params)
+        usage = SimpleNamespace(input_tokens=10, output_tokens=5, cache_creation_input_tokens=0,
+                                cache_read_input_tokens=0)
+        text = json.dumps({"findings": self.findings})
+        return SimpleNamespace(content=[SimpleNamespace(text=text)], usage=usage)
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    analyzer = AIFinanceRiskAnalyzer(str(tmp_path), index_dir=None, manifest_path=None)
+    analyzer.anthropic_client = RecordingClaudeClient()
+    return analyzer
+
+
+PARAGRAPH = {"text": "AI agents may amplify market stress.", "source": "a.pdf", "page": 1}
+
+
+def cache_blocks(params):
+    blocks = list(params["system"]) if isinstance(params["system"], list) else []
+    blocks += [b for b in params["messages"][0]["content"] if isinstance(b, dict)]
+    return [b for b in blocks if "cache_control" in b]
+
+
+def test_long_shared_prefix_is_marked_for_caching(analyzer):
+    questions = {q: "Which risks to financial stability are described? " * 40 for q in range(1, 4)}
+    analyzer.analyze_paragraph_batch([PARAGRAPH], questions)
+    (params,) = analyzer.anthropic_client.requests
+    blocks = cache_blocks(params)
+    assert len(blocks) == 2
+    assert blocks[-1]["text"].startswith("Analyze the paragraphs")
+    # The paragraphs themselves are never part of the cached prefix
+    assert "cache_control" not in params["messages"][0]["content"][-1]
+
+
+@pytest.mark.parametrize("question_set", [ANALYSIS_QUESTIONS] + [{q: text} for q, text in ANALYSIS_QUESTIONS.items()],
+                         ids=["all"] + [f"q{q}" for q in ANALYSIS_QUESTIONS])
+def test_real_analysis_prompt_is_marked_for_caching(analyzer, question_set):
+    analyzer.analyze_paragraph_batch([PARAGRAPH], question_set)
+    (params,) = analyzer.anthropic_client.requests
+    system_prompt, instructions = analyzer.analysis_prompts(question_set)
+    assert estimate_tokens(system_prompt) + estimate_tokens(instructions) >= MIN_CACHEABLE_PROMPT_TOKENS
+    assert [b["text"] for b in cache_blocks(params)] == [system_prompt, instructions]
+
+
+def test_short_prefix_is_sent_without_cache_markers(analyzer, monkeypatch):
+    monkeypatch.setattr(pdf_analysis, "MIN_CACHEABLE_PROMPT_TOKENS", 10 ** 6)
+    analyzer.analyze_paragraph_batch([PARAGRAPH], {1: "Which risks are described?"})
+    (params,) = analyzer.anthropic_client.requests
+    assert cache_blocks(params) == []
+    assert isinstance(params["system"], str)
+
+
+def batch_tokens(analyzer, batch):
+    return sum(estimate_tokens(analyzer.format_paragraph(p)) + 1 for p in batch)
+
+
+def test_packing_nothing_gives_no_batches(analyzer):
+    assert analyzer.pack_paragraphs([], ANALYSIS_QUESTIONS) == []
+
+
+def test_paragraph_over_the_budget_is_split_into_batches(analyzer):
+    analyzer.batch_token_budget = 60
+    words = [f"word{i}" for i in range(200)]
+    paragraph = {"text": " ".join(words), "source": "long.pdf", "page": 3}
+    batches = analyzer.pack_paragraphs([paragraph], ANALYSIS_QUESTIONS)
+    assert len(batches) > 1
+    assert all(batch_tokens(analyzer, batch) <= 60 for batch in batches)
+    pieces = [piece for batch in batches for piece in batch]
+    assert all((piece["source"], piece["page"]) == ("long.pdf", 3) for piece in pieces)
+    assert " ".join(piece["text"] for piece in pieces).split() == words
+
+
+def test_unbroken_text_is_cut_at_the_budget(analyzer):
+    pieces = analyzer.split_paragraph({"text": "x" * 1000, "source": "a.pdf", "page": 1}, 50)
+    assert len(pieces) > 1
+    assert "".join(piece["text"] for piece in pieces) == "x" * 1000
+    assert all(estimate_tokens(analyzer.format_paragraph(piece)) < 50 for piece in pieces)
+
+
+def test_document_order_is_kept_across_batches(analyzer):
+    analyzer.batch_token_budget = 80
+    paragraphs = [{"text": f"Paragraph {i} " + "filler " * (i % 7 * 5), "source": f"doc{i // 5}.pdf",
+                   "page": i % 5 + 1} for i in range(30)]
+    batches = analyzer.pack_paragraphs(paragraphs, ANALYSIS_QUESTIONS)
+    assert len(batches) > 1
+    assert all(batch_tokens(analyzer, batch) <= 80 for batch in batches)
+    packed = [(p["source"], p["page"], p["text"].split()[1]) for batch in batches for p in batch
+              if p["text"].startswith("Paragraph")]
+    assert packed == [(p["source"], p["page"], str(i)) for i, p in enumerate(paragraphs)]
+    # Nothing is dropped: the pieces of each paragraph add back up to it
+    assert (" ".join(p["text"] for batch in batches for p in batch).split()
+            == " ".join(p["text"] for p in paragraphs).split())
+
+
+def test_index_lookups_match_the_paragraph_scan(tmp_path, make_pdf):
+    pdf = make_pdf("evidence.pdf", [[
+        "Supervisors should watch the firms that deploy AI agents to trade across",
+        "many venues at once and in the same direction.",
+        "Banks already rely on models from very few providers, many of them selling",
+        "general tools built on AI.",
+        "Agents of change in the sector argue that this concentration is not yet a",
+        "problem for anyone at all.",
+        "Another paragraph mentions stress testing of firms for AI, agents and humans",
+        "alike, in some detail.",
+    ]])
+    scanning = AIFinanceRiskAnalyzer(str(tmp_path), index_dir=None, manifest_path=None)
+    indexed = AIFinanceRiskAnalyzer(str(tmp_path), index_dir=str(tmp_path / "index"), manifest_path=None)
+    indexed.index.update([pdf], max_workers=1)
+
+    paragraphs = scanning.extract_paragraphs_from_pdf(pdf)
+    assert len(paragraphs) == 4 and all(p["offset"] is not None for p in paragraphs)
+    # The index also finds "AI agents" across the paragraph break and across the comma
+    candidates = indexed.index.offsets(indexed.ai_agent_keywords, pdf)[1]
+    with_hits = [i for i, p in enumerate(paragraphs)
+                 if any(p["offset"] <= o < p["offset"] + len(p["text"]) for o in candidates)]
+    assert with_hits == [0, 1, 3]
+    expected = scanning.relevant_paragraphs(pdf, paragraphs)
+    assert [p["text"][:11] for p in expected] == ["Supervisors"]
+    assert indexed.relevant_paragraphs(pdf, paragraphs) == expected
+
+
+def test_default_segmentation_reads_only_the_cached_text(analyzer, make_pdf, monkeypatch):
+    def no_second_parse(pdf_path):
+        raise AssertionError("the PDF was parsed again for layout")
+    monkeypatch.setattr(pdf_analysis, "layout_paragraphs", no_second_parse)
+    pdf = make_pdf("evidence.pdf", [[
+        "A first paragraph that is long enough to be kept for analysis.",
+        "A second paragraph whose lines run much further across the page than the first paragraph,",
+        "so the line that ended the first paragraph is short enough to have ended the paragraph.",
+    ]])
+    (page,) = pdf_analysis.iter_pages(pdf)
+    paragraphs = analyzer.extract_paragraphs_from_pdf(pdf)
+    assert len(paragraphs) == 2
+    for p in paragraphs:
+        assert page.text[p["offset"]:p["offset"] + len(p["text"])] == p["text"]
+
+
+SOURCE_RE = re.compile(r"([\w.-]+\.pdf), Page (\d+)")
+
+
+class FakeAnalysisClient:
+    """
+    Answers analysis prompts with one finding per paragraph in the context and clustering prompts
+    with one summary per cluster. Requests citing a document in fail_sources, and clustering
+    requests while fail_clustering is set, raise.
+    """
+
+    def __init__(self, fail_sources=(), fail_clustering=False):
+        self.fail_sources = set(fail_sources)
+        self.fail_clustering = fail_clustering
+        self.analysed = []
+        self.contexts = []
+        self.messages = SimpleNamespace(create=self.create)
+
+    def create(self, **params):
+        content = params["messages"][0]["content"]
+        text = content if isinstance(content, str) else "".join(block["text"] for block in content)
+        usage = SimpleNamespace(input_tokens=10, output_tokens=5, cache_creation_input_tokens=0,
+                                cache_read_input_tokens=0)
+        if "Context:\n" in text:
+            context = text[text.index("Context:\n"):]
+            sources = SOURCE_RE.findall(context)
+            if self.fail_sources & {source for source, _ in sources}:
+                raise RuntimeError("analysis failed")
+            self.analysed.extend(sources)
+            self.contexts.append(context)
+            answer = {"findings": [{"question_num": 1, "quote": f"{source} p{page}", "source": source,
+                                    "page": int(page), "summary": "s"} for source, page in sources]}
+        else:
+            if self.fail_clustering:
+                raise RuntimeError("clustering failed")
+            ids = sorted({int(i) for i in re.findall(r'"cluster_id": (\d+)', text)})
+            answer = {"clusters": [{"cluster_id": i, "theme": f"theme {i}", "summary": "s", "key_quotes": []}
+                                   for i in ids]}
+        return SimpleNamespace(content=[SimpleNamespace(text=json.dumps(answer))], usage=usage)
+
+
+SHARED = "Systemic stability could suffer when many firms deploy similar AI agents on the same data."
+
+
+def evidence_pdf(make_pdf, name, topic):
+    return make_pdf(name, [
+        [f"Our submission on {topic} argues that AI agents change how risk spreads between firms."],
+        [SHARED],
+    ])
+
+
+def run(tmp_path, client, manifest="manifest.json"):
+    analyzer = AIFinanceRiskAnalyzer(str(tmp_path), index_dir=None, manifest_path=str(tmp_path / manifest))
+    analyzer.anthropic_client = client
+    analyzer.process_pdfs()
+    return analyzer
+
+
+def findings_of(analyzer, name):
+    return sorted(f["quote"] for findings in analyzer.results.values() for f in findings if f["source"] == name)
+
+
+def sent(client, text):
+    """Number of times a paragraph text was sent for analysis"""
+    return sum(context.count(text) for context in client.contexts)
+
+
+def test_duplicate_paragraph_is_analysed_once(tmp_path, make_pdf):
+    evidence_pdf(make_pdf, "a.pdf", "trading")
+    evidence_pdf(make_pdf, "b.pdf", "lending")
+    client = FakeAnalysisClient()
+    analyzer = run(tmp_path, client)
+    assert sent(client, SHARED) == 1
+    # Each submission gets a finding from its own paragraph and one from the shared paragraph,
+    # whose single analysis cites both
+    assert findings_of(analyzer, "a.pdf") == ["a.pdf p1", "a.pdf p2"]
+    assert findings_of(analyzer, "b.pdf") == ["b.pdf p1", "b.pdf p2"]
+
+
+def test_failed_batches_are_not_cached(tmp_path, make_pdf):
+    evidence_pdf(make_pdf, "a.pdf", "trading")
+    run(tmp_path, FakeAnalysisClient())
+
+    evidence_pdf(make_pdf, "b.pdf", "lending")
+    failed = run(tmp_path, FakeAnalysisClient(fail_sources={"b.pdf"}))
+    # a.pdf's own paragraph is reused; the shared one now also cites b.pdf and failed with it
+    assert findings_of(failed, "a.pdf") == ["a.pdf p1"] and findings_of(failed, "b.pdf") == []
+    assert len(failed.manifest.paragraphs) == 1
+
+    # Only the paragraphs whose analysis failed are sent again
+    client = FakeAnalysisClient()
+    second = run(tmp_path, client)
+    assert sent(client, "trading") == 0
+    assert sent(client, "lending") == sent(client, SHARED) == 1
+    assert findings_of(second, "b.pdf") == ["b.pdf p1", "b.pdf p2"]
+    assert len(second.manifest.paragraphs) == 3
+
+
+def test_incremental_run_matches_a_fresh_run(tmp_path, make_pdf):
+    evidence_pdf(make_pdf, "b.pdf", "lending")
+    run(tmp_path, FakeAnalysisClient())
+
+    evidence_pdf(make_pdf, "a.pdf", "trading")
+    client = FakeAnalysisClient()
+    incremental = run(tmp_path, client)
+    # b.pdf's own paragraph is unchanged; the shared one is cited by a.pdf too now, so it is sent again
+    assert sent(client, "lending") == 0
+    assert sent(client, "trading") == sent(client, SHARED) == 1
+
+    fresh = run(tmp_path, FakeAnalysisClient(), manifest="fresh.json")
+    for name in ("a.pdf", "b.pdf"):
+        assert findings_of(incremental, name) == findings_of(fresh, name)
+
+
+def test_fallback_clusters_are_not_cached(tmp_path, make_pdf):
+    evidence_pdf(make_pdf, "a.pdf", "trading")
+    analyzer = run(tmp_path, FakeAnalysisClient())
+
+    analyzer.anthropic_client = FakeAnalysisClient(fail_clustering=True)
+    clustered = analyzer.cluster_and_summarize()
+    assert clustered[1]["clusters"]  # Locally formed clusters are still reported
+    assert analyzer.manifest.clusters == {}
+
+    analyzer.anthropic_client = FakeAnalysisClient()
+    analyzer.cluster_and_summarize()
+    assert [c["theme"] for c in analyzer.manifest.clusters["1"]["clusters"]["clusters"]] == ["theme 0"]
+
+
+TOPICS = ["trading", "lending", "insurance", "payments", "custody", "clearing"]
+
+
+def topic_pdf(make_pdf, name):
+    return make_pdf(name, [[f"{name} page {page}: AI agents could reshape {topic} across the sector."]
+                           for page, topic in enumerate(TOPICS, 1)])
+
+
+def out_of_order_analysis(fail_pages=()):
+    """Fake analyze_paragraph_batch: a finding per paragraph after a random delay, so batches finish out of order"""
+    def analyze(paragraphs, question_set):
+        time.sleep(random.uniform(0, 0.02))
+        if any((p["source"], p["page"]) in fail_pages for p in paragraphs):
+            return None
+        return {"findings": [{"question_num": 1, "quote": p["text"], "source": p["source"], "page": p["page"]}
+                             for p in paragraphs]}
+    return analyze
+
+
+def analysed_pages(findings_by_pdf):
+    return {name: [f["page"] for f in findings] for name, findings in findings_by_pdf.items()}
+
+
+def test_concurrent_batches_keep_document_order(tmp_path, make_pdf):
+    pdfs = [topic_pdf(make_pdf, "a.pdf"), topic_pdf(make_pdf, "b.pdf")]
+    # One paragraph per batch, so every finding comes from a separately scheduled call
+    analyzer = AIFinanceRiskAnalyzer(str(tmp_path), index_dir=None, manifest_path=None, batch_token_budget=30,
+                                     analysis_workers=6, dedupe=False)
+    analyzer.analyze_paragraph_batch = out_of_order_analysis()
+    runs = [analyzer.analyze_pdfs(pdfs, ANALYSIS_QUESTIONS) for _ in range(3)]
+    assert analysed_pages(runs[0]) == {"a.pdf": [1, 2, 3, 4, 5, 6], "b.pdf": [1, 2, 3, 4, 5, 6]}
+    assert runs[0] == runs[1] == runs[2]
+
+
+def test_failed_batch_only_loses_its_own_paragraphs(tmp_path, make_pdf):
+    pdfs = [topic_pdf(make_pdf, "a.pdf"), topic_pdf(make_pdf, "b.pdf")]
+    analyzer = AIFinanceRiskAnalyzer(str(tmp_path), index_dir=None, manifest_path=None, batch_token_budget=30,
+                                     analysis_workers=6, dedupe=False)
+    analyzer.analyze_paragraph_batch = out_of_order_analysis(fail_pages={("a.pdf", 2), ("b.pdf", 5)})
+    findings = analyzer.analyze_pdfs(pdfs, ANALYSIS_QUESTIONS)
+    assert analysed_pages(findings) == {"a.pdf": [1, 3, 4, 5, 6], "b.pdf": [1, 2, 3, 4, 6]}
+
+
+def finding(i):
+    return {"question_num": 1, "quote": f"Finding {i}: " + "agents herd in stressed markets " * 3,
+            "source": f"doc{i}.pdf", "page": 1, "summary": "s"}
+
+
+class FakeClusterCalls:
+    """
+    Fake _cluster_call. A map call puts all of its findings in one cluster; a merge call merges all
+    clusters it is given into one. Calls return None (failed) while they contain a failing finding
+    quote or, for merges, while fail_merges is set.
+    """
+
+    def __init__(self, failing=(), fail_merges=False):
+        self.failing = set(failing)
+        self.fail_merges = fail_merges
+        self.labels = []
+        self.lock = threading.Lock()
+
+    def __call__(self, user_message, label):
+        with self.lock:
+            self.labels.append(label)
+        time.sleep(random.uniform(0, 0.01))
+        payload = json.loads(user_message.split(":\n", 1)[1].split("\n\nReturn as JSON")[0])
+        if label.endswith("(merge)"):
+            if self.fail_merges:
+                return None
+            return {"clusters": [{"theme": "merged", "summary": "s", "key_quotes": [],
+                                  "merged_cluster_ids": [c["cluster_id"] for c in payload]}]}
+        if any(f["quote"].split(":")[0] in self.failing for f in payload):
+            return None
+        return {"clusters": [{"theme": payload[0]["quote"].split(":")[0], "summary": "s", "key_quotes": [],
+                              "finding_indices": list(range(len(payload)))}]}
+
+
+def map_reduce_analyzer(tmp_path, calls, **kwargs):
+    analyzer = AIFinanceRiskAnalyzer(str(tmp_path), index_dir=None, precluster=False, cluster_token_budget=150,
+                                     **kwargs)
+    analyzer._cluster_call = calls
+    return analyzer
+
+
+def indices(result):
+    return sorted(i for cluster in result["clusters"] for i in cluster["finding_indices"])
+
+
+def test_small_finding_sets_are_clustered_in_one_call(tmp_path):
+    calls = FakeClusterCalls()
+    result, complete = map_reduce_analyzer(tmp_path, calls, manifest_path=None).cluster_question(
+        1, [finding(i) for i in range(2)])
+    assert complete and calls.labels == ["question 1"]
+    assert indices(result) == [0, 1]
+
+
+def test_map_chunks_are_merged_into_one_cluster_set(tmp_path):
+    calls = FakeClusterCalls()
+    findings = [finding(i) for i in range(12)]
+    result, complete = map_reduce_analyzer(tmp_path, calls, manifest_path=None).cluster_question(1, findings)
+    assert complete
+    assert calls.labels.count("question 1") > 1 and "question 1 (merge)" in calls.labels
+    # Indices are shifted back to the full list, so every finding is in exactly one cluster
+    assert [c["theme"] for c in result["clusters"]] == ["merged"]
+    assert indices(result) == list(range(12))
+
+
+def test_failed_map_chunk_keeps_the_other_chunks(tmp_path):
+    calls = FakeClusterCalls(failing={"Finding 5"})
+    findings = [finding(i) for i in range(12)]
+    result, complete = map_reduce_analyzer(tmp_path, calls, manifest_path=None).cluster_question(1, findings)
+    assert not complete
+    clustered = indices(result)
+    assert 5 not in clustered and 0 in clustered and 11 in clustered
+    assert len(clustered) == len(set(clustered))
+
+
+def test_failed_merge_returns_the_chunk_clusters(tmp_path):
+    calls = FakeClusterCalls(fail_merges=True)
+    findings = [finding(i) for i in range(12)]
+    result, complete = map_reduce_analyzer(tmp_path, calls, manifest_path=None).cluster_question(1, findings)
+    assert not complete
+    assert len(result["clusters"]) == calls.labels.count("question 1")
+    assert indices(result) == list(range(12))
+
+
+def test_questions_are_clustered_concurrently_in_question_order(tmp_path):
+    analyzer = map_reduce_analyzer(tmp_path, FakeClusterCalls(failing={"Finding 7"}),
+                                   manifest_path=str(tmp_path / "manifest.json"))
+    for q in (3, 1, 2):
+        analyzer.results[q] = [dict(finding(i), question_num=q) for i in range(q * 4)]
+    clustered = analyzer.cluster_and_summarize()
+    assert list(clustered) == [3, 1, 2]
+    assert indices(clustered[1]) == list(range(4))
+    # Questions 2 and 3 lost the chunk holding finding 7: reported, but not stored for reuse
+    assert 7 not in indices(clustered[2]) and 7 not in indices(clustered[3])
+    assert list(analyzer.manifest.clusters) == ["1"]
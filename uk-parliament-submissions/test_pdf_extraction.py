@@ -0,0 +1,94 @@
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+import pdf_extraction
+from pdf_extraction import PageCache, PageRecord, extract_documents, iter_pages, join_pages, load_pages
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_extract_documents_yields_page_records_in_input_order(tmp_path, make_pdf, max_workers):
+    cache = PageCache(str(tmp_path / "pages.sqlite"))
+    paths = [make_pdf(f"doc{i}.pdf", [[f"document {i} page {p}"] for p in range(1, i + 2)]) for i in range(3)]
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    paths.insert(1, broken)
+
+    documents = list(extract_documents(paths, max_workers=max_workers, pages_per_task=1, cache=cache))
+    assert [path for path, _ in documents] == paths
+    assert documents[1][1] == []
+    records = documents[2][1]
+    assert all(isinstance(record, PageRecord) for record in records)
+    assert [(r.source, r.page) for r in records] == [("doc1.pdf", 1), ("doc1.pdf", 2)]
+    assert "document 1 page 2" in records[1].text
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """Thread pool standing in for the process pool, recording the most tasks ever outstanding."""
+
+    peak = 0
+
+    def __init__(self, max_workers):
+        super().__init__(max_workers=max_workers)
+        self._outstanding = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        with self._lock:
+            self._outstanding += 1
+            CountingExecutor.peak = max(CountingExecutor.peak, self._outstanding)
+        future = super().submit(fn, *args)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        with self._lock:
+            self._outstanding -= 1
+
+
+def test_page_ranges_of_long_documents_share_the_task_window(tmp_path, make_pdf, monkeypatch):
+    monkeypatch.setattr(pdf_extraction, "ProcessPoolExecutor", CountingExecutor)
+    monkeypatch.setattr(CountingExecutor, "peak", 0)
+    cache = PageCache(str(tmp_path / "pages.sqlite"))
+    paths = [make_pdf(f"long{i}.pdf", [[f"document {i} page {p}"] for p in range(1, 21)]) for i in range(2)]
+    documents = list(extract_documents(paths, max_workers=2, pages_per_task=1, cache=cache))
+    assert [[r.page for r in records] for _, records in documents] == [list(range(1, 21))] * 2
+    assert "document 1 page 20" in documents[1][1][-1].text
+    # 2 workers keep at most 4 tasks in flight, although each document has 20 page ranges
+    assert 1 < CountingExecutor.peak <= 4
+
+
+def test_iter_pages_caches_only_fully_read_documents(tmp_path, make_pdf):
+    cache = PageCache(str(tmp_path / "pages.sqlite"))
+    path = make_pdf("doc.pdf", [["first"], ["second"], ["third"]])
+    text, truncated = join_pages(iter_pages(path, cache=cache), max_chars=3)
+    assert (text, truncated) == ("fir", True)
+    assert cache.stats()["documents"] == 0
+
+    assert [record.page for record in iter_pages(path, cache=cache)] == [1, 2, 3]
+    assert cache.stats()["documents"] == 1
+    assert [record.text.strip() for record in load_pages(path, cache=cache)] == ["first", "second", "third"]
+    assert cache.hits == 1
+
+
+def test_unavailable_backend_falls_back_with_a_warning(monkeypatch, caplog):
+    monkeypatch.setitem(pdf_extraction.EXTRACTOR_BACKENDS, "pdfplumber",
+                        (pdf_extraction.EXTRACTOR_BACKENDS["pdfplumber"][0], None))
+    with caplog.at_level("WARNING", logger="pdf_extraction"):
+        assert pdf_extraction._available_backend("pdfplumber") == pdf_extraction.DEFAULT_EXTRACTOR_BACKEND
+        assert pdf_extraction._available_backend("no-such-backend") == pdf_extraction.DEFAULT_EXTRACTOR_BACKEND
+    assert "not installed" in caplog.text and "Unknown" in caplog.text
+    assert pdf_extraction._available_backend("pypdf2") == "pypdf2"
+
+
+def test_import_with_unavailable_backend_does_not_fail():
+    env = dict(os.environ, PDF_EXTRACTOR_BACKEND="no-such-backend")
+    result = subprocess.run([sys.executable, "-c", "import pdf_extraction; print(pdf_extraction.EXTRACTOR_VERSION)"],
+                            cwd=Path(__file__).parent, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.startswith(pdf_extraction.DEFAULT_EXTRACTOR_BACKEND + "-")
@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+import rate_limiting
+from rate_limiting import RateLimiter, acall_with_retries, call_with_retries
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limiting, "backoff_delay", lambda attempt, error=None: 0.0)
+
+
+def failing_call(status_code, failures):
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise FakeAPIError(status_code)
+        return "ok"
+    return call, calls
+
+
+def test_failed_attempts_do_not_keep_their_token_reservation():
+    limiter = RateLimiter(output_tokens_per_minute=1000, max_concurrency=8)
+    call, calls = failing_call(429, failures=3)
+    with pytest.raises(FakeAPIError):
+        call_with_retries(call, limiter, input_tokens=50, output_tokens=100, max_retries=2)
+    stats = limiter.stats()
+    assert len(calls) == 3
+    assert stats["requests_last_minute"] == 3
+    assert stats["input_tokens_last_minute"] == 0
+    assert stats["output_tokens_last_minute"] == 0
+    assert stats["in_flight"] == 0
+
+
+def test_success_after_retry_counts_actual_usage():
+    limiter = RateLimiter(output_tokens_per_minute=1000)
+    call, calls = failing_call(503, failures=1)
+    response = call_with_retries(call, limiter, input_tokens=50, output_tokens=100,
+                                 usage_of=lambda response: (40, 7))
+    assert response == "ok"
+    stats = limiter.stats()
+    assert (stats["input_tokens_last_minute"], stats["output_tokens_last_minute"]) == (40, 7)
+
+
+def test_async_failed_attempts_release_tokens():
+    limiter = RateLimiter(output_tokens_per_minute=1000)
+    sync_call, _ = failing_call(429, failures=1)
+
+    async def call():
+        return sync_call()
+    assert asyncio.run(acall_with_retries(call, limiter, input_tokens=10, output_tokens=100,
+                                          usage_of=lambda response: (10, 5))) == "ok"
+    assert limiter.stats()["output_tokens_last_minute"] == 5
+
+
+def test_non_retryable_error_is_raised_immediately():
+    limiter = RateLimiter()
+    call, calls = failing_call(400, failures=5)
+    with pytest.raises(FakeAPIError):
+        call_with_retries(call, limiter)
+    assert len(calls) == 1
+
+
+def test_simultaneous_throttles_halve_the_cap_once():
+    limiter = RateLimiter(max_concurrency=64)
+    reservations = [limiter.acquire() for _ in range(6)]
+    for reservation in reservations:
+        limiter.release(reservation, throttled=True)
+    assert limiter.concurrency_limit == 32
+    assert limiter.throttle_events == 6
+
+    # A request sent after the cut that is throttled again halves it once more
+    limiter.release(limiter.acquire(), throttled=True)
+    assert limiter.concurrency_limit == 16
+
+
+def test_cap_grows_back_after_successes():
+    limiter = RateLimiter(max_concurrency=4)
+    limiter.release(limiter.acquire(), throttled=True)
+    assert limiter.concurrency_limit == 2
+    for _ in range(rate_limiting.ADDITIVE_INCREASE_EVERY):
+        limiter.release(limiter.acquire())
+    assert limiter.concurrency_limit == 3
+
+
+def test_request_waits_for_token_budget():
+    limiter = RateLimiter(input_tokens_per_minute=100)
+    limiter.acquire(input_tokens=80)
+    reservation, wait = limiter._try_acquire(50, 0)
+    assert reservation is None and wait > 0
+    # Reconciling to the real, smaller usage frees the budget
+    limiter.release(limiter._window[0], input_tokens=20)
+    reservation, wait = limiter._try_acquire(50, 0)
+    assert reservation is not None
+
+
+def test_cancelled_call_frees_its_slot():
+    limiter = RateLimiter(output_tokens_per_minute=1000, max_concurrency=2)
+
+    async def main():
+        started = asyncio.Event()
+
+        async def call():
+            started.set()
+            await asyncio.sleep(60)
+        task = asyncio.create_task(acall_with_retries(call, limiter, output_tokens=100))
+        await started.wait()
+        assert limiter.stats()["in_flight"] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    asyncio.run(main())
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_interrupted_call_frees_its_slot():
+    limiter = RateLimiter(max_concurrency=2)
+
+    def call():
+        raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        call_with_retries(call, limiter)
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_failing_usage_of_frees_its_slot():
+    limiter = RateLimiter(max_concurrency=2)
+
+    def usage_of(response):
+        raise AttributeError("no usage")
+    with pytest.raises(AttributeError):
+        call_with_retries(lambda: "ok", limiter, usage_of=usage_of)
+    assert limiter.stats()["in_flight"] == 0
@@ -0,0 +1,61 @@
+import pytest
+
+from term_filter import TermFilter, all_of, any_of, evaluate, parse_expression
+
+
+def test_parse_precedence():
+    assert parse_expression("a OR b AND NOT c") == (
+        "or", [("term", "a"), ("and", [("term", "b"), ("not", ("term", "c"))])]
+    )
+    assert parse_expression('("Tool Use" OR x)') == ("or", [("term", "tool use"), ("term", "x")])
+
+
+@pytest.mark.parametrize("expression", ["a AND", "(a OR b", "a b )", "AND a", '""'])
+def test_malformed_expressions_raise(expression):
+    with pytest.raises(ValueError):
+        parse_expression(expression)
+
+
+@pytest.mark.parametrize("node, seen, expected", [
+    (("and", [("term", "a"), ("term", "b")]), {"a": 1, "b": None}, None),
+    (("and", [("term", "a"), ("not", ("term", "b"))]), {"a": 1, "b": 2}, False),
+    (("or", [("term", "a"), ("term", "b")]), {"a": None, "b": 3}, True),
+    (("or", [("term", "a"), ("term", "b")]), {"a": None, "b": None}, None),
+    (("not", ("term", "a")), {"a": None}, None),
+])
+def test_three_valued_evaluation(node, seen, expected):
+    assert evaluate(node, seen) is expected
+
+
+def test_unseen_terms_are_false_at_the_end():
+    node = ("and", [("term", "a"), ("not", ("term", "b"))])
+    assert evaluate(node, {"a": 1, "b": None}, final=True) is True
+    assert evaluate(("term", "a"), {"a": None}, final=True) is False
+
+
+def test_match_stops_once_decided():
+    read = []
+
+    def pages():
+        for text in ["An agent here.", "Financial STABILITY.", "never read"]:
+            read.append(text)
+            yield text
+    result = TermFilter("agent AND stability").match(pages())
+    assert result.matched
+    assert result.term_pages == {"agent": 1, "stability": 2}
+    assert result.pages_read == 2 and len(read) == 2
+
+
+def test_not_excludes_as_soon_as_the_term_appears():
+    result = TermFilter("agent AND NOT cryptocurrency").match(["cryptocurrency", "agent", "more"])
+    assert not result and result.pages_read == 1
+
+
+def test_not_only_matches_after_the_whole_document():
+    result = TermFilter("agent AND NOT cryptocurrency").match(["agent", "other"])
+    assert result and result.pages_read == 2
+
+
+def test_node_builders():
+    assert TermFilter(all_of(["A", "b"])).match(["a b"])
+    assert not TermFilter(any_of(["x", "y"])).match(["a b"])